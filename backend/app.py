@@ -1,15 +1,27 @@
 """
 Flask API for Robot vs Human Image Classification
-Supports both Keras (.h5) and PyTorch (.pth) models
+Supports Keras (.h5), PyTorch (.pth), ONNX (.onnx) and TFLite (.tflite) models
 """
-from flask import Flask, request, jsonify, send_from_directory
+import time
+
+IMPORT_STARTED = time.perf_counter()  # Start of the 'imports' startup phase
+
+from flask import Flask, Response, g, request, jsonify, send_from_directory
 from flask_cors import CORS
+from flask_sock import Sock
+from simple_websocket import ConnectionClosed
 from werkzeug.utils import secure_filename
 import numpy as np
-from PIL import Image
 import io
 import os
 import sys
+import json
+import hashlib
+import tarfile
+import threading
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from pathlib import Path
 
@@ -28,62 +40,301 @@ from backend.config import (
     MODEL_BACKBONE,
     PREDICTION_THRESHOLD,
     PREDICTION_MARGIN,
+    INFERENCE_BATCHING,
+    BATCH_MAX_SIZE,
+    BATCH_MAX_WAIT_MS,
+    PREDICT_BATCH_MAX_IMAGES,
+    PREDICT_BATCH_CHUNK_SIZE,
+    PREDICT_BATCH_MAX_BYTES,
+    PREDICT_BATCH_MAX_ARCHIVE_BYTES,
+    PREPROCESS_WORKERS,
+    STORAGE_UPLOAD_WORKERS,
+    PREDICTION_CACHE_SIZE,
+    PREDICTION_CACHE_TTL,
+    HISTORY_PAGE_SIZE,
+    HISTORY_MAX_PAGE_SIZE,
+    HISTORY_CACHE_TTL,
+    LIVE_MOTION_THRESHOLD,
+    LIVE_EMA_ALPHA,
+    LIVE_MAX_SKIPPED_FRAMES,
+    LIVE_SESSION_TTL,
+    FAST_DECODE,
+    WARMUP_BATCH_SIZES,
+    KERAS_SERVING_MODE,
+    KERAS_JIT_COMPILE,
+    SERVING_BATCH_BUCKETS,
+    INTRA_OP_THREADS,
+    INTER_OP_THREADS,
+    PERSIST_ASYNC,
+    PERSIST_QUEUE_SIZE,
+    PERSIST_WORKERS,
+    PERSIST_MAX_RETRIES,
+    PERSIST_RETRY_BACKOFF,
+    PERSIST_ENQUEUE_TIMEOUT,
+    DB_BATCH_WRITES,
+    DB_BATCH_MAX_ROWS,
+    DB_BATCH_MAX_DELAY_MS,
+    DB_BATCH_MAX_IN_FLIGHT,
+    JOURNAL_ENABLED,
+    JOURNAL_DIR,
+    JOURNAL_FSYNC,
+    JOURNAL_FSYNC_INTERVAL_MS,
+    JOURNAL_SEGMENT_MAX_BYTES,
+    JOURNAL_REPLAY_INTERVAL,
+    SERVER_TIMING,
+    PROFILE_DIR,
+    PROFILE_ENABLED,
+    PROFILE_SAMPLE_EVERY,
+    PROFILE_SLOW_MS,
+    PROFILE_INTERVAL_MS,
+    PROFILE_MAX_FILES,
+    PROFILE_ADMIN_TOKEN,
+    STARTUP_BACKGROUND,
+    MODEL_RELOAD_WATCH,
+    MODEL_RELOAD_WATCH_INTERVAL,
+    MODEL_RELOAD_GOLDEN_DIR,
+    MODEL_RELOAD_GOLDEN_PER_CLASS,
+    MODEL_RELOAD_MIN_ACCURACY,
+    MODEL_ADMIN_TOKEN,
 )
 from backend.supabase_db import SupabaseDB
+from backend.batching import MicroBatcher
+from backend.prediction_cache import PredictionCache, content_key
+from backend.live_sessions import LiveSessionStore
+from backend.inference import configure_threads, import_framework, load_engine, resolve_model_type
+from backend.imaging import ENCODED, FRAME_FORMATS, RAW_RGB
+from backend.persistence import WriteBehindQueue, PersistenceQueueFull
+from backend.journal import PredictionJournal, JournalReplayer
+from backend.decision import decide_one, decide_rows
+from backend.model_reload import GoldenSet, ModelReloader
+from backend.profiling import RequestProfiler
+from backend.startup import STARTING, StartupTracker
+from backend import metrics
+
+startup = StartupTracker(started=IMPORT_STARTED)
+startup.record('imports', time.perf_counter() - IMPORT_STARTED)
 
 app = Flask(__name__, static_folder='../frontend', static_url_path='')
 
 CORS(app, resources={
     r"/*": {
         "origins": "*",
-        "methods": ["GET", "POST", "OPTIONS"],
-        "allow_headers": ["Content-Type", "ngrok-skip-browser-warning"]
+        "methods": ["GET", "POST", "DELETE", "OPTIONS"],
+        "allow_headers": ["Content-Type", "ngrok-skip-browser-warning", "X-Session-Id"],
+        "expose_headers": ["Server-Timing"]
     }
 })
 
 app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+app.config['SOCK_SERVER_OPTIONS'] = {'ping_interval': 25, 'max_message_size': MAX_CONTENT_LENGTH}
+sock = Sock(app)
 
 @app.after_request
 def after_request(response):
     response.headers.add('Access-Control-Allow-Origin', '*')
-    response.headers.add('Access-Control-Allow-Headers', 'Content-Type,ngrok-skip-browser-warning')
-    response.headers.add('Access-Control-Allow-Methods', 'GET,POST,OPTIONS')
+    response.headers.add('Access-Control-Allow-Headers', 'Content-Type,ngrok-skip-browser-warning,X-Session-Id')
+    response.headers.add('Access-Control-Allow-Methods', 'GET,POST,DELETE,OPTIONS')
+    return response
+
+
+profiler = RequestProfiler(
+    PROFILE_DIR,
+    enabled=PROFILE_ENABLED,
+    sample_every=PROFILE_SAMPLE_EVERY,
+    slow_ms=PROFILE_SLOW_MS,
+    interval_ms=PROFILE_INTERVAL_MS,
+    max_files=PROFILE_MAX_FILES,
+    server_timing=SERVER_TIMING,
+)
+SERVER_TIMING_ENDPOINTS = {'predict', 'predict_live'}
+SERVER_TIMING_STAGES = (  # Server-Timing entry -> metrics stages it sums
+    ('read', ('body_read',)),
+    ('decode', ('decode',)),
+    ('preprocess', ('resize', 'normalize')),
+    ('inference', ('forward', 'decision')),
+    ('persistence', ('persistence',)),
+)
+REQUEST_SIZE_LIMITS = {'predict_batch': PREDICT_BATCH_MAX_BYTES}  # Endpoints allowed larger bodies than MAX_CONTENT_LENGTH
+UNPROFILED_ENDPOINTS = {'static', 'index', 'get_metrics', 'profiling_settings', 'live_stream', 'health_check', 'readiness_check', 'model_reload'}
+
+
+def server_timing_header(trace, total):
+    """Format stage timings (seconds) as a Server-Timing header value"""
+    entries = []
+    for name, stages in SERVER_TIMING_STAGES:
+        seconds = sum(trace.get(stage, 0.0) for stage in stages)
+        if any(stage in trace for stage in stages):
+            entries.append(f"{name};dur={seconds * 1000.0:.2f}")
+    entries.append(f"total;dur={total * 1000.0:.2f}")
+    return ', '.join(entries)
+
+
+@app.before_request
+def start_request_metrics():
+    endpoint = g.metrics_endpoint = request.endpoint or 'unmatched'
+    g.metrics_started = metrics.request_started(endpoint)
+    g.profile = profiler.begin(endpoint) if endpoint not in UNPROFILED_ENDPOINTS else None
+    if g.profile is not None or (profiler.server_timing and endpoint in SERVER_TIMING_ENDPOINTS):
+        metrics.start_trace()
+    if endpoint in REQUEST_SIZE_LIMITS:
+        request.max_content_length = REQUEST_SIZE_LIMITS[endpoint]
+    if request.method == 'POST' and request.mimetype == 'multipart/form-data':
+        # Parse the upload here so body read time is not billed to decoding
+        with metrics.stage('body_read'):
+            request.files
+
+
+@app.after_request
+def finish_request_metrics(response):
+    started = g.pop('metrics_started', None)
+    if started is not None:
+        endpoint, status = g.metrics_endpoint, response.status_code
+        capture = g.pop('profile', None)
+        trace = metrics.stop_trace()
+        if trace is not None and profiler.server_timing and endpoint in SERVER_TIMING_ENDPOINTS:
+            response.headers['Server-Timing'] = server_timing_header(trace, time.perf_counter() - started)
+            response.headers['Timing-Allow-Origin'] = '*'
+        
+        # Recorded when the response is closed, so streamed bodies
+        # (/api/predict-batch) count in full. A WebSocket "request" lasts as
+        # long as the connection; its frames are recorded in live_stream.
+        def finish():
+            profiler.finish(capture, time.perf_counter() - started, trace, status)
+            metrics.request_finished(endpoint, started, status, observe=endpoint != 'live_stream')
+        response.call_on_close(finish)
     return response
 
-model = None
-model_type = None  # 'keras' or 'pytorch'
+
+@app.teardown_request
+def abort_request_metrics(error=None):
+    started = g.pop('metrics_started', None)
+    if started is not None:  # after_request did not run
+        profiler.finish(g.pop('profile', None), time.perf_counter() - started, metrics.stop_trace(), 500)
+        metrics.request_finished(g.metrics_endpoint, started, 500)
+
+engine = None  # InferenceEngine serving new requests; replaced as a whole by install_engine()
+engine_threads = INTRA_OP_THREADS  # Session threads (ONNX / TFLite) models are loaded with
 db = None
+batcher = None
+write_behind = None  # Background image upload / row insert queue
+journal = None  # Local journal used while Supabase is unreachable
+journal_replayer = None
+preprocess_pool = ThreadPoolExecutor(max_workers=PREPROCESS_WORKERS, thread_name_prefix="preprocess")
+storage_pool = ThreadPoolExecutor(max_workers=STORAGE_UPLOAD_WORKERS, thread_name_prefix="storage")
+prediction_cache = PredictionCache(max_entries=PREDICTION_CACHE_SIZE, ttl_seconds=PREDICTION_CACHE_TTL)
+history_cache = PredictionCache(max_entries=8 if HISTORY_CACHE_TTL > 0 else 0, ttl_seconds=HISTORY_CACHE_TTL)  # Newest /api/history page per limit
+model_reloader = ModelReloader(
+    MODEL_PATH,
+    load_fn=lambda: build_engine(compute_model_version(MODEL_PATH), engine_threads),
+    install_fn=lambda new_engine: install_engine(new_engine),
+    current_fn=lambda: engine,
+    golden=GoldenSet(MODEL_RELOAD_GOLDEN_DIR, CLASS_NAMES, MODEL_RELOAD_GOLDEN_PER_CLASS),
+    min_accuracy=MODEL_RELOAD_MIN_ACCURACY,
+    watch_interval=MODEL_RELOAD_WATCH_INTERVAL if MODEL_RELOAD_WATCH else 0,
+)
+live_sessions = LiveSessionStore(
+    motion_threshold=LIVE_MOTION_THRESHOLD,
+    ema_alpha=LIVE_EMA_ALPHA,
+    max_skipped_frames=LIVE_MAX_SKIPPED_FRAMES,
+    session_ttl=LIVE_SESSION_TTL,
+)
+live_stream_lock = threading.Lock()
+live_stream_stats = {
+    'active_connections': 0,
+    'total_connections': 0,
+    'frames_received': 0,
+    'frames_dropped': 0,
+    'results_sent': 0,
+}
 
 
 def analyze_probabilities(probabilities):
     """
     Apply thresholding logic to convert raw probabilities into a prediction.
     """
-    sorted_indices = np.argsort(probabilities)[::-1]
-    top_idx = sorted_indices[0]
-    top_conf = float(probabilities[top_idx])
-    second_idx = sorted_indices[1] if len(sorted_indices) > 1 else top_idx
-    second_conf = float(probabilities[second_idx]) if len(sorted_indices) > 1 else 0.0
+    return decide_one(probabilities, CLASS_NAMES, PREDICTION_THRESHOLD, PREDICTION_MARGIN)
 
-    margin = top_conf - second_conf
-    is_confident = (top_conf >= PREDICTION_THRESHOLD) and (margin >= PREDICTION_MARGIN)
-    predicted_label = CLASS_NAMES[top_idx] if is_confident else "unknown"
 
-    return {
-        "predicted_label": predicted_label,
-        "confidence": top_conf,
-        "best_class": CLASS_NAMES[top_idx],
-        "best_confidence": top_conf,
-        "second_class": CLASS_NAMES[second_idx] if len(sorted_indices) > 1 else None,
-        "second_confidence": second_conf,
-        "margin": margin,
-        "is_confident": is_confident,
-    }
+def analyze_probabilities_batch(probabilities):
+    """
+    Vectorized analyze_probabilities for an (N x C) probability matrix.
+
+    Returns:
+        List with one decision dictionary per row, identical to analyze_probabilities
+    """
+    return decide_rows(probabilities, CLASS_NAMES, PREDICTION_THRESHOLD, PREDICTION_MARGIN)
+
+
+def compute_model_version(path):
+    """Return a short content hash identifying the model file"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()[:12]
+
+
+def build_engine(version, intra_op_threads=INTRA_OP_THREADS):
+    """
+    Load and warm up MODEL_PATH without making it serve
+    
+    Used for the first load and for hot reloads, so it leaves the process-wide
+    TensorFlow / PyTorch thread pools alone (see load_model).
+    
+    Args:
+        version: Content hash of the file (compute_model_version)
+        intra_op_threads: Session threads for ONNX Runtime / TFLite
+        
+    Returns:
+        InferenceEngine with its version set
+    """
+    model_type = resolve_model_type(MODEL_PATH, MODEL_TYPE)
+    print(f"Loading {model_type} model from {MODEL_PATH}...")
+    
+    loaded_engine = load_engine(
+        MODEL_PATH,
+        model_type,
+        MODEL_INPUT_SIZE,
+        MODEL_BACKBONE,
+        fast_decode=FAST_DECODE,
+        keras_serving_mode=KERAS_SERVING_MODE,
+        batch_buckets=SERVING_BATCH_BUCKETS,
+        jit_compile=KERAS_JIT_COMPILE,
+        intra_op_threads=intra_op_threads,
+    )
+    print(f"✓ {model_type} model loaded successfully!")
+    
+    loaded_engine.warmup(WARMUP_BATCH_SIZES)
+    print(f"✓ Model warmed up with batch sizes {list(WARMUP_BATCH_SIZES)} "
+          f"in {loaded_engine.warmup_seconds:.2f}s")
+    loaded_engine.version = version
+    return loaded_engine
+
+
+def install_engine(new_engine):
+    """
+    Make new_engine serve every new request
+    
+    A single reference swap: requests already running keep the engine they
+    pinned when they started, and finish on it.
+    """
+    global engine
+    engine = new_engine
+    metrics.set_model_type(new_engine.name)
+    prediction_cache.clear()
+    start_batcher()
+
 
-def load_model():
-    """Load the trained model (supports both Keras and PyTorch)"""
-    global model, model_type
+def load_model(intra_op_threads=INTRA_OP_THREADS, inter_op_threads=INTER_OP_THREADS):
+    """
+    Load the trained model (supports both Keras and PyTorch)
+    
+    Called once per process (initialize_services); also sizes the framework
+    thread pools, which cannot be changed again on later reloads.
+    """
+    global engine_threads
+    engine_threads = intra_op_threads
     
     try:
         if not MODEL_PATH.exists():
@@ -91,41 +342,17 @@ def load_model():
             print("Please train the model first using train.py")
             return False
         
-        model_extension = MODEL_PATH.suffix.lower()
-        
-        if MODEL_TYPE == "auto":
-            if model_extension in ['.h5', '.keras']:
-                model_type = 'keras'
-            elif model_extension in ['.pth', '.pt']:
-                model_type = 'pytorch'
-            else:
-                print(f"⚠ WARNING: Unknown model extension: {model_extension}")
-                return False
-        else:
-            model_type = MODEL_TYPE
-        
-        print(f"Loading {model_type} model from {MODEL_PATH}...")
-        
-        if model_type == 'keras':
-            import tensorflow as tf
-            from tensorflow import keras
-            model = keras.models.load_model(MODEL_PATH)
-            print("✓ Keras model loaded successfully!")
-            
-        elif model_type == 'pytorch':
-            import torch
-            import torch.nn as nn
-            
-            model = torch.load(MODEL_PATH, map_location=torch.device('cpu'))
-            
-            if isinstance(model, dict):
-                print("⚠ WARNING: Loaded state_dict. You need to define the model architecture.")
-                print("Please provide the full model or update the code with your model architecture.")
-                return False
-            
-            model.eval()  # Set to evaluation mode
-            print("✓ PyTorch model loaded successfully!")
+        with startup.phase('model_hash'):
+            version = compute_model_version(MODEL_PATH)
+        model_type = resolve_model_type(MODEL_PATH, MODEL_TYPE)
+        with startup.phase('framework_import'):
+            import_framework(model_type)
+            configure_threads(model_type, intra_op_threads, inter_op_threads)
+        loaded_engine = build_engine(version, intra_op_threads)
+        startup.record('model_deserialize', loaded_engine.load_seconds)
+        startup.record('warmup', loaded_engine.warmup_seconds)
         
+        install_engine(loaded_engine)
         return True
         
     except Exception as e:
@@ -135,11 +362,52 @@ def load_model():
         return False
 
 
+def run_inference(inputs, served=None):
+    """
+    Run a single forward pass over one or more preprocessed inputs
+
+    Args:
+        inputs: List of preprocessed NHWC arrays, each with a leading batch dimension
+        served: Engine the request pinned (defaults to the current engine)
+
+    Returns:
+        Numpy array of class probabilities with one row per image
+    """
+    batch = inputs[0] if len(inputs) == 1 else np.concatenate(inputs, axis=0)
+    return (served or engine).predict_batch(batch)
+
+
+def start_batcher():
+    """Start the micro-batching scheduler shared by the predict endpoints"""
+    global batcher
+    if not INFERENCE_BATCHING or batcher is not None:
+        return
+    batcher = MicroBatcher(
+        run_inference,
+        max_batch_size=BATCH_MAX_SIZE,
+        max_wait_ms=BATCH_MAX_WAIT_MS,
+    )
+    batcher.start()
+    print(f"✓ Inference batching enabled (max batch {BATCH_MAX_SIZE}, max wait {BATCH_MAX_WAIT_MS}ms)")
+
+
+def predict_probabilities(processed_image, served=None):
+    """Get class probabilities for a single preprocessed image (on the pinned engine)"""
+    served = served or engine
+    # Timed here rather than in run_inference so the forward pass is billed to
+    # the calling endpoint; with batching it includes the wait for the batch.
+    with metrics.stage('forward'):
+        if batcher is not None:
+            return batcher.predict(processed_image, key=served)[0]
+        return run_inference([processed_image], served)[0]
+
+
 def initialize_database():
     """Initialize Supabase database connection"""
     global db
     try:
         db = SupabaseDB()
+        db.insert_listeners.append(history_cache.clear)
         print("✓ Database connection initialized!")
         return True
     except Exception as e:
@@ -147,53 +415,190 @@ def initialize_database():
         return False
 
 
+def save_upload_locally(image_bytes, filename):
+    """Keep an image in UPLOAD_FOLDER when it cannot be stored in Supabase"""
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+    with open(filepath, 'wb') as f:
+        f.write(image_bytes)
+
+
+def database_reachable():
+    """False while Supabase is down, so requests journal without waiting on it"""
+    if db is None:
+        return False
+    return journal_replayer is None or journal_replayer.database_reachable
+
+
+def store_offline(image_bytes, record, error=None, shared_object=False):
+    """
+    Keep a prediction locally until Supabase is reachable again
+    
+    Args:
+        image_bytes: Image to upload later (None if it is already in storage)
+        record: Prediction row (filename, predicted_class, confidence)
+        error: Database error that caused the fallback, if any
+        shared_object: The row points at an object stored for an earlier
+            upload, so its filename may already have a row
+        
+    Returns:
+        'journaled' (replayed into Supabase later) or 'local' (image file only)
+    """
+    if journal_replayer is not None:
+        journal_replayer.mark_unreachable(error)
+    if journal is not None:
+        journal.append(record, image_bytes, shared_object)
+        return 'journaled'
+    if image_bytes is not None:
+        save_upload_locally(image_bytes, record['filename'])
+    return 'local'
+
+
+def persist_failed(job, error):
+    """Fallback for background writes that ran out of retries"""
+    print(f"Warning: Could not save {job.filename} to Supabase: {error}")
+    # Jobs submitted without an image are cache hits reusing a stored object
+    store_offline(None if job.uploaded else job.image_bytes, job.record, error, job.image_bytes is None)
+
+
+def start_persistence():
+    """Start the write-behind queue used by /api/predict"""
+    global write_behind
+    if not PERSIST_ASYNC or db is None or write_behind is not None:
+        return
+    if DB_BATCH_WRITES:
+        db.start_batch_writer(
+            max_rows=DB_BATCH_MAX_ROWS,
+            max_delay_ms=DB_BATCH_MAX_DELAY_MS,
+            max_in_flight=DB_BATCH_MAX_IN_FLIGHT,
+        )
+    write_behind = WriteBehindQueue(
+        upload_fn=lambda image_bytes, filename: db.upload_image(image_bytes, filename),
+        insert_fn=lambda record: db.queue_prediction(**record),  # A Future: workers do not wait for the batch
+        on_failure=persist_failed,
+        max_pending=PERSIST_QUEUE_SIZE,
+        workers=PERSIST_WORKERS,
+        max_retries=PERSIST_MAX_RETRIES,
+        backoff_seconds=PERSIST_RETRY_BACKOFF,
+        enqueue_timeout=PERSIST_ENQUEUE_TIMEOUT,
+    )
+    write_behind.start()
+    print(f"✓ Write-behind persistence enabled ({PERSIST_WORKERS} workers, queue {PERSIST_QUEUE_SIZE})")
+
+
+def connect_database():
+    """Return the database client, connecting (and starting persistence) if needed"""
+    if db is None and initialize_database():
+        start_persistence()
+    return db
+
+
+def start_journal():
+    """Open the local journal and start replaying it into Supabase"""
+    global journal, journal_replayer
+    if not JOURNAL_ENABLED or journal is not None:
+        return
+    journal = PredictionJournal(
+        JOURNAL_DIR,
+        fsync=JOURNAL_FSYNC,
+        fsync_interval_ms=JOURNAL_FSYNC_INTERVAL_MS,
+        segment_max_bytes=JOURNAL_SEGMENT_MAX_BYTES,
+    )
+    journal_replayer = JournalReplayer(journal, connect_database, interval_seconds=JOURNAL_REPLAY_INTERVAL)
+    journal_replayer.start()
+    print(f"✓ Prediction journal at {JOURNAL_DIR} (fsync: {JOURNAL_FSYNC})")
+
+
+def initialize_services(intra_op_threads=INTRA_OP_THREADS, inter_op_threads=INTER_OP_THREADS,
+                        background=STARTUP_BACKGROUND):
+    """
+    Load the model, start the batcher and connect to the database
+
+    Called once per process: by main() for the development server and by
+    each preforked worker in backend/gunicorn.conf.py. With background=True
+    it returns immediately and the work runs on a thread, so the server
+    accepts requests (and answers /health) while the model loads; /ready
+    answers 200 once it can serve predictions.
+    """
+    if background:
+        threading.Thread(
+            target=run_startup, args=(intra_op_threads, inter_op_threads), name="startup", daemon=True
+        ).start()
+    else:
+        run_startup(intra_op_threads, inter_op_threads)
+
+
+def start_database():
+    """Connect to the database, start background persistence and the journal"""
+    with startup.phase('database'):
+        db_connected = initialize_database()
+    if not db_connected:
+        print("\n⚠ WARNING: Starting server without database connection!")
+    else:
+        start_persistence()
+    with startup.phase('journal'):
+        start_journal()
+
+
+def run_startup(intra_op_threads=INTRA_OP_THREADS, inter_op_threads=INTER_OP_THREADS):
+    """Load the model while the database connects on another thread, then record the outcome"""
+    database_thread = threading.Thread(target=start_database, name="startup-database", daemon=True)
+    database_thread.start()
+    try:
+        model_loaded = load_model(intra_op_threads, inter_op_threads)
+        if not model_loaded:
+            print("\n⚠ WARNING: Starting server without model!")
+            print("Train the model first: python model/train.py")
+        model_reloader.start_watching()
+        database_thread.join()
+        startup.finish(ready=model_loaded, error=None if model_loaded else 'Model not loaded')
+    except Exception as e:
+        startup.finish(ready=False, error=str(e))
+        raise
+    finally:
+        print(startup.format_report())
+
+
+def shutdown_services():
+    """Flush pending writes and stop background threads so a worker can exit cleanly"""
+    if write_behind is not None:
+        write_behind.stop()
+    if db is not None:
+        db.close()
+    if journal_replayer is not None:
+        journal_replayer.stop()
+    if journal is not None:
+        journal.close()
+    if batcher is not None:
+        batcher.stop()
+    model_reloader.stop()
+    preprocess_pool.shutdown(wait=False)
+    storage_pool.shutdown(wait=True)
+
+
 def allowed_file(filename):
     """Check if file extension is allowed"""
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
-def preprocess_image(image_bytes):
+def preprocess_image(image_bytes, out=None, frame_format=ENCODED, served=None):
     """
     Preprocess image for prediction (works for both Keras and PyTorch)
     
     Args:
         image_bytes: Raw image bytes
+        out: Optional float32 array of shape (1, height, width, 3) to decode into.
+            Defaults to a per-thread buffer that is reused by the next call from
+            the same thread.
+        frame_format: 'encoded', or 'raw' for uint8 RGB pixels at MODEL_INPUT_SIZE
+            (no decode or resize)
+        served: Engine the request pinned (defaults to the current engine)
         
     Returns:
-        Preprocessed image array/tensor ready for prediction
+        Preprocessed NHWC array ready for prediction
     """
-    image = Image.open(io.BytesIO(image_bytes))
-    
-    if image.mode != 'RGB':
-        image = image.convert('RGB')
-    
-    image = image.resize(MODEL_INPUT_SIZE)
-    
-    if model_type == 'keras':
-        image_array = np.array(image).astype(np.float32)
-        image_array = np.expand_dims(image_array, axis=0)
-
-        if MODEL_BACKBONE.lower().startswith("efficientnet"):
-            from tensorflow.keras.applications.efficientnet import preprocess_input as efficientnet_preprocess_input
-
-            image_array = efficientnet_preprocess_input(image_array)
-        else:
-            image_array /= 255.0
-        return image_array
-        
-    elif model_type == 'pytorch':
-        import torch
-        from torchvision import transforms
-        
-        transform = transforms.Compose([
-            transforms.ToTensor(),  # Converts to [0, 1] and changes to CxHxW
-            transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
-        ])
-        
-        image_tensor = transform(image)
-        image_tensor = image_tensor.unsqueeze(0)  # Add batch dimension
-        return image_tensor
+    return (served or engine).preprocess(image_bytes, out, frame_format)
 
 
 @app.route('/')
@@ -202,17 +607,159 @@ def index():
     return send_from_directory('../frontend', 'index.html')
 
 
+def model_ready():
+    return engine is not None and engine.warmed_up
+
+
+def model_unavailable_message():
+    if startup.state == STARTING:
+        return 'Model is still loading. Please retry shortly.'
+    return 'Model not loaded. Please train the model first.'
+
+
+def model_unavailable():
+    """503 response for requests that need the model before it is loaded"""
+    response = jsonify({'error': model_unavailable_message(), 'startup': startup.state})
+    if startup.state == STARTING:
+        response.headers['Retry-After'] = '5'
+    return response, 503
+
+
 @app.route('/health', methods=['GET'])
 def health_check():
-    """Health check endpoint"""
+    """Health check endpoint (liveness: answers as soon as the server accepts requests)"""
     return jsonify({
         'status': 'healthy',
-        'model_loaded': model is not None,
+        'ready': model_ready(),
+        'startup': startup.state,
+        'model_loaded': engine is not None,
+        'model_ready': model_ready(),
         'database_connected': db is not None,
         'timestamp': datetime.now().isoformat()
     })
 
 
+@app.route('/ready', methods=['GET'])
+def readiness_check():
+    """Readiness probe: 200 once the model is loaded and warmed up, 503 before"""
+    ready = model_ready()
+    return jsonify({
+        'ready': ready,
+        'database_connected': db is not None,
+        **startup.report(),
+    }), 200 if ready else 503
+
+
+def storage_filename(image_bytes, original_filename, timestamp=None):
+    """
+    Storage object name (and database filename) for an uploaded image
+    
+    The content hash keeps names unique, so the object name (and its public
+    URL) is known before the upload and retried uploads can safely upsert.
+    
+    Args:
+        image_bytes: Raw image bytes
+        original_filename: Filename provided by the client
+        timestamp: Prefix in the "%Y%m%d_%H%M%S" format (default: now)
+    """
+    timestamp = timestamp or datetime.now().strftime("%Y%m%d_%H%M%S")
+    content_hash = hashlib.sha256(image_bytes).hexdigest()[:8]
+    return f"{timestamp}_{content_hash}_{secure_filename(original_filename)}"
+
+
+def classify_image(image_bytes, served):
+    """
+    Classify an uploaded image (the part of /api/predict that is cached)
+    
+    Args:
+        image_bytes: Raw image bytes
+        served: Engine the request pinned when it started
+        
+    Returns:
+        Dictionary with the prediction details
+    """
+    processed_image = preprocess_image(image_bytes, served=served)
+    probabilities = predict_probabilities(processed_image, served)
+    
+    with metrics.stage('decision'):
+        analysis = analyze_probabilities(probabilities)
+    class_probabilities = {
+        CLASS_NAMES[i]: float(probabilities[i])
+        for i in range(len(CLASS_NAMES))
+    }
+    
+    return {
+        'predicted_class': analysis['predicted_label'],
+        'confidence': analysis['confidence'],
+        'all_probabilities': class_probabilities,
+        'decision_details': analysis,
+        'model_version': served.version,
+    }
+
+
+def store_prediction(image_bytes, original_filename, classification, stored_object=None):
+    """
+    Persist an uploaded image together with its prediction
+    
+    Runs for every /api/predict request, including cache hits, so each
+    upload appears in the history and statistics. Cache hits pass the object
+    stored for the first upload of the same image: their row points at it
+    and the image is not uploaded again.
+    
+    Args:
+        image_bytes: Raw image bytes
+        original_filename: Filename provided by the client
+        classification: classify_image() result
+        stored_object: Storage object already holding this image, if any
+        
+    Returns:
+        Dictionary with filename, image URL and persistence outcome
+    """
+    predicted_class = classification['predicted_class']
+    confidence = classification['confidence']
+    
+    if stored_object is not None:
+        unique_filename = stored_object
+        upload_bytes = None
+    else:
+        unique_filename = storage_filename(image_bytes, original_filename)
+        upload_bytes = image_bytes
+    record = {
+        'filename': unique_filename,
+        'predicted_class': predicted_class,
+        'confidence': confidence,
+    }
+    image_url = db.get_pending_image_urls([unique_filename])[0] if db is not None else None
+    
+    with metrics.stage('persistence'):
+        if not database_reachable():
+            persistence = store_offline(upload_bytes, record, shared_object=stored_object is not None)
+        elif write_behind is not None:
+            write_behind.submit(upload_bytes, unique_filename, record)
+            persistence = 'queued'
+        else:
+            try:
+                if upload_bytes is not None:
+                    db.upload_image(upload_bytes, unique_filename)
+                    print(f"Image uploaded to Supabase Storage: {unique_filename}")
+            
+                db.save_prediction(unique_filename, predicted_class, confidence)
+                persistence = 'saved'
+                image_url = db.get_image_url(unique_filename)  # The object exists now, so it can be signed
+            except Exception as e:
+                print(f"Warning: Could not save to Supabase: {e}")
+                persistence = store_offline(upload_bytes, record, e, stored_object is not None)
+    
+    if persistence == 'local':
+        image_url = None
+    
+    return {
+        'filename': unique_filename,
+        'image_url': image_url,  # Include Supabase Storage URL constructed from filename
+        'persistence': persistence,  # 'queued' (background write), 'saved', 'journaled' or 'local'
+    }
+
+
 @app.route('/api/predict', methods=['POST'])
 def predict():
     """
@@ -221,10 +768,9 @@ def predict():
     Expected: multipart/form-data with 'image' field
     Returns: JSON with predicted class and confidence
     """
-    if model is None:
-        return jsonify({
-            'error': 'Model not loaded. Please train the model first.'
-        }), 503
+    served = engine  # A model reload must not change the engine mid-request
+    if served is None:
+        return model_unavailable()
     
     if 'image' not in request.files:
         return jsonify({'error': 'No image file provided'}), 400
@@ -241,64 +787,33 @@ def predict():
     
     try:
         image_bytes = file.read()
-        processed_image = preprocess_image(image_bytes)
-        
-        if model_type == 'keras':
-            predictions = model.predict(processed_image, verbose=0)
-            probabilities = predictions[0]
-        elif model_type == 'pytorch':
-            import torch
-            
-            with torch.no_grad():
-                outputs = model(processed_image)
-                probabilities = torch.nn.functional.softmax(outputs, dim=1)[0].cpu().numpy()
-        else:
-            return jsonify({'error': 'Unsupported model type'}), 500
-
-        analysis = analyze_probabilities(probabilities)
-        class_probabilities = {
-            CLASS_NAMES[i]: float(probabilities[i])
-            for i in range(len(CLASS_NAMES))
-        }
-        
-        predicted_class = analysis['predicted_label']
-        confidence = analysis['confidence']
-        
-        filename = secure_filename(file.filename)
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        unique_filename = f"{timestamp}_{filename}"
-        
-        if db is not None:
-            try:
-                db.upload_image(image_bytes, unique_filename)
-                print(f"Image uploaded to Supabase Storage: {unique_filename}")
-                
-                db.save_prediction(unique_filename, predicted_class, confidence)
-                
-                image_url = db.get_image_url(unique_filename)
-            except Exception as e:
-                print(f"Warning: Could not save to Supabase: {e}")
-                filepath = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-                with open(filepath, 'wb') as f:
-                    f.write(image_bytes)
-                image_url = None
-        else:
-            filepath = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-            with open(filepath, 'wb') as f:
-                f.write(image_bytes)
-            image_url = None
+        cache_key = content_key(image_bytes, served.version)
+        entry, cached = prediction_cache.get_or_compute(
+            cache_key,
+            lambda: {'classification': classify_image(image_bytes, served)}
+        )
+        classification = entry['classification']
+        stored = store_prediction(image_bytes, file.filename, classification, entry.get('stored_object'))
+        if stored['persistence'] != 'local':
+            # Later hits reuse this object (an image kept only in backend/uploads is not in storage)
+            entry.setdefault('stored_object', stored['filename'])
         
         return jsonify({
             'success': True,
-            'filename': unique_filename,
-            'predicted_class': predicted_class,
-            'confidence': confidence,
-            'all_probabilities': class_probabilities,
-            'decision_details': analysis,
-            'image_url': image_url,  # Include Supabase Storage URL constructed from filename
+            'filename': stored['filename'],
+            **classification,
+            'image_url': stored['image_url'],
+            'persistence': stored['persistence'],
+            'cached': cached,
             'timestamp': datetime.now().isoformat()
         })
     
+    except PersistenceQueueFull as e:
+        print(f"Warning: {e}")
+        response = jsonify({'error': 'Server busy saving predictions, please retry'})
+        response.headers['Retry-After'] = '1'
+        return response, 503
+    
     except Exception as e:
         print(f"Error during prediction: {e}")
         return jsonify({
@@ -311,13 +826,15 @@ def predict_live():
     """
     Predict image class for live feed (no database save, faster response)
     
-    Expected: multipart/form-data with 'image' field
+    Expected: multipart/form-data with 'image' field and an optional
+    'session_id' field (or X-Session-Id header). Frames of a session that barely
+    differ from the last inferred frame reuse its smoothed probabilities.
+    An optional 'format' field set to 'raw' sends the frame as uint8 RGB pixels
+    at MODEL_INPUT_SIZE (see /api/model-info) instead of an encoded image.
     Returns: JSON with predicted class and confidence
     """
-    if model is None:
-        return jsonify({
-            'error': 'Model not loaded. Please train the model first.'
-        }), 503
+    if engine is None:
+        return model_unavailable()
     
     if 'image' not in request.files:
         return jsonify({'error': 'No image file provided'}), 400
@@ -327,66 +844,459 @@ def predict_live():
     if file.filename == '':
         return jsonify({'error': 'No file selected'}), 400
     
+    session_id = request.form.get('session_id') or request.headers.get('X-Session-Id')
+    frame_format = request.form.get('format', ENCODED)
+    if frame_format not in FRAME_FORMATS:
+        return jsonify({'error': f'Unknown frame format: {frame_format}'}), 400
+    
     try:
-        image_bytes = file.read()
-        processed_image = preprocess_image(image_bytes)
+        return jsonify(live_prediction(file.read(), session_id, frame_format))
+    
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"Error during live prediction: {e}")
+        return jsonify({
+            'error': f'Prediction failed: {str(e)}'
+        }), 500
+
+
+def live_prediction(image_bytes, session_id=None, frame_format=ENCODED):
+    """
+    Classify one live-feed frame (shared by /api/predict-live and /api/live)
+    
+    Args:
+        image_bytes: Encoded frame, or raw RGB frame for frame_format 'raw'
+        session_id: Live session used to skip inference on unchanged frames
+        frame_format: 'encoded' or 'raw'
         
-        if model_type == 'keras':
-            predictions = model.predict(processed_image, verbose=0)
-            probabilities = predictions[0]
-        elif model_type == 'pytorch':
-            import torch
+    Returns:
+        Result dictionary
+    
+    Raises:
+        ValueError: If a raw frame does not match MODEL_INPUT_SIZE
+    """
+    served = engine  # A model reload must not change the engine mid-frame
+    session = None
+    if session_id:
+        probabilities, skipped, session = live_sessions.process(
+            session_id,
+            image_bytes,
+            lambda frame: predict_probabilities(preprocess_image(frame, frame_format=frame_format, served=served), served),
+            raw_size=MODEL_INPUT_SIZE if frame_format == RAW_RGB else None
+        )
+        session['skipped'] = skipped
+    else:
+        processed_image = preprocess_image(image_bytes, frame_format=frame_format, served=served)
+        probabilities = predict_probabilities(processed_image, served)
+    
+    with metrics.stage('decision'):
+        analysis = analyze_probabilities(probabilities)
+    class_probabilities = {
+        CLASS_NAMES[i]: float(probabilities[i])
+        for i in range(len(CLASS_NAMES))
+    }
+    
+    return {
+        'success': True,
+        'predicted_class': analysis['predicted_label'],
+        'confidence': analysis['confidence'],
+        'all_probabilities': class_probabilities,
+        'decision_details': analysis,
+        'session': session,
+        'model_version': served.version,
+        'timestamp': datetime.now().isoformat()
+    }
+
+
+def count_live_stream(**increments):
+    with live_stream_lock:
+        for key, value in increments.items():
+            live_stream_stats[key] += value
+
+
+@sock.route('/api/live')
+def live_stream(ws):
+    """
+    Live-feed predictions over one persistent WebSocket
+    
+    Every binary message is a frame (encoded, or raw RGB at MODEL_INPUT_SIZE
+    when connecting with ?format=raw); every reply is a JSON text
+    message with the live_prediction() result plus 'frame' (1-based number
+    of the frame in this connection) and 'dropped' (frames skipped since the
+    previous reply). Frames that arrive while a frame is being classified
+    wait in the socket; when classification finishes, only the newest of
+    them is classified and the older ones are dropped.
+    """
+    if engine is None:
+        ws.send(json.dumps({'success': False, 'error': model_unavailable_message()}))
+        return
+    
+    frame_format = request.args.get('format', ENCODED)
+    if frame_format not in FRAME_FORMATS:
+        ws.send(json.dumps({'success': False, 'error': f'Unknown frame format: {frame_format}'}))
+        return
+    
+    session_id = f"ws-{uuid.uuid4().hex}"
+    received = 0
+    count_live_stream(active_connections=1, total_connections=1)
+    try:
+        while True:
+            messages = [ws.receive()]
+            while True:
+                message = ws.receive(timeout=0)
+                if message is None:
+                    break
+                messages.append(message)
             
-            with torch.no_grad():
-                outputs = model(processed_image)
-                probabilities = torch.nn.functional.softmax(outputs, dim=1)[0].cpu().numpy()
-        else:
-            return jsonify({'error': 'Unsupported model type'}), 500
+            frames = [message for message in messages if isinstance(message, (bytes, bytearray))]
+            if not frames:
+                continue
+            received += len(frames)
+            
+            started = time.perf_counter()
+            try:
+                result = live_prediction(bytes(frames[-1]), session_id, frame_format)
+            except Exception as e:
+                print(f"Error during live stream prediction: {e}")
+                result = {'success': False, 'error': f'Prediction failed: {str(e)}'}
+                metrics.count_error('live_stream', 500)
+            result['frame'] = received
+            result['dropped'] = len(frames) - 1
+            
+            ws.send(json.dumps(result))
+            metrics.observe_request('live_stream', time.perf_counter() - started)
+            count_live_stream(frames_received=len(frames), frames_dropped=len(frames) - 1, results_sent=1)
+    except ConnectionClosed:
+        pass
+    finally:
+        live_sessions.end_session(session_id)
+        count_live_stream(active_connections=-1)
 
-        analysis = analyze_probabilities(probabilities)
-        class_probabilities = {
-            CLASS_NAMES[i]: float(probabilities[i])
-            for i in range(len(CLASS_NAMES))
-        }
-        
-        predicted_class = analysis['predicted_label']
-        confidence = analysis['confidence']
+
+def read_archive(archive_bytes):
+    """
+    Extract image files from a zip or tar archive
+    
+    Returns:
+        List of (filename, image_bytes) tuples
+    """
+    items = []
+    buffer = io.BytesIO(archive_bytes)
+    total_size = 0
+    
+    def check_size(name, size):
+        # Sizes are checked before extracting, so a small archive of highly
+        # compressible members cannot expand into gigabytes of memory.
+        nonlocal total_size
+        if size > MAX_CONTENT_LENGTH:
+            raise ValueError(f'Archive member too large: {name}')
+        total_size += size
+        if total_size > PREDICT_BATCH_MAX_ARCHIVE_BYTES:
+            raise ValueError(
+                f'Archive too large: more than {PREDICT_BATCH_MAX_ARCHIVE_BYTES / (1024*1024):.0f}MB of images uncompressed'
+            )
+    
+    if zipfile.is_zipfile(buffer):
+        with zipfile.ZipFile(buffer) as archive:
+            for info in archive.infolist():
+                name = os.path.basename(info.filename)
+                if info.is_dir() or not allowed_file(name):
+                    continue
+                check_size(name, info.file_size)
+                items.append((name, archive.read(info)))
+                if len(items) > PREDICT_BATCH_MAX_IMAGES:
+                    break
+        return items
+    
+    buffer.seek(0)
+    try:
+        archive = tarfile.open(fileobj=buffer, mode='r:*')
+    except tarfile.TarError:
+        raise ValueError('Archive must be a zip or tar file')
+    
+    with archive:
+        for member in archive.getmembers():
+            name = os.path.basename(member.name)
+            if not member.isfile() or not allowed_file(name):
+                continue
+            check_size(name, member.size)
+            items.append((name, archive.extractfile(member).read()))
+            if len(items) > PREDICT_BATCH_MAX_IMAGES:
+                break
+    return items
+
+
+def collect_batch_images():
+    """Collect (filename, image_bytes) pairs from 'image' parts and an optional 'archive' part"""
+    items = []
+    
+    for file in request.files.getlist('image'):
+        if file.filename == '':
+            continue
+        if not allowed_file(file.filename):
+            raise ValueError(f'Invalid file type: {file.filename}')
+        items.append((file.filename, file.read()))
+    
+    archive = request.files.get('archive')
+    if archive is not None and archive.filename != '':
+        items.extend(read_archive(archive.read()))
+    
+    return items
+
+
+def classify_chunk(chunk, items, timestamp, served):
+    """
+    Run one forward pass over a chunk of preprocessed images
+    
+    Args:
+        chunk: List of (index, preprocessed_image) tuples
+        items: All (filename, image_bytes) pairs of the batch request
+        timestamp: Timestamp prefix shared by the batch
+        served: Engine the batch request pinned when it started
         
-        return jsonify({
+    Returns:
+        List of per-image result dictionaries
+    """
+    with metrics.stage('forward'):
+        probabilities = run_inference([processed for _, processed in chunk], served)
+    with metrics.stage('decision'):
+        analyses = analyze_probabilities_batch(probabilities)
+    
+    unique_filenames = [
+        storage_filename(items[index][1], items[index][0], timestamp)
+        for index, _ in chunk
+    ]
+    # Uploads run later on storage_pool
+    image_urls = db.get_pending_image_urls(unique_filenames) if db is not None else [None] * len(chunk)
+    
+    results = []
+    for (index, _), image_probabilities, analysis, unique_filename, image_url in zip(
+        chunk, probabilities, analyses, unique_filenames, image_urls
+    ):
+        results.append({
+            'index': index,
             'success': True,
-            'predicted_class': predicted_class,
-            'confidence': confidence,
-            'all_probabilities': class_probabilities,
+            'filename': unique_filename,
+            'original_filename': items[index][0],
+            'predicted_class': analysis['predicted_label'],
+            'confidence': analysis['confidence'],
+            'all_probabilities': {
+                CLASS_NAMES[i]: float(image_probabilities[i])
+                for i in range(len(CLASS_NAMES))
+            },
             'decision_details': analysis,
-            'timestamp': datetime.now().isoformat()
+            'image_url': image_url,
+            'model_version': served.version,
         })
+    return results
+
+
+def prediction_record(result):
+    """Database row for a batch result"""
+    return {
+        'filename': result['filename'],
+        'predicted_class': result['predicted_class'],
+        'confidence': result['confidence'],
+    }
+
+
+def generate_batch_predictions(items, timestamp, served):
+    """
+    Stream newline-delimited JSON results for a batch request
     
-    except Exception as e:
-        print(f"Error during live prediction: {e}")
+    Images are decoded in parallel and classified in chunks as soon as enough of
+    them are ready. Storage uploads run in the background and prediction rows are
+    saved with a single bulk insert once the whole batch is done. The whole
+    batch is classified by served, even if the model is reloaded meanwhile.
+    """
+    # Decode every image into its own slice of one preallocated buffer; the
+    # per-thread default buffer would be overwritten by the pool workers.
+    batch_buffer = np.empty(
+        (len(items), MODEL_INPUT_SIZE[1], MODEL_INPUT_SIZE[0], 3),
+        dtype=np.float32
+    )
+    decode_futures = {
+        preprocess_pool.submit(
+            metrics.bind(preprocess_image), image_bytes, batch_buffer[index:index + 1], served=served
+        ): index
+        for index, (_, image_bytes) in enumerate(items)
+    }
+    
+    pending = []
+    upload_futures = {}
+    succeeded = 0
+    failed = 0
+    
+    def persist(result):
+        image_bytes = items[result['index']][1]
+        if database_reachable():
+            future = storage_pool.submit(metrics.bind(db.upload_image), image_bytes, result['filename'])
+            upload_futures[future] = result
+        else:
+            store_offline(image_bytes, prediction_record(result))
+    
+    def flush():
+        nonlocal succeeded, failed
+        chunk = pending[:]
+        pending.clear()
+        try:
+            results = classify_chunk(chunk, items, timestamp, served)
+        except Exception as e:
+            print(f"Error during batch prediction: {e}")
+            failed += len(chunk)
+            return [
+                {'index': index, 'success': False, 'original_filename': items[index][0], 'error': f'Prediction failed: {str(e)}'}
+                for index, _ in chunk
+            ]
+        for result in results:
+            persist(result)
+        succeeded += len(results)
+        return results
+    
+    for future in as_completed(decode_futures):
+        index = decode_futures[future]
+        try:
+            pending.append((index, future.result()))
+        except Exception as e:
+            failed += 1
+            yield json.dumps({
+                'index': index,
+                'success': False,
+                'original_filename': items[index][0],
+                'error': f'Could not decode image: {str(e)}'
+            }) + '\n'
+            continue
+        
+        if len(pending) >= PREDICT_BATCH_CHUNK_SIZE:
+            for result in flush():
+                yield json.dumps(result) + '\n'
+    
+    if pending:
+        for result in flush():
+            yield json.dumps(result) + '\n'
+    
+    saved = 0
+    if upload_futures:
+        rows = []
+        for future in as_completed(upload_futures):
+            result = upload_futures[future]
+            try:
+                future.result()
+                rows.append(prediction_record(result))
+            except Exception as e:
+                print(f"Warning: Could not upload {result['filename']} to Supabase: {e}")
+                store_offline(items[result['index']][1], prediction_record(result), e)
+        try:
+            saved = len(db.save_predictions(rows))
+        except Exception as e:
+            print(f"Warning: Could not save batch predictions to Supabase: {e}")
+            for row in rows:
+                store_offline(None, row, e)
+    
+    yield json.dumps({
+        'done': True,
+        'total': len(items),
+        'succeeded': succeeded,
+        'failed': failed,
+        'saved': saved,
+        'model_version': served.version,
+        'timestamp': datetime.now().isoformat()
+    }) + '\n'
+
+
+@app.route('/api/predict-batch', methods=['POST'])
+def predict_batch():
+    """
+    Predict image classes for many images in one request
+    
+    Expected: multipart/form-data with several 'image' fields and/or an
+    'archive' field containing a zip or tar file of images
+    Returns: newline-delimited JSON, one line per image as it is classified,
+    followed by a summary line
+    """
+    served = engine  # A model reload must not change the engine mid-batch
+    if served is None:
+        return model_unavailable()
+    
+    try:
+        items = collect_batch_images()
+    except (ValueError, zipfile.BadZipFile) as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if not items:
+        return jsonify({'error': 'No image files provided'}), 400
+    
+    if len(items) > PREDICT_BATCH_MAX_IMAGES:
         return jsonify({
-            'error': f'Prediction failed: {str(e)}'
-        }), 500
+            'error': f'Too many images. Maximum per request: {PREDICT_BATCH_MAX_IMAGES}'
+        }), 400
+    
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return Response(
+        generate_batch_predictions(items, timestamp, served),
+        mimetype='application/x-ndjson'
+    )
+
+
+@app.route('/api/live-sessions', methods=['GET'])
+def get_live_sessions():
+    """Get skipped/inferred frame counters for active live-feed sessions"""
+    with live_stream_lock:
+        streams = dict(live_stream_stats)
+    return jsonify({
+        'success': True,
+        'stats': live_sessions.stats(),
+        'streams': streams
+    })
+
+
+@app.route('/api/live-sessions/<session_id>', methods=['DELETE'])
+def end_live_session(session_id):
+    """Forget a live-feed session when the client stops its camera"""
+    live_sessions.end_session(session_id)
+    return jsonify({'success': True})
+
+
+def fetch_history_page(limit, cursor=None):
+    """One /api/history page with image URLs"""
+    predictions, next_cursor = db.get_predictions_page(limit=limit, cursor=cursor)
+    image_urls = db.get_image_urls([prediction['filename'] for prediction in predictions])
+    for prediction, image_url in zip(predictions, image_urls):
+        prediction['image_url'] = image_url
+    return {'predictions': predictions, 'next_cursor': next_cursor}
 
 
 @app.route('/api/history', methods=['GET'])
 def get_history():
-    """Get prediction history from database"""
+    """
+    Get prediction history from database, newest first
+    
+    Query params: limit (rows per page) and cursor (next_cursor of the
+    previous page). The newest page is cached for HISTORY_CACHE_TTL seconds
+    and dropped as soon as a new prediction is inserted.
+    """
     if db is None:
         return jsonify({'error': 'Database not connected'}), 503
     
+    limit = max(1, min(request.args.get('limit', HISTORY_PAGE_SIZE, type=int), HISTORY_MAX_PAGE_SIZE))
+    cursor = request.args.get('cursor') or None
+    
     try:
-        limit = request.args.get('limit', 100, type=int)
-        predictions = db.get_all_predictions(limit=limit)
-        
-        for prediction in predictions:
-            if 'filename' in prediction:
-                prediction['image_url'] = db.get_image_url(prediction['filename'])
+        if cursor is None:
+            page, cached = history_cache.get_or_compute(f"newest:{limit}", lambda: fetch_history_page(limit))
+        else:
+            page, cached = fetch_history_page(limit, cursor), False
         
         return jsonify({
             'success': True,
-            'count': len(predictions),
-            'predictions': predictions
+            'count': len(page['predictions']),
+            'predictions': page['predictions'],
+            'next_cursor': page['next_cursor'],
+            'cached': cached
         })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({
             'error': f'Could not retrieve history: {str(e)}'
@@ -412,20 +1322,65 @@ def get_statistics():
         }), 500
 
 
+@app.route('/api/inference-stats', methods=['GET'])
+def get_inference_stats():
+    """Get micro-batching statistics (batch sizes and queue wait)"""
+    if batcher is None:
+        return jsonify({
+            'success': True,
+            'batching_enabled': False
+        })
+
+    return jsonify({
+        'success': True,
+        'batching_enabled': True,
+        'stats': batcher.stats()
+    })
+
+
+@app.route('/api/cache-stats', methods=['GET'])
+def get_cache_stats():
+    """Get prediction cache statistics (hits, misses, evictions)"""
+    return jsonify({
+        'success': True,
+        'model_version': engine.version if engine is not None else None,
+        'stats': prediction_cache.stats(),
+        'history': history_cache.stats()
+    })
+
+
+@app.route('/api/persistence-stats', methods=['GET'])
+def get_persistence_stats():
+    """Get write-behind queue statistics (depth, flush latency, failures)"""
+    return jsonify({
+        'success': True,
+        'enabled': write_behind is not None,
+        'stats': write_behind.stats() if write_behind is not None else None,
+        'db_batch_writer': db.batch_writer.stats() if db is not None and db.batch_writer is not None else None,
+        'journal': journal_replayer.stats() if journal_replayer is not None else None
+    })
+
+
 @app.route('/api/model-info', methods=['GET'])
 def get_model_info():
     """Get information about the loaded model"""
-    if model is None:
-        return jsonify({'error': 'Model not loaded'}), 503
+    served = engine
+    if served is None:
+        return model_unavailable()
     
     try:
         return jsonify({
             'success': True,
             'model_path': str(MODEL_PATH),
             'input_size': MODEL_INPUT_SIZE,
+            'frame_formats': list(FRAME_FORMATS),
+            'raw_frame_bytes': MODEL_INPUT_SIZE[0] * MODEL_INPUT_SIZE[1] * 3,
             'classes': CLASS_NAMES,
             'num_classes': len(CLASS_NAMES),
-            'total_parameters': int(model.count_params())
+            'model_type': served.name,
+            'model_version': served.version,
+            'total_parameters': served.count_params(),
+            'reload': model_reloader.status()
         })
     except Exception as e:
         return jsonify({
@@ -433,11 +1388,77 @@ def get_model_info():
         }), 500
 
 
+@app.route('/api/profiling', methods=['GET', 'POST'])
+def profiling_settings():
+    """
+    Get or change the request profiler settings at runtime
+    
+    POST expects a JSON object with any of enabled, sample_every, slow_ms,
+    interval_ms, max_files and server_timing, plus an X-Admin-Token header
+    matching PROFILE_ADMIN_TOKEN. The change reaches every worker process
+    through PROFILE_DIR/control.json.
+    """
+    if request.method == 'POST':
+        if not PROFILE_ADMIN_TOKEN:
+            return jsonify({'error': f'PROFILE_ADMIN_TOKEN is not set; edit {PROFILE_DIR / "control.json"} instead'}), 403
+        if request.headers.get('X-Admin-Token') != PROFILE_ADMIN_TOKEN:
+            return jsonify({'error': 'Invalid admin token'}), 403
+        changes = request.get_json(silent=True)
+        if not isinstance(changes, dict):
+            return jsonify({'error': 'Expected a JSON object'}), 400
+        try:
+            profiler.update(**changes)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+    
+    return jsonify({
+        'success': True,
+        'profiling': profiler.stats()
+    })
+
+
+@app.route('/api/model-reload', methods=['GET', 'POST'])
+def model_reload():
+    """
+    Get the model reload status, or start a reload (POST)
+    
+    POST needs an X-Admin-Token header matching MODEL_ADMIN_TOKEN and returns
+    202 right away: the new model file is loaded, warmed up and checked on the
+    golden set in the background, and installed only if it passes. Requests
+    keep being served by the current model until then. Under gunicorn only the
+    worker that receives the POST reloads; use MODEL_RELOAD_WATCH to reload
+    every worker.
+    """
+    if request.method == 'POST':
+        if not MODEL_ADMIN_TOKEN:
+            return jsonify({'error': 'MODEL_ADMIN_TOKEN is not set; model reloads over HTTP are disabled'}), 403
+        if request.headers.get('X-Admin-Token') != MODEL_ADMIN_TOKEN:
+            return jsonify({'error': 'Invalid admin token'}), 403
+        if startup.state == STARTING:
+            return jsonify({'error': model_unavailable_message()}), 409
+        if not model_reloader.reload('api'):
+            return jsonify({'error': 'A model reload is already running', 'reload': model_reloader.status()}), 409
+        return jsonify({'success': True, 'reload': model_reloader.status()}), 202
+    
+    return jsonify({
+        'success': True,
+        'model_version': engine.version if engine is not None else None,
+        'reload': model_reloader.status()
+    })
+
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Request and stage latency metrics in the Prometheus text format"""
+    body, content_type = metrics.render()
+    return Response(body, content_type=content_type)
+
+
 @app.errorhandler(413)
 def too_large(e):
     """Handle file too large error"""
     return jsonify({
-        'error': f'File too large. Maximum size: {MAX_CONTENT_LENGTH / (1024*1024):.0f}MB'
+        'error': f'File too large. Maximum size: {request.max_content_length / (1024*1024):.0f}MB'
     }), 413
 
 
@@ -447,14 +1468,10 @@ def main():
     print("ROBOT VS HUMAN CLASSIFIER - API SERVER")
     print("="*60)
     
-    model_loaded = load_model()
-    if not model_loaded:
-        print("\n⚠ WARNING: Starting server without model!")
-        print("Train the model first: python model/train.py")
-    
-    db_connected = initialize_database()
-    if not db_connected:
-        print("\n⚠ WARNING: Starting server without database connection!")
+    # With the debug reloader, the parent process only watches files and
+    # restarts the child that serves; loading the model there is wasted.
+    if not FLASK_DEBUG or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        initialize_services()
     
     print("\n" + "="*60)
     print(f"Starting Flask server on http://{FLASK_HOST}:{FLASK_PORT}")
@@ -462,19 +1479,32 @@ def main():
     print("\nAvailable endpoints:")
     print("  GET  /                    - Main web interface")
     print("  GET  /health              - Health check")
+    print("  GET  /ready               - Readiness probe and startup breakdown (503 while loading)")
     print("  POST /api/predict         - Make prediction")
     print("  POST /api/predict-live    - Make live feed prediction (no DB save)")
+    print("  WS   /api/live            - Stream live feed frames over a WebSocket")
+    print("  POST /api/predict-batch   - Classify many images (streams NDJSON)")
     print("  GET  /api/history         - Get prediction history")
     print("  GET  /api/statistics      - Get statistics")
     print("  GET  /api/model-info      - Get model information")
+    print("  GET  /api/inference-stats - Get inference batching statistics")
+    print("  GET  /api/cache-stats     - Get prediction cache statistics")
+    print("  GET  /api/live-sessions   - Get live-feed skipped/inferred frame ratios")
+    print("  GET  /api/persistence-stats - Get background write queue statistics")
+    print("  GET  /metrics             - Prometheus request/stage latency metrics")
+    print("  GET  /api/profiling       - Get/change (POST) request profiler settings")
+    print("  GET  /api/model-reload    - Get reload status / hot-reload the model (POST)")
     print("\nPress CTRL+C to stop the server")
     print("="*60 + "\n")
     
-    app.run(
-        host=FLASK_HOST,
-        port=FLASK_PORT,
-        debug=FLASK_DEBUG
-    )
+    try:
+        app.run(
+            host=FLASK_HOST,
+            port=FLASK_PORT,
+            debug=FLASK_DEBUG
+        )
+    finally:
+        shutdown_services()
 
 
 if __name__ == '__main__':
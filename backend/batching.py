@@ -0,0 +1,222 @@
+"""
+Dynamic micro-batching for model inference
+
+Requests submit preprocessed images to a shared queue; a single scheduler
+thread groups them into one forward pass once either the batch is full or
+the oldest request has waited for the configured time. Requests submitted
+with different keys (e.g. the engine each request pinned while a new model
+is being swapped in) never share a forward pass.
+"""
+import threading
+import queue
+import time
+from collections import Counter, deque
+from concurrent.futures import Future
+
+import numpy as np
+
+
+class _PendingRequest:
+    __slots__ = ("inputs", "size", "key", "future", "enqueued_at")
+
+    def __init__(self, inputs, size, key=None):
+        self.inputs = inputs
+        self.size = size
+        self.key = key
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class MicroBatcher:
+    """
+    Collects concurrent inference requests into batches
+
+    Args:
+        predict_fn: Callable taking a list of preprocessed inputs (each with a
+            leading batch dimension) and the key they were submitted with, and
+            returning an (N x C) probability array, where N is the total number
+            of images across the inputs
+        max_batch_size: Maximum number of images per forward pass
+        max_wait_ms: Maximum time the oldest request waits for a batch to fill
+    """
+
+    def __init__(self, predict_fn, max_batch_size=16, max_wait_ms=10.0, stats_window=1024):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+
+        self._queue = queue.Queue()
+        self._carry = None  # Request with a different key that ended the last batch
+        self._thread = None
+        self._running = False
+
+        self._stats_lock = threading.Lock()
+        self._batch_sizes = Counter()
+        self._queue_waits = deque(maxlen=stats_window)
+        self._forward_times = deque(maxlen=stats_window)
+        self._total_batches = 0
+        self._total_requests = 0
+        self._total_images = 0
+        self._total_errors = 0
+
+    def start(self):
+        """Start the scheduler thread"""
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5.0):
+        """Stop the scheduler thread, failing any requests still queued"""
+        if not self._running:
+            return
+        self._running = False
+        self._queue.put(None)
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._thread = None
+
+    def submit(self, inputs, key=None):
+        """
+        Queue a preprocessed input for the next batch
+
+        Args:
+            inputs: Preprocessed array/tensor with a leading batch dimension
+            key: Only inputs with the same key are batched together; passed
+                to predict_fn
+
+        Returns:
+            Future resolving to the (k x C) probabilities for this input
+        """
+        if not self._running:
+            raise RuntimeError("MicroBatcher is not running")
+        request = _PendingRequest(inputs, len(inputs), key)
+        self._queue.put(request)
+        return request.future
+
+    def predict(self, inputs, timeout=None, key=None):
+        """Submit an input and block until its probabilities are ready"""
+        return self.submit(inputs, key).result(timeout=timeout)
+
+    def _collect_batch(self, first):
+        batch = [first]
+        images = first.size
+        deadline = first.enqueued_at + self.max_wait
+
+        while images < self.max_batch_size:
+            # Requests already waiting in the queue always join the batch;
+            # only block for new arrivals while the deadline has not passed.
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining > 0:
+                    request = self._queue.get(timeout=remaining)
+                else:
+                    request = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:
+                self._queue.put(None)
+                break
+            if request.key is not first.key:
+                self._carry = request
+                break
+            batch.append(request)
+            images += request.size
+
+        return batch, images
+
+    def _run(self):
+        while True:
+            first, self._carry = self._carry, None
+            if first is None:
+                first = self._queue.get()
+            if first is None:
+                if self._running:
+                    continue
+                self._fail_pending(RuntimeError("MicroBatcher stopped"))
+                break
+
+            batch, images = self._collect_batch(first)
+            started = time.perf_counter()
+
+            try:
+                probabilities = np.asarray(self.predict_fn([r.inputs for r in batch], first.key))
+                splits = np.cumsum([r.size for r in batch])[:-1]
+                for request, result in zip(batch, np.split(probabilities, splits)):
+                    request.future.set_result(result)
+                failed = False
+            except Exception as e:
+                for request in batch:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+                failed = True
+
+            finished = time.perf_counter()
+            self._record(batch, images, started, finished, failed)
+
+    def _fail_pending(self, error):
+        if self._carry is not None:
+            self._carry.future.set_exception(error)
+            self._carry = None
+        while True:
+            try:
+                request = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if request is not None:
+                request.future.set_exception(error)
+
+    def _record(self, batch, images, started, finished, failed):
+        with self._stats_lock:
+            self._total_batches += 1
+            self._total_requests += len(batch)
+            self._total_images += images
+            self._batch_sizes[images] += 1
+            self._forward_times.append(finished - started)
+            for request in batch:
+                self._queue_waits.append(started - request.enqueued_at)
+            if failed:
+                self._total_errors += 1
+
+    def stats(self):
+        """
+        Get batching statistics
+
+        Returns:
+            Dictionary with batch-size distribution and queue-wait percentiles (ms)
+        """
+        with self._stats_lock:
+            waits = np.array(self._queue_waits, dtype=np.float64) * 1000.0
+            forwards = np.array(self._forward_times, dtype=np.float64) * 1000.0
+            batch_sizes = dict(sorted(self._batch_sizes.items()))
+            total_batches = self._total_batches
+            total_requests = self._total_requests
+            total_images = self._total_images
+            total_errors = self._total_errors
+
+        def summarize(values):
+            if values.size == 0:
+                return {"avg": 0.0, "p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+            return {
+                "avg": float(values.mean()),
+                "p50": float(np.percentile(values, 50)),
+                "p95": float(np.percentile(values, 95)),
+                "p99": float(np.percentile(values, 99)),
+                "max": float(values.max()),
+            }
+
+        return {
+            "running": self._running,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "queue_depth": self._queue.qsize(),
+            "total_batches": total_batches,
+            "total_requests": total_requests,
+            "total_images": total_images,
+            "total_errors": total_errors,
+            "avg_batch_size": (total_images / total_batches) if total_batches else 0.0,
+            "batch_size_histogram": {str(k): v for k, v in batch_sizes.items()},
+            "queue_wait_ms": summarize(waits),
+            "forward_ms": summarize(forwards),
+        }
@@ -0,0 +1,155 @@
+"""
+Decision logic: class probabilities -> predicted label
+
+A prediction is confident when the top class probability reaches the
+threshold and beats the runner-up by at least the margin; otherwise the
+label is "unknown". decide() works on a whole (N x C) probability matrix
+at once: one argsort per call instead of one per row, with the labels,
+margins and flags computed as arrays. Taking the top two from the same
+argsort as the per-row implementation keeps tied probabilities in the same
+order, so the results are identical row for row.
+
+decide_one() is the same logic for a single vector in plain Python: for one
+row NumPy's per-call overhead outweighs the work, and the single-image and
+live endpoints classify one vector per request.
+"""
+import numpy as np
+
+UNKNOWN = "unknown"
+
+# Up to this many rows decide_one() per row beats decide()'s fixed array overhead
+SCALAR_MAX_ROWS = 4
+
+
+class Decisions:
+    """
+    Decisions for N rows, as arrays
+
+    Attributes:
+        top_idx, second_idx: int arrays of the best and runner-up class
+            (second_idx equals top_idx when there is a single class)
+        top_conf, second_conf, margin: float64 arrays
+        is_confident: bool array
+        labels: object array of class names, "unknown" where not confident
+    """
+
+    def __init__(self, top_idx, top_conf, second_idx, second_conf, margin, is_confident, labels, class_names):
+        self.top_idx = top_idx
+        self.top_conf = top_conf
+        self.second_idx = second_idx
+        self.second_conf = second_conf
+        self.margin = margin
+        self.is_confident = is_confident
+        self.labels = labels
+        self.class_names = class_names
+
+    def __len__(self):
+        return len(self.top_idx)
+
+    def as_dicts(self):
+        """
+        Returns:
+            List with one decision dictionary per row (the decision_details
+            returned by the prediction endpoints)
+        """
+        names = self.class_names
+        has_second = len(names) > 1
+        return [
+            {
+                "predicted_label": label,
+                "confidence": top_conf,
+                "best_class": names[top],
+                "best_confidence": top_conf,
+                "second_class": names[second] if has_second else None,
+                "second_confidence": second_conf,
+                "margin": margin,
+                "is_confident": confident,
+            }
+            for label, top, top_conf, second, second_conf, margin, confident in zip(
+                self.labels.tolist(),
+                self.top_idx.tolist(),
+                self.top_conf.tolist(),
+                self.second_idx.tolist(),
+                self.second_conf.tolist(),
+                self.margin.tolist(),
+                self.is_confident.tolist(),
+            )
+        ]
+
+
+def decide(probabilities, class_names, threshold, margin):
+    """
+    Apply the thresholding logic to every row of a probability matrix
+
+    Args:
+        probabilities: (N x C) or (C,) array of class probabilities
+        class_names: C class names
+        threshold: Minimum top-class probability
+        margin: Minimum gap between the top two classes
+
+    Returns:
+        Decisions with N rows (1 for a single vector)
+    """
+    probabilities = np.atleast_2d(np.asarray(probabilities))
+    rows = np.arange(probabilities.shape[0])
+    has_second = probabilities.shape[1] > 1
+
+    order = np.argsort(probabilities, axis=1)
+    top_idx = order[:, -1]
+    if has_second:
+        second_idx = order[:, -2]
+        top_two = probabilities[rows[:, None], order[:, -2:]].astype(np.float64)
+        second_conf, top_conf = top_two[:, 0], top_two[:, 1]
+    else:
+        second_idx = top_idx
+        top_conf = probabilities[rows, top_idx].astype(np.float64)
+        second_conf = np.zeros(len(rows))
+
+    margins = top_conf - second_conf
+    is_confident = (top_conf >= threshold) & (margins >= margin)
+    labels = np.asarray(class_names, dtype=object)[top_idx]
+    labels[~is_confident] = UNKNOWN
+
+    return Decisions(top_idx, top_conf, second_idx, second_conf, margins, is_confident, labels, class_names)
+
+
+def decide_one(probabilities, class_names, threshold, margin):
+    """
+    decide() for a single (C,) probability vector
+
+    Returns:
+        Decision dictionary, identical to decide(...).as_dicts()[0]
+    """
+    sorted_indices = np.argsort(probabilities)[::-1]
+    has_second = len(sorted_indices) > 1
+    top_idx = sorted_indices[0]
+    top_conf = float(probabilities[top_idx])
+    second_idx = sorted_indices[1] if has_second else top_idx
+    second_conf = float(probabilities[second_idx]) if has_second else 0.0
+
+    gap = top_conf - second_conf
+    is_confident = (top_conf >= threshold) and (gap >= margin)
+
+    return {
+        "predicted_label": class_names[top_idx] if is_confident else UNKNOWN,
+        "confidence": top_conf,
+        "best_class": class_names[top_idx],
+        "best_confidence": top_conf,
+        "second_class": class_names[second_idx] if has_second else None,
+        "second_confidence": second_conf,
+        "margin": gap,
+        "is_confident": is_confident,
+    }
+
+
+def decide_rows(probabilities, class_names, threshold, margin):
+    """
+    Decision dictionaries for every row of an (N x C) probability matrix,
+    using decide_one() for small N and decide() otherwise
+
+    Returns:
+        List with one decision dictionary per row
+    """
+    if len(probabilities) <= SCALAR_MAX_ROWS:
+        return [decide_one(row, class_names, threshold, margin) for row in probabilities]
+    return decide(probabilities, class_names, threshold, margin).as_dicts()
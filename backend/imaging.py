@@ -0,0 +1,151 @@
+"""
+Image decoding helpers for model input
+
+The fast path asks the JPEG decoder to downscale in the DCT domain (Pillow
+draft mode) so large photos are never materialized at full resolution, then
+resizes with Pillow's reducing_gap (Image.reduce) and writes the pixels into
+a caller-provided float32 buffer. Images that already have the model input
+size skip the resize, and raw RGB frames skip decoding altogether.
+"""
+import io
+import threading
+
+import numpy as np
+from PIL import Image
+
+from backend.metrics import stage
+
+ENCODED = 'encoded'  # Any image format Pillow can read
+RAW_RGB = 'raw'  # uint8 RGB pixels at exactly the model input size, row-major
+FRAME_FORMATS = (ENCODED, RAW_RGB)
+
+_local = threading.local()
+
+
+def thread_buffer(shape, dtype=np.float32):
+    """
+    Return a per-thread preallocated array of the given shape
+
+    The same array is handed out on every call from one thread, so callers
+    must be done with the previous contents before decoding the next image.
+    """
+    buffers = getattr(_local, 'buffers', None)
+    if buffers is None:
+        buffers = _local.buffers = {}
+    key = (tuple(shape), np.dtype(dtype).str)
+    buffer = buffers.get(key)
+    if buffer is None:
+        buffer = buffers[key] = np.empty(shape, dtype=dtype)
+    return buffer
+
+
+def open_rgb(image_bytes, size, fast=True):
+    """
+    Decode an encoded image to RGB
+
+    Args:
+        image_bytes: Raw image bytes (any format Pillow can read)
+        size: Target (width, height), used to pick the JPEG draft scale
+        fast: Use reduced-resolution JPEG decoding
+
+    Returns:
+        Loaded RGB PIL image (at least size for JPEG in fast mode)
+    """
+    image = Image.open(io.BytesIO(image_bytes))
+
+    if fast:
+        # Only affects JPEG: picks the largest 1/2, 1/4 or 1/8 DCT scale that
+        # still covers the target size and decodes straight to RGB.
+        image.draft('RGB', size)
+
+    image.load()
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    return image
+
+
+def resize_into(image, size, out=None, fast=True):
+    """
+    Resize an RGB image to the model input size and copy it into a float32 buffer
+
+    Args:
+        image: RGB PIL image from open_rgb
+        size: Target (width, height)
+        out: Optional float32 array of shape (height, width, 3) to write into
+        fast: Use reduce-based resizing
+
+    Returns:
+        float32 array of shape (height, width, 3) with RGB values in [0, 255]
+    """
+    if image.size == size:
+        pass  # Pre-resized by the client
+    elif fast:
+        image = image.resize(size, Image.BICUBIC, reducing_gap=2.0)
+    else:
+        image = image.resize(size)
+
+    if out is None:
+        out = np.empty((size[1], size[0], 3), dtype=np.float32)
+    out[...] = np.asarray(image)
+    return out
+
+
+def decode_image(image_bytes, size, out=None, fast=True):
+    """
+    Decode an encoded image and resize it to the model input size
+
+    Args:
+        image_bytes: Raw image bytes (any format Pillow can read)
+        size: Target (width, height)
+        out: Optional float32 array of shape (height, width, 3) to write into
+        fast: Use reduced-resolution JPEG decoding and reduce-based resizing
+
+    Returns:
+        float32 array of shape (height, width, 3) with RGB values in [0, 255]
+    """
+    with stage('decode'):
+        image = open_rgb(image_bytes, size, fast)
+    with stage('resize'):
+        return resize_into(image, size, out, fast)
+
+
+def raw_frame(frame_bytes, size):
+    """
+    View a raw RGB frame as an image array (no copy)
+
+    Args:
+        frame_bytes: width * height * 3 bytes of RGB pixels, row by row
+        size: Expected (width, height)
+
+    Returns:
+        uint8 array of shape (height, width, 3)
+
+    Raises:
+        ValueError: If the payload does not have the expected length
+    """
+    width, height = size
+    expected = width * height * 3
+    if len(frame_bytes) != expected:
+        raise ValueError(
+            f"Raw frame must be {width}x{height} RGB ({expected} bytes), got {len(frame_bytes)} bytes"
+        )
+    return np.frombuffer(frame_bytes, dtype=np.uint8).reshape(height, width, 3)
+
+
+def decode_raw(frame_bytes, size, out=None):
+    """
+    Copy a raw RGB frame into a float32 model input buffer
+
+    Args:
+        frame_bytes: Raw frame (see raw_frame)
+        size: Model input (width, height)
+        out: Optional float32 array of shape (height, width, 3) to write into
+
+    Returns:
+        float32 array of shape (height, width, 3) with RGB values in [0, 255]
+    """
+    pixels = raw_frame(frame_bytes, size)
+    if out is None:
+        out = np.empty(pixels.shape, dtype=np.float32)
+    out[...] = pixels
+    return out
@@ -0,0 +1,475 @@
+"""
+Backend-agnostic inference engines
+
+An engine owns the loaded model and a preprocessing pipeline that is built
+once at load time. Every engine takes the same input, a float32 NHWC batch of
+RGB images, and returns an (N x C) probability array, so the API server has a
+single hot path regardless of the framework behind it.
+"""
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+from backend.imaging import RAW_RGB, decode_image, decode_raw, thread_buffer
+from backend.metrics import stage
+
+KERAS_EXTENSIONS = ('.h5', '.keras')
+PYTORCH_EXTENSIONS = ('.pth', '.pt')
+ONNX_EXTENSIONS = ('.onnx',)
+TFLITE_EXTENSIONS = ('.tflite',)
+
+IMAGENET_MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+IMAGENET_STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+
+
+def resolve_model_type(model_path, model_type="auto"):
+    """
+    Work out which engine serves a model file
+
+    Args:
+        model_path: Path to the model file
+        model_type: Configured MODEL_TYPE ("auto" picks by file extension)
+
+    Returns:
+        Engine name: 'keras', 'pytorch', 'onnx' or 'tflite'
+    """
+    if model_type != "auto":
+        return model_type
+
+    extension = Path(model_path).suffix.lower()
+    if extension in KERAS_EXTENSIONS:
+        return 'keras'
+    if extension in PYTORCH_EXTENSIONS:
+        return 'pytorch'
+    if extension in ONNX_EXTENSIONS:
+        return 'onnx'
+    if extension in TFLITE_EXTENSIONS:
+        return 'tflite'
+    raise ValueError(f"Unknown model extension: {extension}")
+
+
+class InferenceEngine:
+    """
+    Base class for inference engines
+
+    Subclasses implement _normalize (in-place pixel normalization on the NHWC
+    buffer) and _forward (NHWC float32 batch -> probabilities).
+    """
+
+    name = None
+
+    def __init__(self, model, input_size, fast_decode=True):
+        self.model = model
+        self.input_size = input_size
+        self.fast_decode = fast_decode
+        self.warmed_up = False
+        self.warmup_seconds = None
+        self.import_seconds = None  # Importing the framework (set by load_engine)
+        self.load_seconds = None  # Deserializing the model file (set by load_engine)
+        self.version = None  # Content hash of the model file (set by the API server)
+
+    @property
+    def input_shape(self):
+        """Shape of a single-image NHWC batch"""
+        return (1, self.input_size[1], self.input_size[0], 3)
+
+    def preprocess(self, image_bytes, out=None, frame_format="encoded"):
+        """
+        Decode and normalize an image into a model-ready NHWC batch of one
+
+        Args:
+            image_bytes: Raw image bytes
+            out: Optional float32 array of shape input_shape to write into.
+                Defaults to a per-thread buffer reused by the next call from
+                the same thread.
+            frame_format: 'encoded' (JPEG, PNG, ...) or 'raw' (uint8 RGB at
+                input_size, see backend/imaging.py)
+
+        Returns:
+            float32 array of shape input_shape
+        """
+        if out is None:
+            out = thread_buffer(self.input_shape)
+        if frame_format == RAW_RGB:
+            with stage("decode"):
+                decode_raw(image_bytes, self.input_size, out=out[0])
+        else:
+            decode_image(image_bytes, self.input_size, out=out[0], fast=self.fast_decode)
+        with stage("normalize"):
+            return self._normalize(out)
+
+    def predict_batch(self, batch):
+        """
+        Run one forward pass
+
+        Args:
+            batch: float32 array of shape (N, height, width, 3) from preprocess
+
+        Returns:
+            float32 array of shape (N, num_classes) with class probabilities
+        """
+        return np.asarray(self._forward(batch), dtype=np.float32)
+
+    def warmup(self, batch_sizes=(1,)):
+        """Run dummy batches so graph tracing / allocation happens before serving"""
+        started = time.perf_counter()
+        for batch_size in batch_sizes:
+            dummy = np.zeros((batch_size,) + self.input_shape[1:], dtype=np.float32)
+            self.predict_batch(self._normalize(dummy))
+        self.warmup_seconds = time.perf_counter() - started
+        self.warmed_up = True
+
+    def count_params(self):
+        """Number of model parameters, or None when the runtime can't tell"""
+        return None
+
+    def _normalize(self, batch):
+        raise NotImplementedError
+
+    def _forward(self, batch):
+        raise NotImplementedError
+
+
+class KerasFamilyEngine(InferenceEngine):
+    """
+    Base for engines serving models built by model/cnn_model.py (Keras and
+    its ONNX/TFLite exports), which share the same pixel normalization
+    """
+
+    def __init__(self, model, input_size, backbone, fast_decode=True):
+        super().__init__(model, input_size, fast_decode)
+        # EfficientNet models rescale inside the graph (keras' efficientnet
+        # preprocess_input is a pass-through); other backbones expect [0, 1].
+        self._rescale = not backbone.lower().startswith("efficientnet")
+
+    def _normalize(self, batch):
+        if self._rescale:
+            batch /= 255.0
+        return batch
+
+
+class KerasEngine(KerasFamilyEngine):
+    """
+    Keras engine
+
+    serving_mode 'predict' calls model.predict, which is built for datasets and
+    pays data-adapter/callback overhead on every call. 'compiled' wraps the
+    model in a tf.function with a fixed (None, H, W, 3) signature that is
+    called directly on tensors; with jit_compile=True it is compiled with XLA.
+    Compiled batches are zero-padded up to the nearest of batch_buckets so only
+    a handful of shapes are ever traced/compiled.
+    """
+
+    name = 'keras'
+
+    def __init__(self, model, input_size, backbone, fast_decode=True,
+                 serving_mode='compiled', batch_buckets=(1, 2, 4, 8, 16, 32), jit_compile=False):
+        super().__init__(model, input_size, backbone, fast_decode)
+
+        if serving_mode not in ('predict', 'compiled'):
+            raise ValueError(f"Unknown Keras serving mode: {serving_mode}")
+        self.serving_mode = serving_mode
+        self.jit_compile = jit_compile
+        self.batch_buckets = tuple(sorted(set(batch_buckets)))
+        self._serve = self._build_serving_function() if serving_mode == 'compiled' else None
+
+    @classmethod
+    def load(cls, model_path, input_size, backbone, fast_decode=True, **options):
+        from tensorflow import keras
+
+        return cls(keras.models.load_model(model_path), input_size, backbone, fast_decode, **options)
+
+    def _build_serving_function(self):
+        import tensorflow as tf
+
+        model = self.model
+        spec = tf.TensorSpec((None, self.input_size[1], self.input_size[0], 3), tf.float32)
+
+        @tf.function(input_signature=[spec], jit_compile=self.jit_compile)
+        def serve(images):
+            return model(images, training=False)
+
+        self._tf = tf
+        return serve
+
+    def _bucket_for(self, batch_size):
+        for bucket in self.batch_buckets:
+            if bucket >= batch_size:
+                return bucket
+        return self.batch_buckets[-1]
+
+    def warmup(self, batch_sizes=(1,)):
+        if self._serve is not None:
+            batch_sizes = sorted({self._bucket_for(size) for size in batch_sizes} | set(self.batch_buckets))
+        super().warmup(batch_sizes)
+
+    def _forward(self, batch):
+        if self._serve is None:
+            return self.model.predict(batch, verbose=0)
+
+        outputs = []
+        largest = self.batch_buckets[-1]
+        for start in range(0, len(batch), largest):
+            chunk = batch[start:start + largest]
+            count = len(chunk)
+            bucket = self._bucket_for(count)
+            if bucket != count:
+                padding = np.zeros((bucket - count,) + chunk.shape[1:], dtype=np.float32)
+                chunk = np.concatenate([chunk, padding], axis=0)
+            probabilities = self._serve(self._tf.convert_to_tensor(chunk, dtype=self._tf.float32))
+            outputs.append(probabilities.numpy()[:count])
+        return outputs[0] if len(outputs) == 1 else np.concatenate(outputs, axis=0)
+
+    def count_params(self):
+        return int(self.model.count_params())
+
+
+class OnnxEngine(KerasFamilyEngine):
+    """ONNX Runtime engine for models exported by model/tools/export_model.py"""
+
+    name = 'onnx'
+
+    def __init__(self, session, input_size, backbone, fast_decode=True, parameter_count=None):
+        super().__init__(session, input_size, backbone, fast_decode)
+        self._input_name = session.get_inputs()[0].name
+        self._parameter_count = parameter_count
+
+    @classmethod
+    def load(cls, model_path, input_size, backbone, fast_decode=True, intra_op_threads=0):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = intra_op_threads
+        session = ort.InferenceSession(str(model_path), options, providers=['CPUExecutionProvider'])
+        return cls(session, input_size, backbone, fast_decode, _onnx_parameter_count(model_path))
+
+    def _forward(self, batch):
+        return self.model.run(None, {self._input_name: np.ascontiguousarray(batch, dtype=np.float32)})[0]
+
+    def count_params(self):
+        return self._parameter_count
+
+
+def _onnx_parameter_count(model_path):
+    try:
+        import onnx
+    except ImportError:
+        return None
+    graph = onnx.load(str(model_path)).graph
+    return int(sum(int(np.prod(tensor.dims)) for tensor in graph.initializer))
+
+
+def _tflite_interpreter_class():
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+    except ImportError:
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+
+            Interpreter = tf.lite.Interpreter
+    return Interpreter
+
+
+class TFLiteEngine(KerasFamilyEngine):
+    """
+    TFLite engine for models exported by model/tools/export_model.py
+
+    Uses the standalone LiteRT/tflite_runtime interpreter when installed and
+    falls back to tf.lite. The interpreter is not thread-safe, so calls are
+    serialized and the input tensor is only resized when the batch size changes.
+    Fully integer-quantized models (model/tools/quantize_model.py) are fed and
+    read back through the tensors' scale and zero point.
+    """
+
+    name = 'tflite'
+
+    def __init__(self, interpreter, input_size, backbone, fast_decode=True):
+        super().__init__(interpreter, input_size, backbone, fast_decode)
+        self._lock = threading.Lock()
+        self._input = interpreter.get_input_details()[0]
+        self._output = interpreter.get_output_details()[0]
+        self._batch_size = None
+
+    @classmethod
+    def load(cls, model_path, input_size, backbone, fast_decode=True, num_threads=None):
+        Interpreter = _tflite_interpreter_class()
+        interpreter = Interpreter(model_path=str(model_path), num_threads=num_threads)
+        return cls(interpreter, input_size, backbone, fast_decode)
+
+    def _forward(self, batch):
+        interpreter = self.model
+        with self._lock:
+            if self._batch_size != len(batch):
+                interpreter.resize_tensor_input(self._input['index'], list(batch.shape))
+                interpreter.allocate_tensors()
+                self._batch_size = len(batch)
+            interpreter.set_tensor(self._input['index'], self._quantize_input(batch))
+            interpreter.invoke()
+            return self._dequantize_output(interpreter.get_tensor(self._output['index']))
+
+    def _quantize_input(self, batch):
+        dtype = self._input['dtype']
+        if not np.issubdtype(dtype, np.integer):
+            return np.ascontiguousarray(batch, dtype=np.float32)
+        scale, zero_point = self._input['quantization']
+        info = np.iinfo(dtype)
+        return np.clip(np.round(batch / scale + zero_point), info.min, info.max).astype(dtype)
+
+    def _dequantize_output(self, output):
+        if not np.issubdtype(output.dtype, np.integer):
+            return output.copy()
+        scale, zero_point = self._output['quantization']
+        return (output.astype(np.float32) - zero_point) * scale
+
+    def count_params(self):
+        return None
+
+
+class TorchEngine(InferenceEngine):
+    name = 'pytorch'
+
+    def __init__(self, model, input_size, fast_decode=True):
+        super().__init__(model, input_size, fast_decode)
+        import torch
+
+        self._torch = torch
+        self.model.eval()
+
+    @classmethod
+    def load(cls, model_path, input_size, fast_decode=True):
+        import torch
+
+        model = torch.load(model_path, map_location=torch.device('cpu'))
+        if isinstance(model, dict):
+            raise ValueError(
+                "Loaded a state_dict. Provide the full model or update the code with your model architecture."
+            )
+        return cls(model, input_size, fast_decode)
+
+    def _normalize(self, batch):
+        # Same as ToTensor() + Normalize(), computed in place on the buffer
+        batch /= 255.0
+        batch -= IMAGENET_MEAN
+        batch /= IMAGENET_STD
+        return batch
+
+    def _forward(self, batch):
+        torch = self._torch
+        inputs = torch.from_numpy(np.ascontiguousarray(batch)).permute(0, 3, 1, 2)  # NHWC -> NCHW
+        with torch.no_grad():
+            outputs = self.model(inputs)
+            return torch.nn.functional.softmax(outputs, dim=1).cpu().numpy()
+
+    def count_params(self):
+        return int(sum(p.numel() for p in self.model.parameters()))
+
+
+def configure_threads(engine_type, intra_op_threads=0, inter_op_threads=0):
+    """
+    Size the TensorFlow / PyTorch thread pools before a model is loaded
+
+    The pools are process-wide and TensorFlow cannot resize them once its
+    runtime has initialized, so call this once per process before the first
+    model is loaded (load_engine does not), not again on model reloads.
+    ONNX Runtime and TFLite take their thread counts per session instead.
+    A value of 0 keeps the framework default.
+    """
+    if engine_type == 'keras':
+        import tensorflow as tf
+
+        try:
+            if intra_op_threads:
+                tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads)
+            if inter_op_threads:
+                tf.config.threading.set_inter_op_parallelism_threads(inter_op_threads)
+        except RuntimeError:
+            print("⚠ TensorFlow runtime already initialized; thread pool sizes unchanged")
+    elif engine_type == 'pytorch':
+        import torch
+
+        if intra_op_threads:
+            torch.set_num_threads(intra_op_threads)
+        if inter_op_threads:
+            try:
+                torch.set_num_interop_threads(inter_op_threads)
+            except RuntimeError:
+                print("⚠ PyTorch inter-op pool already started; size unchanged")
+
+
+def import_framework(engine_type):
+    """
+    Import the runtime an engine needs, and only that one
+
+    Frameworks are imported on first use rather than at module import, so a
+    server running an ONNX model never loads TensorFlow or PyTorch.
+    """
+    if engine_type == 'keras':
+        import tensorflow  # noqa: F401
+    elif engine_type == 'pytorch':
+        import torch  # noqa: F401
+    elif engine_type == 'onnx':
+        import onnxruntime  # noqa: F401
+    elif engine_type == 'tflite':
+        _tflite_interpreter_class()
+
+
+def load_engine(model_path, model_type, input_size, backbone, fast_decode=True,
+                keras_serving_mode='compiled', batch_buckets=(1, 2, 4, 8, 16, 32), jit_compile=False,
+                intra_op_threads=0):
+    """
+    Load a model file into the matching inference engine
+
+    Args:
+        model_path: Path to the model file
+        model_type: Configured MODEL_TYPE ("auto" picks by file extension)
+        input_size: Model input (width, height)
+        backbone: Configured MODEL_BACKBONE
+        fast_decode: Use reduced-resolution JPEG decoding in preprocess
+        keras_serving_mode: 'compiled' (tf.function) or 'predict' (model.predict)
+        batch_buckets: Batch sizes compiled Keras batches are padded up to
+        jit_compile: Compile the Keras serving function with XLA
+        intra_op_threads: Threads of the ONNX Runtime / TFLite session (0 =
+            framework default); TensorFlow and PyTorch use configure_threads
+
+    Returns:
+        InferenceEngine instance, with import_seconds and load_seconds set
+    """
+    engine_type = resolve_model_type(model_path, model_type)
+    started = time.perf_counter()
+    import_framework(engine_type)
+    import_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    engine = _load_engine(
+        model_path, engine_type, input_size, backbone, fast_decode, keras_serving_mode,
+        batch_buckets, jit_compile, intra_op_threads,
+    )
+    engine.import_seconds = import_seconds
+    engine.load_seconds = time.perf_counter() - started
+    return engine
+
+
+def _load_engine(model_path, engine_type, input_size, backbone, fast_decode, keras_serving_mode,
+                 batch_buckets, jit_compile, intra_op_threads):
+    if engine_type == 'keras':
+        return KerasEngine.load(
+            model_path,
+            input_size,
+            backbone,
+            fast_decode,
+            serving_mode=keras_serving_mode,
+            batch_buckets=batch_buckets,
+            jit_compile=jit_compile,
+        )
+    if engine_type == 'pytorch':
+        return TorchEngine.load(model_path, input_size, fast_decode)
+    if engine_type == 'onnx':
+        return OnnxEngine.load(model_path, input_size, backbone, fast_decode, intra_op_threads=intra_op_threads)
+    if engine_type == 'tflite':
+        return TFLiteEngine.load(model_path, input_size, backbone, fast_decode, num_threads=intra_op_threads or None)
+    raise ValueError(f"Unsupported model type: {engine_type}")
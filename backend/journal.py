@@ -0,0 +1,511 @@
+"""
+Durable local journal for predictions that could not reach Supabase
+
+Each entry is one JSON line (with a CRC32 so a torn write at the tail of a
+crashed segment is detected and skipped) in an append-only segment file; the
+image bytes sit next to the segments under images/. A replayer drains sealed
+segments into SupabaseDB once it is reachable again. Replay is idempotent:
+rows whose filename is already in the table are not inserted twice and
+uploads overwrite the same object name, so a crash halfway through a segment
+only means that segment is replayed again.
+
+Several processes (gunicorn workers) can share one journal directory. Each
+appends to its own segment-<pid>-<token>-<n>.open file, holding an flock on
+it, and renames it to .log when sealing it; only .log segments are replayed.
+An .open segment nobody holds a lock on belongs to a process that died and
+is sealed by whichever replayer finds it. Replaying a segment also takes its
+lock, so two workers never replay the same segment at once.
+
+Entries the database keeps rejecting while it is otherwise reachable (e.g. a
+row violating a constraint) are moved to dead-letter/ instead of blocking
+the rest of the journal.
+
+fsync policies:
+    always   - every append is on disk before it returns (concurrent appends
+               share one fsync)
+    interval - a background thread fsyncs every fsync_interval_ms; a crash
+               loses at most that window
+    none     - data is handed to the OS only
+"""
+import json
+import os
+import secrets
+import threading
+import zlib
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: a single development server per journal
+    fcntl = None
+
+FSYNC_POLICIES = ("always", "interval", "none")
+ACTIVE_SUFFIX = ".open"
+SEALED_SUFFIX = ".log"
+
+
+def _encode(record):
+    payload = json.dumps(record, separators=(",", ":"), sort_keys=True)
+    return f"{payload}\t{zlib.crc32(payload.encode()):08x}\n".encode()
+
+
+def _decode(line):
+    payload, _, checksum = line.rstrip(b"\n").rpartition(b"\t")
+    if not payload or f"{zlib.crc32(payload):08x}".encode() != checksum:
+        return None
+    return json.loads(payload)
+
+
+def _try_lock(f):
+    """Exclusive flock on an open file without blocking; False if another open file holds it"""
+    if fcntl is None:
+        return True
+    try:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except OSError:
+        return False
+
+
+def _write_file(path, data, fsync):
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}-{threading.get_ident()}.tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        if fsync:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class PredictionJournal:
+    """
+    Append-only on-disk journal of prediction rows and their images
+
+    Args:
+        directory: Journal directory (created if missing)
+        fsync: 'always', 'interval' or 'none'
+        fsync_interval_ms: Background fsync period for the 'interval' policy
+        segment_max_bytes: Size after which the active segment is sealed
+    """
+
+    def __init__(self, directory, fsync="interval", fsync_interval_ms=100, segment_max_bytes=4 * 1024 * 1024):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy: {fsync}")
+        self.directory = Path(directory)
+        self.images_dir = self.directory / "images"
+        self.images_dir.mkdir(parents=True, exist_ok=True)
+        self.dead_letter_dir = self.directory / "dead-letter"
+        self.fsync = fsync
+        self.fsync_interval = max(1.0, float(fsync_interval_ms)) / 1000.0
+        self.segment_max_bytes = int(segment_max_bytes)
+
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._file = None
+        self._segment = None
+        self._prefix = f"segment-{os.getpid()}-{secrets.token_hex(4)}"  # Unique to this journal instance
+        self._number = 0
+        self._written = 0  # appends written to the active segment
+        self._synced = 0  # appends known to be on disk
+        self._total_appends = 0
+        self._open_segment()
+
+        self._closed = threading.Event()
+        self._sync_thread = None
+        if fsync == "interval":
+            self._sync_thread = threading.Thread(target=self._sync_loop, name="journal-fsync", daemon=True)
+            self._sync_thread.start()
+
+    def _segment_paths(self, suffix=SEALED_SUFFIX):
+        """Segments with the given suffix, oldest first"""
+        paths = []
+        for path in self.directory.glob(f"segment-*{suffix}"):
+            try:
+                paths.append((path.stat().st_mtime_ns, path))
+            except FileNotFoundError:  # Replayed by another process meanwhile
+                continue
+        return [path for _, path in sorted(paths)]
+
+    def _open_segment(self):
+        self._number += 1
+        self._segment = self.directory / f"{self._prefix}-{self._number:08d}{ACTIVE_SUFFIX}"
+        self._file = open(self._segment, "xb")
+        _try_lock(self._file)  # Held until the segment is sealed
+        self._written = self._synced = 0
+
+    def append(self, record, image_bytes=None, shared_object=False):
+        """
+        Journal a prediction row and (optionally) its image
+
+        Args:
+            record: Row dictionary; must contain 'filename'
+            image_bytes: Image to upload on replay (None if already uploaded)
+            shared_object: The row reuses another row's storage object, so
+                an existing row with the same filename does not mean this
+                one was replayed already
+        """
+        entry = dict(record)
+        entry["journaled_at"] = datetime.now().isoformat()
+        if shared_object:
+            entry["shared_object"] = True
+        if image_bytes is not None:
+            entry["image"] = record["filename"]
+            _write_file(self.images_dir / record["filename"], image_bytes, self.fsync == "always")
+        line = _encode(entry)
+
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            self._written += 1
+            self._total_appends += 1
+            segment, sequence = self._segment, self._written
+            full = self._file.tell() >= self.segment_max_bytes
+
+        if full:
+            # Sealing fsyncs the whole segment, which covers this append too.
+            with self._sync_lock, self._lock:
+                if self._segment == segment:
+                    self._seal_locked()
+        elif self.fsync == "always":
+            self._sync_to(segment, sequence)
+
+    def _sync_to(self, segment, sequence):
+        # Group commit: whoever gets the sync lock fsyncs everything written
+        # so far, so appends waiting behind it usually find themselves covered.
+        with self._sync_lock:
+            with self._lock:
+                if self._segment != segment or self._synced >= sequence:
+                    return
+                fd = self._file.fileno()
+                target = self._written
+            os.fsync(fd)
+            with self._lock:
+                if self._segment == segment:
+                    self._synced = max(self._synced, target)
+
+    def _sync_loop(self):
+        while not self._closed.wait(self.fsync_interval):
+            with self._sync_lock:
+                with self._lock:
+                    if self._synced >= self._written:
+                        continue
+                    fd = self._file.fileno()
+                    target = self._written
+                    segment = self._segment
+                os.fsync(fd)
+                with self._lock:
+                    if self._segment == segment:
+                        self._synced = max(self._synced, target)
+
+    def _close_segment_locked(self):
+        # Callers hold both _sync_lock and _lock, so no fsync is running on
+        # the file being closed. The rename happens while the flock is still
+        # held, so no replayer takes the segment for an orphan in between
+        # (Windows has no flock and cannot rename an open file).
+        empty = self._file.tell() == 0
+        if not empty and self.fsync != "none":
+            os.fsync(self._file.fileno())
+        if fcntl is None:
+            self._file.close()
+        if empty:
+            self._segment.unlink(missing_ok=True)
+        else:
+            self._segment.rename(self._segment.with_suffix(SEALED_SUFFIX))
+        self._file.close()
+
+    def _seal_locked(self):
+        self._close_segment_locked()
+        self._open_segment()
+
+    def seal(self):
+        """Close the active segment (if it has entries) so it can be replayed"""
+        with self._sync_lock, self._lock:
+            if self._file.tell() > 0:
+                self._seal_locked()
+
+    def sealed_segments(self):
+        """Segment files that are no longer being appended to, oldest first"""
+        self._seal_orphans()
+        return self._segment_paths()
+
+    def _seal_orphans(self):
+        """Seal the active segments of processes that exited without closing their journal"""
+        with self._lock:
+            own = self._segment
+        for path in self._segment_paths(ACTIVE_SUFFIX):
+            if path == own:
+                continue
+            try:
+                with open(path, "rb") as f:
+                    if not _try_lock(f) or os.fstat(f.fileno()).st_nlink == 0:
+                        continue  # Still being appended to, or sealed meanwhile
+                    path.rename(path.with_suffix(SEALED_SUFFIX))
+            except OSError:
+                continue
+
+    @contextmanager
+    def claim(self, path):
+        """
+        Lock a sealed segment for replay
+
+        Yields:
+            True if this caller may replay (and remove) the segment; False if
+            another process is replaying it or already removed it
+        """
+        if fcntl is None:
+            yield path.exists()
+            return
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            yield False
+            return
+        with f:
+            yield _try_lock(f) and os.fstat(f.fileno()).st_nlink > 0
+
+    def read_segment(self, path):
+        """
+        Read the valid entries of a segment
+
+        Returns:
+            Tuple of (entries, corrupt line count)
+        """
+        entries, corrupt = [], 0
+        with open(path, "rb") as f:
+            for line in f:
+                entry = _decode(line)
+                if entry is None:
+                    corrupt += 1
+                else:
+                    entries.append(entry)
+        return entries, corrupt
+
+    def image_bytes(self, entry):
+        """Image bytes of an entry, or None if it has none (or it was lost)"""
+        if not entry.get("image"):
+            return None
+        path = self.images_dir / entry["image"]
+        return path.read_bytes() if path.exists() else None
+
+    def dead_letter(self, entry, error):
+        """
+        Move an entry the database keeps rejecting (and its image) to dead-letter/
+
+        The entry is removed from the replay cycle; dead-letter/entries.log
+        keeps it, with the error, for manual inspection.
+        """
+        images_dir = self.dead_letter_dir / "images"
+        images_dir.mkdir(parents=True, exist_ok=True)
+        if entry.get("image"):
+            try:
+                os.replace(self.images_dir / entry["image"], images_dir / entry["image"])
+            except FileNotFoundError:
+                pass
+        line = _encode(dict(entry, error=str(error), dead_lettered_at=datetime.now().isoformat()))
+        with open(self.dead_letter_dir / "entries.log", "ab") as f:
+            f.write(line)  # One write on an O_APPEND file: lines from several processes do not interleave
+            if self.fsync != "none":
+                f.flush()
+                os.fsync(f.fileno())
+
+    def remove_segment(self, path, entries):
+        """Delete a replayed segment and the images its entries referenced"""
+        for entry in entries:
+            if entry.get("image"):
+                (self.images_dir / entry["image"]).unlink(missing_ok=True)
+        path.unlink(missing_ok=True)
+
+    def pending_entries(self):
+        """Number of entries not yet replayed (including the active segments)"""
+        total = 0
+        for path in self._segment_paths() + self._segment_paths(ACTIVE_SUFFIX):
+            try:
+                with open(path, "rb") as f:
+                    total += sum(1 for _ in f)
+            except FileNotFoundError:
+                continue
+        return total
+
+    def stats(self):
+        with self._lock:
+            return {
+                "fsync": self.fsync,
+                "active_segment": self._segment.name,
+                "sealed_segments": len(self._segment_paths()),
+                "total_appends": self._total_appends,
+                "unsynced_appends": self._written - self._synced if self.fsync != "none" else None,
+            }
+
+    def close(self):
+        """Stop the fsync thread and flush the active segment to disk"""
+        self._closed.set()
+        if self._sync_thread is not None:
+            self._sync_thread.join()
+        with self._sync_lock, self._lock:
+            self._close_segment_locked()
+
+
+class JournalReplayer:
+    """
+    Drains journal segments into Supabase when it is reachable
+
+    Args:
+        journal: PredictionJournal
+        get_db: Callable returning a SupabaseDB (or None while unavailable)
+        interval_seconds: Time between replay attempts
+    """
+
+    def __init__(self, journal, get_db, interval_seconds=30.0, insert_chunk=500):
+        self.journal = journal
+        self.get_db = get_db
+        self.interval = max(0.1, float(interval_seconds))
+        self.insert_chunk = max(1, int(insert_chunk))
+
+        self.database_reachable = True
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._replayed_entries = 0
+        self._skipped_duplicates = 0
+        self._missing_images = 0
+        self._corrupt_lines = 0
+        self._dead_lettered = 0
+        self._last_error = None
+        self._last_replay_at = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="journal-replayer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=10.0):
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._thread = None
+
+    def mark_unreachable(self, error=None):
+        """Record a failed database call; requests journal directly until a replay succeeds"""
+        with self._lock:
+            self.database_reachable = False
+            if error is not None:
+                self._last_error = str(error)
+
+    def trigger(self):
+        """Replay as soon as possible instead of waiting for the interval"""
+        self._wake.set()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                self.replay()
+            except Exception as e:
+                self.mark_unreachable(e)
+                print(f"⚠ Journal replay failed: {e}")
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def replay(self):
+        """
+        Replay every journaled entry into the database
+
+        Returns:
+            Number of entries inserted
+        """
+        db = self.get_db()
+        if db is None:
+            raise RuntimeError("database not connected")
+
+        self.journal.seal()
+        inserted = 0
+        for path in self.journal.sealed_segments():
+            inserted += self._replay_segment(db, path)
+
+        with self._lock:
+            self.database_reachable = True
+            self._last_replay_at = datetime.now().isoformat()
+        if inserted:
+            print(f"✓ Replayed {inserted} journaled predictions into Supabase")
+        return inserted
+
+    def _replay_segment(self, db, path):
+        with self.journal.claim(path) as claimed:
+            if not claimed:
+                return 0
+            entries, corrupt = self.journal.read_segment(path)
+            existing = db.existing_filenames([entry["filename"] for entry in entries])
+
+            # Rows sharing an object cannot be told apart by filename; they are replayed at least once
+            missing = [entry for entry in entries if entry.get("shared_object") or entry["filename"] not in existing]
+            missing_images = 0
+            rejected = set()  # Filenames moved to the dead letters
+            for entry in missing:
+                image_bytes = self.journal.image_bytes(entry)
+                if image_bytes is not None:
+                    try:
+                        db.upload_image(image_bytes, entry["filename"])
+                    except Exception as e:
+                        self._reject(db, entry, e)
+                        rejected.add(entry["filename"])
+                elif entry.get("image"):
+                    missing_images += 1
+
+            rows = [entry for entry in missing if entry["filename"] not in rejected]
+            for start in range(0, len(rows), self.insert_chunk):
+                chunk = rows[start:start + self.insert_chunk]
+                try:
+                    db.save_predictions(chunk)
+                except Exception:
+                    # Find the rows the database rejects by inserting one at a time
+                    for entry in chunk:
+                        try:
+                            db.save_predictions([entry])
+                        except Exception as e:
+                            self._reject(db, entry, e)
+                            rejected.add(entry["filename"])
+
+            self.journal.remove_segment(path, entries)
+        with self._lock:
+            self._replayed_entries += len(missing) - len(rejected)
+            self._skipped_duplicates += len(entries) - len(missing)
+            self._missing_images += missing_images
+            self._corrupt_lines += corrupt
+        return len(missing) - len(rejected)
+
+    def _reject(self, db, entry, error):
+        """
+        Dead-letter an entry the database rejected, if the database is otherwise reachable
+
+        Raises:
+            The original error when the database cannot be read either (an
+            outage, so the segment is kept and replayed later)
+        """
+        try:
+            db.existing_filenames([entry["filename"]])
+        except Exception:
+            raise error
+        self.journal.dead_letter(entry, error)
+        with self._lock:
+            self._dead_lettered += 1
+        print(f"⚠ Journal entry {entry['filename']} moved to {self.journal.dead_letter_dir}: {error}")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "database_reachable": self.database_reachable,
+                "pending_entries": self.journal.pending_entries(),
+                "replayed_entries": self._replayed_entries,
+                "skipped_duplicates": self._skipped_duplicates,
+                "missing_images": self._missing_images,
+                "corrupt_lines": self._corrupt_lines,
+                "dead_lettered": self._dead_lettered,
+                "last_error": self._last_error,
+                "last_replay_at": self._last_replay_at,
+                "journal": self.journal.stats(),
+            }
@@ -0,0 +1,184 @@
+"""
+Motion-gated live-feed sessions
+
+Each camera keeps a tiny luminance fingerprint of the last frame that went
+through the model. Frames that barely differ from it reuse the previous
+(exponentially smoothed) probabilities instead of running inference again.
+"""
+import io
+import threading
+import time
+
+import numpy as np
+from PIL import Image
+
+from backend.imaging import raw_frame
+
+FINGERPRINT_SIZE = 16
+
+
+def frame_fingerprint(image_bytes, size=FINGERPRINT_SIZE, raw_size=None):
+    """
+    Compute a downscaled luminance fingerprint of a frame
+
+    JPEG frames are decoded at reduced scale (DCT-domain downscaling), so this
+    costs a fraction of a full decode.
+
+    Args:
+        image_bytes: Encoded frame, or raw RGB frame when raw_size is given
+        size: Fingerprint width and height
+        raw_size: (width, height) of a raw RGB frame
+
+    Returns:
+        float32 array of shape (size, size) with values in [0, 1]
+    """
+    if raw_size is not None:
+        image = Image.fromarray(raw_frame(image_bytes, raw_size))
+    else:
+        image = Image.open(io.BytesIO(image_bytes))
+        image.draft('L', (size * 8, size * 8))
+    image = image.convert('L').resize((size, size), Image.BILINEAR)
+    return np.asarray(image, dtype=np.float32) / 255.0
+
+
+class LiveSession:
+    """State kept for one live camera feed"""
+
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.lock = threading.Lock()
+        self.fingerprint = None
+        self.probabilities = None
+        self.frames_since_inference = 0
+        self.inferred_frames = 0
+        self.skipped_frames = 0
+        self.last_seen = time.monotonic()
+
+    def summary(self):
+        total = self.inferred_frames + self.skipped_frames
+        return {
+            "id": self.session_id,
+            "inferred_frames": self.inferred_frames,
+            "skipped_frames": self.skipped_frames,
+            "skip_ratio": (self.skipped_frames / total) if total else 0.0,
+        }
+
+
+class LiveSessionStore:
+    """
+    Per-session motion gating for /api/predict-live
+
+    Args:
+        motion_threshold: Mean absolute luminance difference (0-1) below which
+            a frame is considered unchanged and inference is skipped
+        ema_alpha: Weight of the newest inference in the smoothed probabilities
+        max_skipped_frames: Force an inference after this many skipped frames
+        scene_cut_threshold: Difference above which smoothing restarts from the
+            newest inference instead of blending with the previous scene
+        session_ttl: Seconds of inactivity after which a session is dropped
+        max_sessions: Maximum number of tracked sessions
+    """
+
+    def __init__(self, motion_threshold=0.02, ema_alpha=0.6, max_skipped_frames=10,
+                 scene_cut_threshold=0.15, session_ttl=60.0, max_sessions=256):
+        self.motion_threshold = float(motion_threshold)
+        self.ema_alpha = float(ema_alpha)
+        self.max_skipped_frames = int(max_skipped_frames)
+        self.scene_cut_threshold = float(scene_cut_threshold)
+        self.session_ttl = float(session_ttl)
+        self.max_sessions = int(max_sessions)
+
+        self._lock = threading.Lock()
+        self._sessions = {}
+
+    def _get_session(self, session_id):
+        now = time.monotonic()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                self._expire(now)
+                if len(self._sessions) >= self.max_sessions:
+                    oldest = min(self._sessions.values(), key=lambda s: s.last_seen)
+                    del self._sessions[oldest.session_id]
+                session = LiveSession(session_id)
+                self._sessions[session_id] = session
+            session.last_seen = now
+            return session
+
+    def _expire(self, now):
+        stale = [
+            session_id for session_id, session in self._sessions.items()
+            if now - session.last_seen > self.session_ttl
+        ]
+        for session_id in stale:
+            del self._sessions[session_id]
+
+    def process(self, session_id, image_bytes, infer, raw_size=None):
+        """
+        Classify a frame, skipping inference when it matches the last inferred frame
+
+        Args:
+            session_id: Client-provided identifier of the camera feed
+            image_bytes: Encoded frame (or raw RGB frame, see raw_size)
+            infer: Callable taking image_bytes and returning the probability vector
+            raw_size: (width, height) when image_bytes is a raw RGB frame
+
+        Returns:
+            Tuple of (smoothed probabilities, skipped, session summary dict)
+        """
+        session = self._get_session(session_id)
+        fingerprint = frame_fingerprint(image_bytes, raw_size=raw_size)
+
+        with session.lock:
+            difference = None
+            if session.fingerprint is not None:
+                difference = float(np.mean(np.abs(fingerprint - session.fingerprint)))
+                if (difference < self.motion_threshold
+                        and session.frames_since_inference < self.max_skipped_frames):
+                    session.frames_since_inference += 1
+                    session.skipped_frames += 1
+                    return session.probabilities.copy(), True, session.summary()
+
+            probabilities = np.asarray(infer(image_bytes), dtype=np.float64)
+            if difference is None or difference >= self.scene_cut_threshold:
+                session.probabilities = probabilities
+            else:
+                session.probabilities = (
+                    self.ema_alpha * probabilities
+                    + (1.0 - self.ema_alpha) * session.probabilities
+                )
+
+            session.fingerprint = fingerprint
+            session.frames_since_inference = 0
+            session.inferred_frames += 1
+            return session.probabilities.copy(), False, session.summary()
+
+    def end_session(self, session_id):
+        """Forget a session (e.g. when the client stops its live feed)"""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def stats(self):
+        """
+        Get per-session skipped/inferred counters
+
+        Returns:
+            Dictionary with totals and one summary per active session
+        """
+        with self._lock:
+            self._expire(time.monotonic())
+            sessions = [session.summary() for session in self._sessions.values()]
+
+        inferred = sum(s["inferred_frames"] for s in sessions)
+        skipped = sum(s["skipped_frames"] for s in sessions)
+        total = inferred + skipped
+        return {
+            "active_sessions": len(sessions),
+            "motion_threshold": self.motion_threshold,
+            "ema_alpha": self.ema_alpha,
+            "max_skipped_frames": self.max_skipped_frames,
+            "inferred_frames": inferred,
+            "skipped_frames": skipped,
+            "skip_ratio": (skipped / total) if total else 0.0,
+            "sessions": sessions,
+        }
@@ -0,0 +1,204 @@
+"""
+Prometheus metrics for the API server
+
+Request and per-stage latency histograms, error counters and an in-flight
+gauge, exposed in the Prometheus text format by /metrics. Stages are timed
+with stage(), which labels each observation with the endpoint handling the
+current thread's request ('background' for worker threads such as the
+micro-batcher or write-behind queue) and the loaded model type.
+
+Under gunicorn each worker writes its samples to PROMETHEUS_MULTIPROC_DIR
+(set up by backend/gunicorn.conf.py) and /metrics aggregates all workers.
+Without prometheus_client, or with METRICS_ENABLED=0, every call is a no-op
+except for requests traced with start_trace(), whose stage timings are
+still collected (for the Server-Timing header).
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    from prometheus_client import (
+        CONTENT_TYPE_LATEST,
+        CollectorRegistry,
+        Counter,
+        Gauge,
+        Histogram,
+        generate_latest,
+        multiprocess,
+    )
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+    PROMETHEUS_AVAILABLE = False
+
+from backend.config import METRICS_ENABLED
+
+STAGES = (
+    "body_read",
+    "decode",
+    "resize",
+    "normalize",
+    "forward",
+    "decision",
+    "persistence",
+    "storage_upload",
+    "db_insert",
+)
+
+# 0.5 ms .. 10 s: decode/normalize sit at the low end, uploads at the high end
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+enabled = METRICS_ENABLED and PROMETHEUS_AVAILABLE
+
+_local = threading.local()
+_model_type = "none"
+_children = {}  # (metric, labels) -> bound child, avoids labels() lookups on the hot path
+
+if enabled:
+    REQUEST_SECONDS = Histogram(
+        "api_request_duration_seconds", "Time spent handling a request",
+        ["endpoint", "model_type"], buckets=LATENCY_BUCKETS,
+    )
+    STAGE_SECONDS = Histogram(
+        "api_stage_duration_seconds", "Time spent in one stage of request handling",
+        ["stage", "endpoint", "model_type"], buckets=LATENCY_BUCKETS,
+    )
+    REQUEST_ERRORS = Counter(
+        "api_request_errors_total", "Requests answered with an error status",
+        ["endpoint", "status"],
+    )
+    IN_FLIGHT = Gauge(
+        "api_requests_in_flight", "Requests currently being handled",
+        ["endpoint"], multiprocess_mode="livesum",
+    )
+
+
+def _child(metric, *labels):
+    key = (metric, labels)
+    child = _children.get(key)
+    if child is None:
+        child = _children[key] = metric.labels(*labels)
+    return child
+
+
+def set_model_type(model_type):
+    """Label later observations with the loaded engine's name"""
+    global _model_type
+    _model_type = model_type or "none"
+
+
+def current_endpoint():
+    return getattr(_local, "endpoint", "background")
+
+
+def bind(fn):
+    """
+    Wrap fn so stages it times on another thread (e.g. a pool worker) are
+    labelled with the calling thread's endpoint
+    """
+    endpoint = current_endpoint()
+
+    def run(*args, **kwargs):
+        previous = current_endpoint()
+        _local.endpoint = endpoint
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _local.endpoint = previous
+    return run
+
+
+def request_started(endpoint):
+    """Mark the start of a request handled by this thread"""
+    _local.endpoint = endpoint
+    if enabled:
+        _child(IN_FLIGHT, endpoint).inc()
+    return time.perf_counter()
+
+
+def request_finished(endpoint, started, status=200, observe=True):
+    """
+    Record a finished request
+
+    Args:
+        endpoint: Endpoint passed to request_started
+        started: Value returned by request_started
+        status: HTTP status code (>= 400 counts as an error)
+        observe: False to skip the duration histogram (e.g. WebSocket
+            connections, whose lifetime is not a request latency)
+    """
+    _local.endpoint = "background"
+    if not enabled:
+        return
+    _child(IN_FLIGHT, endpoint).dec()
+    if observe:
+        _child(REQUEST_SECONDS, endpoint, _model_type).observe(time.perf_counter() - started)
+    if status >= 400:
+        _child(REQUEST_ERRORS, endpoint, str(status)).inc()
+
+
+def observe_request(endpoint, seconds):
+    """Record one request-like unit of work handled outside a Flask request (e.g. a WebSocket frame)"""
+    if enabled:
+        _child(REQUEST_SECONDS, endpoint, _model_type).observe(seconds)
+
+
+def count_error(endpoint, status):
+    if enabled:
+        _child(REQUEST_ERRORS, endpoint, str(status)).inc()
+
+
+def start_trace():
+    """Also collect this thread's stage timings until stop_trace()"""
+    _local.trace = {}
+
+
+def stop_trace():
+    """
+    Returns:
+        {stage: seconds} recorded since start_trace(), or None
+    """
+    trace = getattr(_local, "trace", None)
+    _local.trace = None
+    return trace
+
+
+def observe_stage(name, seconds):
+    if enabled:
+        _child(STAGE_SECONDS, name, current_endpoint(), _model_type).observe(seconds)
+    trace = getattr(_local, "trace", None)
+    if trace is not None:
+        trace[name] = trace.get(name, 0.0) + seconds
+
+
+@contextmanager
+def stage(name):
+    """Time the enclosed block as one of STAGES"""
+    if not enabled and getattr(_local, "trace", None) is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(name, time.perf_counter() - started)
+
+
+def render():
+    """
+    Current metrics in the Prometheus text format
+
+    Returns:
+        Tuple of (body bytes, content type)
+    """
+    if not enabled:
+        return b"# metrics disabled\n", CONTENT_TYPE_LATEST
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,268 @@
+"""
+Hot model reload
+
+A reload loads and warms up the model file on a background thread while the
+current engine keeps serving, checks the new engine on a small golden set
+of labelled images, and only then hands it to install_fn, which swaps the
+engine reference the API server reads. Requests pin the engine they started
+with, so requests already in flight finish on the old model: none fail and
+none mix the two models.
+
+A reload is started by reload() (POST /api/model-reload) or, with a watch
+interval, when the model file's size or modification time changes and then
+stays the same for one more interval, so a file that is still being copied
+is not loaded half-written.
+
+Under gunicorn every worker has its own reloader: the file watch reloads
+every worker, a reload() call only the worker that received it.
+"""
+import threading
+import time
+import traceback
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif', '.bmp'}
+PROBABILITY_TOLERANCE = 1e-3
+
+
+class ReloadRejected(Exception):
+    """The new model failed validation and was not installed"""
+
+
+class GoldenSet:
+    """
+    Labelled images a new model is checked on before it serves
+
+    Args:
+        directory: Folder with one <class name>/ subfolder of images per class
+        class_names: Class names in model output order
+        per_class: Images used per class (the first ones by filename)
+    """
+
+    def __init__(self, directory, class_names, per_class=16):
+        self.directory = Path(directory)
+        self.class_names = list(class_names)
+        self.per_class = per_class
+        self._images = None  # [(image bytes, class index)], read on first use
+
+    def images(self):
+        if self._images is None:
+            images = []
+            for label, class_name in enumerate(self.class_names):
+                folder = self.directory / class_name
+                if not folder.is_dir():
+                    continue
+                files = sorted(path for path in folder.iterdir() if path.suffix.lower() in IMAGE_EXTENSIONS)
+                images.extend((path.read_bytes(), label) for path in files[:self.per_class])
+            self._images = images
+        return self._images
+
+    def evaluate(self, engine, batch_size=16):
+        """
+        Classify the golden images with engine
+
+        Returns:
+            Tuple of ((N x C) probabilities, N expected class indices)
+        """
+        images = self.images()
+        labels = np.array([label for _, label in images], dtype=np.int64)
+        batch = np.empty((len(images),) + engine.input_shape[1:], dtype=np.float32)
+        for index, (image_bytes, _) in enumerate(images):
+            engine.preprocess(image_bytes, out=batch[index:index + 1])
+        outputs = [engine.predict_batch(batch[start:start + batch_size]) for start in range(0, len(images), batch_size)]
+        probabilities = np.concatenate(outputs) if outputs else np.empty((0, len(self.class_names)), dtype=np.float32)
+        return probabilities, labels
+
+
+def check_outputs(probabilities, num_classes):
+    """
+    Raises:
+        ReloadRejected: If the outputs are not an (N x num_classes) array of probabilities
+    """
+    if probabilities.ndim != 2 or probabilities.shape[1] != num_classes:
+        raise ReloadRejected(f"Model outputs shape {probabilities.shape}, expected (N, {num_classes})")
+    if not np.all(np.isfinite(probabilities)):
+        raise ReloadRejected("Model outputs non-finite values")
+    if probabilities.min() < -PROBABILITY_TOLERANCE or probabilities.max() > 1 + PROBABILITY_TOLERANCE:
+        raise ReloadRejected("Model outputs values outside [0, 1]")
+
+
+def validate(engine, golden, min_accuracy, current=None):
+    """
+    Check a new engine before it serves
+
+    Args:
+        engine: Loaded, warmed-up engine
+        golden: GoldenSet
+        min_accuracy: Golden-set accuracy the engine needs
+        current: Engine serving now, to report how often the two agree
+
+    Returns:
+        Dictionary with the golden-set size, accuracy and agreement
+
+    Raises:
+        ReloadRejected: If the outputs are malformed or the accuracy too low
+    """
+    num_classes = len(golden.class_names)
+    probabilities, labels = golden.evaluate(engine)
+    if len(labels) == 0:
+        # No golden images: at least check the outputs of a black frame
+        width, height = engine.input_size
+        probabilities = engine.predict_batch(engine.preprocess(bytes(width * height * 3), frame_format="raw"))
+        check_outputs(probabilities, num_classes)
+        print(f"⚠ No golden images in {golden.directory}; only the model's output format was checked")
+        return {'golden_images': 0, 'accuracy': None, 'agreement': None}
+
+    check_outputs(probabilities, num_classes)
+    predicted = probabilities.argmax(axis=1)
+    accuracy = float(np.mean(predicted == labels))
+    agreement = None
+    if current is not None:
+        current_probabilities, _ = golden.evaluate(current)
+        agreement = float(np.mean(current_probabilities.argmax(axis=1) == predicted))
+    if accuracy < min_accuracy:
+        raise ReloadRejected(
+            f"Golden-set accuracy {accuracy:.1%} is below the required {min_accuracy:.1%} ({len(labels)} images)"
+        )
+    return {'golden_images': len(labels), 'accuracy': accuracy, 'agreement': agreement}
+
+
+class ModelReloader:
+    """
+    Loads, validates and installs new versions of the model file
+
+    Args:
+        model_path: Model file (watched when watch_interval > 0)
+        load_fn: Callable returning a warmed-up engine for the file, with its
+            version set
+        install_fn: Callable making a validated engine serve new requests
+        current_fn: Callable returning the engine serving now (or None)
+        golden: GoldenSet the new engine is checked on
+        min_accuracy: Golden-set accuracy the new engine needs
+        watch_interval: Seconds between checks of the model file (0 = no watch)
+    """
+
+    def __init__(self, model_path, load_fn, install_fn, current_fn, golden, min_accuracy=0.8, watch_interval=0.0):
+        self.model_path = Path(model_path)
+        self.load_fn = load_fn
+        self.install_fn = install_fn
+        self.current_fn = current_fn
+        self.golden = golden
+        self.min_accuracy = min_accuracy
+        self.watch_interval = watch_interval
+
+        self.state = 'idle'  # idle, loading or validating
+        self.last = None  # Outcome of the last finished reload
+        self._reloads = 0
+        self._installed = 0
+        self._lock = threading.Lock()
+        self._thread = None
+        self._watch_thread = None
+        self._stopped = threading.Event()
+        self._signature = self._file_signature()
+
+    def reload(self, reason='manual'):
+        """
+        Start a reload in the background
+
+        Returns:
+            False if a reload is already running
+        """
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return False
+            self.state = 'loading'
+            self._thread = threading.Thread(target=self._reload, args=(reason,), name="model-reload", daemon=True)
+            self._thread.start()
+        return True
+
+    def wait(self, timeout=None):
+        """Block until the running reload (if any) has finished"""
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def start_watching(self):
+        if self.watch_interval <= 0 or self._watch_thread is not None:
+            return
+        self._watch_thread = threading.Thread(target=self._watch, name="model-watch", daemon=True)
+        self._watch_thread.start()
+        print(f"✓ Watching {self.model_path} for new models (every {self.watch_interval:g}s)")
+
+    def stop(self):
+        self._stopped.set()
+
+    def status(self):
+        with self._lock:
+            return {
+                'state': self.state,
+                'watching': self._watch_thread is not None,
+                'watch_interval': self.watch_interval,
+                'golden_dir': str(self.golden.directory),
+                'min_accuracy': self.min_accuracy,
+                'reloads': self._reloads,
+                'installed': self._installed,
+                'last': self.last,
+            }
+
+    def _reload(self, reason):
+        started = time.perf_counter()
+        result = {'reason': reason, 'started_at': datetime.now().isoformat()}
+        self._signature = self._file_signature()
+        try:
+            new_engine = self.load_fn()
+            current = self.current_fn()
+            result['version'] = new_engine.version
+            result['previous_version'] = current.version if current is not None else None
+            if current is not None and current.version == new_engine.version:
+                result['status'] = 'unchanged'
+            else:
+                self.state = 'validating'
+                result['validation'] = validate(new_engine, self.golden, self.min_accuracy, current)
+                self.install_fn(new_engine)
+                result['status'] = 'installed'
+        except ReloadRejected as e:
+            result['status'] = 'rejected'
+            result['error'] = str(e)
+        except Exception as e:
+            traceback.print_exc()
+            result['status'] = 'failed'
+            result['error'] = str(e)
+        result['seconds'] = time.perf_counter() - started
+
+        with self._lock:
+            self.last = result
+            self.state = 'idle'
+            self._reloads += 1
+            if result['status'] == 'installed':
+                self._installed += 1
+
+        if result['status'] == 'installed':
+            print(f"✓ Model {result['version']} installed (was {result['previous_version']}) in {result['seconds']:.1f}s")
+        elif result['status'] == 'unchanged':
+            print(f"✓ Model reload: {result['version']} is already serving")
+        else:
+            print(f"⚠ Model reload {result['status']}: {result['error']}")
+
+    def _watch(self):
+        changed = None  # Signature seen last check, loaded once it stops changing
+        while not self._stopped.wait(self.watch_interval):
+            signature = self._file_signature()
+            if signature is None or signature == self._signature:
+                changed = None
+                continue
+            if signature != changed:
+                changed = signature
+                continue
+            changed = None
+            self.reload('file changed')
+
+    def _file_signature(self):
+        try:
+            stat = self.model_path.stat()
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
@@ -0,0 +1,331 @@
+"""
+Write-behind persistence for predictions
+
+The request path enqueues the image and its prediction row and returns; a
+small pool of worker threads uploads the image to storage and inserts the
+row, retrying transient failures with exponential backoff. The queue is
+bounded: when it is full, enqueueing blocks for a short time and then fails
+so callers can push back on clients instead of buffering without limit.
+
+An insert_fn that returns a Future (SupabaseDB.queue_prediction with the
+batch writer) does not hold a worker: the worker moves on to the next job
+and the job finishes, or is queued again for a retry, when the Future
+resolves. That is what lets rows from many jobs share one multi-row insert.
+
+Retries do not hold a worker either: a failed job waits out its backoff in a
+delay heap, and a scheduler thread hands it back to the workers once it is
+due, so fresh jobs are not stuck behind jobs that are backing off.
+"""
+import heapq
+import itertools
+import random
+import threading
+import queue
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import numpy as np
+
+
+class PersistenceQueueFull(Exception):
+    """Raised when the write-behind queue stays full for the enqueue timeout"""
+
+
+class _PersistJob:
+    __slots__ = ("image_bytes", "filename", "record", "enqueued_at", "uploaded", "attempts", "retry_at")
+
+    def __init__(self, image_bytes, filename, record):
+        self.image_bytes = image_bytes
+        self.filename = filename
+        self.record = record
+        self.enqueued_at = time.perf_counter()
+        self.uploaded = image_bytes is None
+        self.attempts = 0
+        self.retry_at = None  # perf_counter() time at which the scheduler requeues the retry
+
+
+class WriteBehindQueue:
+    """
+    Bounded queue persisting predictions in the background
+
+    Args:
+        upload_fn: Callable (image_bytes, filename) storing the image
+        insert_fn: Callable (record) inserting the prediction row; may return a
+            Future instead of blocking until the row is inserted
+        on_failure: Callable (job, error) for jobs that exhausted their retries
+            (or were still queued at shutdown); receives the job so the image
+            and row can be kept locally
+        max_pending: Maximum number of jobs not yet persisted (queued, being
+            uploaded, or waiting for their insert)
+        workers: Number of worker threads
+        max_retries: Retries per job after the first attempt
+        backoff_seconds: Base delay, doubled on every retry (with jitter)
+        enqueue_timeout: Seconds submit() waits for space before giving up
+    """
+
+    def __init__(self, upload_fn, insert_fn, on_failure=None, max_pending=256, workers=4,
+                 max_retries=5, backoff_seconds=0.5, enqueue_timeout=2.0, stats_window=1024):
+        self.upload_fn = upload_fn
+        self.insert_fn = insert_fn
+        self.on_failure = on_failure
+        self.max_pending = max(1, int(max_pending))
+        self.worker_count = max(1, int(workers))
+        self.max_retries = max(0, int(max_retries))
+        self.backoff_seconds = max(0.0, float(backoff_seconds))
+        self.enqueue_timeout = enqueue_timeout
+
+        # The slots bound the jobs in the system; the queue itself also holds
+        # retries, which must never block.
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._queue = queue.Queue()
+        self._threads = []
+        self._running = False
+        self._stopping = threading.Event()
+        # Retries waiting out their backoff: (retry_at, sequence, job)
+        self._delayed = []
+        self._delayed_lock = threading.Condition()
+        self._sequence = itertools.count()
+        self._scheduler = None
+
+        self._stats_lock = threading.Condition()
+        self._flush_times = deque(maxlen=stats_window)
+        self._upload_times = deque(maxlen=stats_window)
+        self._insert_times = deque(maxlen=stats_window)
+        self._max_depth = 0
+        self._pending = 0  # Jobs submitted and not yet completed or failed
+        self._in_progress = 0
+        self._inserts_in_flight = 0
+        self._total_enqueued = 0
+        self._total_completed = 0
+        self._total_failed = 0
+        self._total_retries = 0
+        self._total_rejected = 0
+        self._last_error = None
+
+    def start(self):
+        """Start the worker threads"""
+        if self._running:
+            return
+        self._running = True
+        self._stopping.clear()
+        self._threads = [
+            threading.Thread(target=self._run, name=f"write-behind-{i}", daemon=True)
+            for i in range(self.worker_count)
+        ]
+        for thread in self._threads:
+            thread.start()
+        self._scheduler = threading.Thread(target=self._run_scheduler, name="write-behind-retries", daemon=True)
+        self._scheduler.start()
+
+    def stop(self, timeout=30.0):
+        """
+        Flush queued jobs and stop the workers
+
+        Jobs that could not be persisted before the timeout, including
+        retries still waiting out their backoff, are handed to on_failure
+        instead of being dropped. Inserts already handed to insert_fn are
+        waited for; failures among them are not retried.
+        """
+        if not self._running:
+            return
+        self._running = False
+        deadline = time.perf_counter() + timeout
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.perf_counter()))
+        with self._stats_lock:
+            while self._inserts_in_flight and time.perf_counter() < deadline:
+                self._stats_lock.wait(max(0.0, deadline - time.perf_counter()))
+        self._stopping.set()
+        with self._delayed_lock:
+            self._delayed_lock.notify_all()
+        self._scheduler.join(max(0.0, deadline - time.perf_counter()))
+        self._fail_pending(RuntimeError("write-behind queue stopped"))
+        self._threads = []
+        self._scheduler = None
+
+    def submit(self, image_bytes, filename, record):
+        """
+        Queue an image upload and prediction row insert
+
+        Args:
+            image_bytes: Raw image bytes (None to only insert the row)
+            filename: Storage object name
+            record: Prediction row to insert
+
+        Raises:
+            PersistenceQueueFull: If the queue stayed full for enqueue_timeout
+        """
+        if not self._running:
+            raise RuntimeError("WriteBehindQueue is not running")
+        if not self._slots.acquire(timeout=self.enqueue_timeout):
+            with self._stats_lock:
+                self._total_rejected += 1
+            raise PersistenceQueueFull(f"{self.max_pending} predictions already waiting to be saved")
+        with self._stats_lock:
+            self._total_enqueued += 1
+            self._pending += 1
+            self._max_depth = max(self._max_depth, self._pending)
+        self._queue.put(_PersistJob(image_bytes, filename, record))
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                break
+            with self._stats_lock:
+                self._in_progress += 1
+            try:
+                self._persist(job)
+            finally:
+                with self._stats_lock:
+                    self._in_progress -= 1
+
+    def _run_scheduler(self):
+        """Hand retries to the workers once their backoff delay has passed"""
+        with self._delayed_lock:
+            while not self._stopping.is_set():
+                now = time.perf_counter()
+                while self._delayed and self._delayed[0][0] <= now:
+                    _, _, job = heapq.heappop(self._delayed)
+                    self._queue.put_nowait(job)
+                timeout = self._delayed[0][0] - now if self._delayed else None
+                self._delayed_lock.wait(timeout)
+
+    def _persist(self, job):
+        try:
+            if not job.uploaded:
+                started = time.perf_counter()
+                self.upload_fn(job.image_bytes, job.filename)
+                job.uploaded = True
+                self._record_time(self._upload_times, started)
+
+            started = time.perf_counter()
+            result = self.insert_fn(job.record)
+        except Exception as e:
+            self._retry(job, e)
+            return
+
+        if not isinstance(result, Future):
+            self._record_time(self._insert_times, started)
+            self._complete(job)
+            return
+        with self._stats_lock:
+            self._inserts_in_flight += 1
+        result.add_done_callback(lambda future: self._insert_done(job, future, started))
+
+    def _insert_done(self, job, future, started):
+        error = future.exception()
+        if error is None:
+            self._record_time(self._insert_times, started)
+            self._complete(job)
+        else:
+            self._retry(job, error)
+        with self._stats_lock:
+            self._inserts_in_flight -= 1
+            self._stats_lock.notify_all()
+
+    def _retry(self, job, error):
+        """
+        Schedule the job again after its backoff delay, or fail it for good
+
+        Never blocks: it also runs in the done-callback of insert Futures,
+        i.e. on the batch writer's thread.
+        """
+        job.attempts += 1
+        if job.attempts > self.max_retries or not self._running:
+            self._fail(job, error)
+            return
+        with self._stats_lock:
+            self._total_retries += 1
+        delay = self.backoff_seconds * (2 ** (job.attempts - 1))
+        job.retry_at = time.perf_counter() + delay * random.uniform(0.5, 1.0)
+        with self._delayed_lock:
+            heapq.heappush(self._delayed, (job.retry_at, next(self._sequence), job))
+            self._delayed_lock.notify_all()
+
+    def _complete(self, job):
+        with self._stats_lock:
+            self._total_completed += 1
+            self._pending -= 1
+            self._flush_times.append(time.perf_counter() - job.enqueued_at)
+        self._slots.release()
+
+    def _fail(self, job, error):
+        with self._stats_lock:
+            self._total_failed += 1
+            self._pending -= 1
+            self._last_error = str(error)
+        self._slots.release()
+        if self.on_failure is not None:
+            try:
+                self.on_failure(job, error)
+            except Exception as e:
+                print(f"Error handling failed persistence job {job.filename}: {e}")
+
+    def _fail_pending(self, error):
+        with self._delayed_lock:
+            delayed = [job for _, _, job in self._delayed]
+            self._delayed.clear()
+        for job in delayed:
+            self._fail(job, error)
+        while True:
+            try:
+                job = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if job is not None:
+                self._fail(job, error)
+
+    def _record_time(self, window, started):
+        with self._stats_lock:
+            window.append(time.perf_counter() - started)
+
+    def stats(self):
+        """
+        Get write-behind statistics
+
+        Returns:
+            Dictionary with queue depth, counters and latency percentiles (ms)
+        """
+        with self._stats_lock:
+            flushes = np.array(self._flush_times, dtype=np.float64) * 1000.0
+            uploads = np.array(self._upload_times, dtype=np.float64) * 1000.0
+            inserts = np.array(self._insert_times, dtype=np.float64) * 1000.0
+            counters = {
+                "max_queue_depth": self._max_depth,
+                "pending": self._pending,
+                "in_progress": self._in_progress,
+                "inserts_in_flight": self._inserts_in_flight,
+                "retries_waiting": len(self._delayed),
+                "total_enqueued": self._total_enqueued,
+                "total_completed": self._total_completed,
+                "total_failed": self._total_failed,
+                "total_retries": self._total_retries,
+                "total_rejected": self._total_rejected,
+                "last_error": self._last_error,
+            }
+
+        def summarize(values):
+            if values.size == 0:
+                return {"avg": 0.0, "p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+            return {
+                "avg": float(values.mean()),
+                "p50": float(np.percentile(values, 50)),
+                "p95": float(np.percentile(values, 95)),
+                "p99": float(np.percentile(values, 99)),
+                "max": float(values.max()),
+            }
+
+        return {
+            "running": self._running,
+            "workers": self.worker_count,
+            "queue_depth": self._queue.qsize(),
+            "queue_capacity": self.max_pending,
+            **counters,
+            "flush_ms": summarize(flushes),
+            "upload_ms": summarize(uploads),
+            "insert_ms": summarize(inserts),
+        }
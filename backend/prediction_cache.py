@@ -0,0 +1,154 @@
+"""
+Content-addressed prediction cache with request coalescing
+
+Results are keyed by a hash of the raw upload bytes plus the model version,
+kept in an LRU with a TTL, and concurrent misses for the same key share a
+single computation (singleflight).
+
+/api/predict caches only the classification, plus the storage object of
+the first upload: saving the prediction runs on every request, so repeated
+images still appear in history and statistics, but their rows point at
+that object instead of uploading the image again.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+def content_key(image_bytes, model_version):
+    """Build a cache key from the raw image bytes and the model version"""
+    digest = hashlib.sha256(image_bytes).hexdigest()
+    return f"{model_version}:{digest}"
+
+
+class PredictionCache:
+    """
+    Thread-safe LRU + TTL cache with singleflight coalescing
+
+    Args:
+        max_entries: Maximum number of cached results (0 disables caching)
+        ttl_seconds: Time after which an entry is considered stale
+    """
+
+    def __init__(self, max_entries=1024, ttl_seconds=3600):
+        self.max_entries = max(0, int(max_entries))
+        self.ttl = float(ttl_seconds)
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._in_flight = {}  # key -> Future
+        self._generation = 0  # bumped by clear() so in-flight results are not stored
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _store(self, key, value):
+        if self.max_entries == 0:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, key):
+        """Return the cached value for key, or None"""
+        with self._lock:
+            return self._lookup(key)
+
+    def get_or_compute(self, key, compute):
+        """
+        Return the cached value for key, computing it at most once
+
+        Concurrent callers that miss on the same key wait for the first
+        caller's computation instead of starting their own. Exceptions are
+        propagated to every waiter and are not cached.
+
+        Args:
+            key: Cache key (see content_key)
+            compute: Zero-argument callable producing the value
+
+        Returns:
+            Tuple of (value, cached) where cached is True when the value was
+            served from the cache or from another request's computation
+        """
+        with self._lock:
+            value = self._lookup(key)
+            if value is not None:
+                self.hits += 1
+                return value, True
+
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                self.misses += 1
+                future = Future()
+                self._in_flight[key] = future
+                generation = self._generation
+                leader = True
+
+        if not leader:
+            return future.result(), True
+
+        try:
+            value = compute()
+        except BaseException as e:
+            with self._lock:
+                self._in_flight.pop(key, None)
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            if generation == self._generation:
+                self._store(key, value)
+            self._in_flight.pop(key, None)
+        future.set_result(value)
+        return value, False
+
+    def clear(self):
+        """Drop all cached entries (computations already running are not cached)"""
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+
+    def stats(self):
+        """
+        Get cache counters
+
+        Returns:
+            Dictionary with hit/miss/eviction counters and current size
+        """
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "enabled": self.max_entries > 0,
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "in_flight": len(self._in_flight),
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": ((self.hits + self.coalesced) / lookups) if lookups else 0.0,
+            }
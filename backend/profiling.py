@@ -0,0 +1,253 @@
+"""
+Sampled stack profiles of individual requests
+
+A background thread samples the Python stack of the threads handling
+profiled requests every interval_ms (sys._current_frames) and counts
+identical stacks. A request is profiled when it is one in sample_every
+requests, or, with slow_ms set, every request is sampled and the profile is
+kept only if the request took at least slow_ms. Kept profiles are written to
+the profile directory as a pair of files:
+
+  <name>.txt   collapsed stacks ("outer;...;inner count"), readable by
+               flamegraph.pl or https://speedscope.app
+  <name>.json  endpoint, duration, stage timings and why it was kept
+
+Only the newest max_files profiles are kept.
+
+The settings live in <directory>/control.json, which every process
+re-reads when it changes (checked at most once per second). Profiling can
+be switched on during an incident without a restart, for all gunicorn
+workers at once, through POST /api/profiling or by editing the file.
+"""
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+CONTROL_FILE = "control.json"
+SETTINGS = ("enabled", "sample_every", "slow_ms", "interval_ms", "max_files", "server_timing")
+MAX_STACK_DEPTH = 128
+
+
+class ProfileCapture:
+    """Samples collected for one request"""
+
+    def __init__(self, thread_id, endpoint, sampled):
+        self.thread_id = thread_id
+        self.endpoint = endpoint
+        self.sampled = sampled
+        self.stacks = {}
+        self.samples = 0
+
+
+class RequestProfiler:
+    """
+    Runtime-switchable request profiler
+
+    Args:
+        directory: Where profiles and control.json are written (created on first write)
+        enabled: Profile requests at all
+        sample_every: Profile one in N requests (0 = only slow requests)
+        slow_ms: Keep the profile of any request at least this slow (0 = off)
+        interval_ms: Stack sampling period
+        max_files: Profiles kept in the directory
+        server_timing: Whether responses carry a Server-Timing header
+    """
+
+    def __init__(self, directory, enabled=False, sample_every=100, slow_ms=0.0,
+                 interval_ms=1.0, max_files=200, server_timing=True):
+        self.directory = Path(directory)
+        self.enabled = enabled
+        self.sample_every = sample_every
+        self.slow_ms = slow_ms
+        self.interval_ms = interval_ms
+        self.max_files = max_files
+        self.server_timing = server_timing
+
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._targets = {}  # thread id -> ProfileCapture
+        self._requests = 0
+        self._written = 0
+        self._control_mtime = None
+        self._next_check = 0.0
+        self._thread = None
+
+    def settings(self):
+        return {name: getattr(self, name) for name in SETTINGS}
+
+    def stats(self):
+        self.refresh()
+        with self._lock:
+            return {
+                **self.settings(),
+                'directory': str(self.directory),
+                'requests_seen': self._requests,
+                'profiles_written': self._written,
+                'profiling_now': len(self._targets),
+            }
+
+    def update(self, **changes):
+        """
+        Change settings in this process and in control.json, so the other
+        worker processes pick them up too
+
+        Raises:
+            ValueError: On an unknown setting or a value of the wrong type
+        """
+        unknown = set(changes) - set(SETTINGS)
+        if unknown:
+            raise ValueError(f"Unknown profiling settings: {', '.join(sorted(unknown))}")
+        self.refresh()
+        settings = self.settings()
+        for name, value in changes.items():
+            settings[name] = self._coerce(name, value)
+        self._apply(settings)
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        temp_path = self.directory / f".{CONTROL_FILE}.{os.getpid()}"
+        temp_path.write_text(json.dumps(settings, indent=2))
+        os.replace(temp_path, self.directory / CONTROL_FILE)
+        self._control_mtime = None
+        return self.settings()
+
+    def refresh(self):
+        """Reload control.json if another process changed it"""
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        self._next_check = now + 1.0
+        try:
+            mtime = (self.directory / CONTROL_FILE).stat().st_mtime_ns
+        except OSError:
+            return
+        if mtime == self._control_mtime:
+            return
+        try:
+            loaded = json.loads((self.directory / CONTROL_FILE).read_text())
+            settings = self.settings()
+            for name in SETTINGS:
+                if name in loaded:
+                    settings[name] = self._coerce(name, loaded[name])
+        except (OSError, ValueError) as e:
+            print(f"⚠ Ignoring invalid {CONTROL_FILE}: {e}")
+            self._control_mtime = mtime
+            return
+        self._apply(settings)
+        self._control_mtime = mtime
+
+    def begin(self, endpoint):
+        """
+        Start profiling the current thread's request if it is selected
+
+        Returns:
+            ProfileCapture to pass to finish(), or None
+        """
+        self.refresh()
+        if not self.enabled:
+            return None
+        with self._lock:
+            self._requests += 1
+            sampled = self.sample_every > 0 and self._requests % self.sample_every == 0
+            if not sampled and self.slow_ms <= 0:
+                return None
+            capture = ProfileCapture(threading.get_ident(), endpoint, sampled)
+            self._targets[capture.thread_id] = capture
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+                self._thread.start()
+            self._wake.notify()
+        return capture
+
+    def finish(self, capture, duration, timings=None, status=200):
+        """
+        Stop profiling and write the profile if it is worth keeping
+
+        Args:
+            capture: Value returned by begin()
+            duration: Request duration in seconds
+            timings: Optional {stage: seconds} for the request
+            status: HTTP status code
+        """
+        if capture is None:
+            return
+        with self._lock:
+            self._targets.pop(capture.thread_id, None)
+        slow = self.slow_ms > 0 and duration * 1000.0 >= self.slow_ms
+        if not (capture.sampled or slow):
+            return
+        try:
+            self._write(capture, duration, timings or {}, status, "slow" if slow else "sampled")
+        except OSError as e:
+            print(f"⚠ Could not write profile: {e}")
+
+    def _apply(self, settings):
+        for name, value in settings.items():
+            setattr(self, name, value)
+
+    @staticmethod
+    def _coerce(name, value):
+        if name in ("enabled", "server_timing"):
+            if not isinstance(value, bool):
+                raise ValueError(f"{name} must be true or false")
+            return value
+        number = float(value) if name in ("slow_ms", "interval_ms") else int(value)
+        if number < 0 or (name == "interval_ms" and number == 0):
+            raise ValueError(f"{name} must be positive")
+        return number
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._targets:
+                    self._wake.wait()
+                targets = dict(self._targets)
+            frames = sys._current_frames()
+            for thread_id, capture in targets.items():
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    stack = self._collapse(frame)
+                    capture.stacks[stack] = capture.stacks.get(stack, 0) + 1
+                    capture.samples += 1
+            del frames
+            time.sleep(self.interval_ms / 1000.0)
+
+    @staticmethod
+    def _collapse(frame):
+        names = []
+        while frame is not None and len(names) < MAX_STACK_DEPTH:
+            code = frame.f_code
+            names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+    def _write(self, capture, duration, timings, status, reason):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        name = f"{datetime.now():%Y%m%d_%H%M%S_%f}_{capture.endpoint}_{duration * 1000.0:.0f}ms"
+        stacks = sorted(capture.stacks.items(), key=lambda item: -item[1])
+        (self.directory / f"{name}.txt").write_text(
+            "".join(f"{stack} {count}\n" for stack, count in stacks)
+        )
+        (self.directory / f"{name}.json").write_text(json.dumps({
+            'endpoint': capture.endpoint,
+            'status': status,
+            'reason': reason,
+            'duration_ms': duration * 1000.0,
+            'timings_ms': {stage: seconds * 1000.0 for stage, seconds in timings.items()},
+            'interval_ms': self.interval_ms,
+            'samples': capture.samples,
+            'pid': os.getpid(),
+        }, indent=2))
+        with self._lock:
+            self._written += 1
+        self._rotate()
+
+    def _rotate(self):
+        profiles = sorted(self.directory.glob("*.json"))
+        profiles = [path for path in profiles if path.name != CONTROL_FILE]
+        for path in profiles[:max(0, len(profiles) - self.max_files)]:
+            path.unlink(missing_ok=True)
+            path.with_suffix(".txt").unlink(missing_ok=True)
@@ -0,0 +1,91 @@
+"""
+Startup state and timing of an API server process
+
+The server starts accepting requests before its model is loaded:
+initialize_services() runs on a background thread and records how long
+each phase took (importing the app, importing the framework, deserializing
+the model, warm-up, connecting to the database, ...). /health reports the
+state and /ready answers 200 only once the model can serve predictions, so
+a load balancer or orchestrator holds traffic until then.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+STARTING = "starting"
+READY = "ready"
+DEGRADED = "degraded"  # Startup finished, but without a usable model
+
+# Report order; the database and journal phases overlap the model phases
+PHASES = ("imports", "framework_import", "model_deserialize", "warmup", "model_hash", "database", "journal")
+
+
+class StartupTracker:
+    """
+    Phase timings and state of one process's startup
+
+    Args:
+        started: perf_counter() value the startup began at (default: now)
+    """
+
+    def __init__(self, started=None):
+        self.started = time.perf_counter() if started is None else started
+        self.state = STARTING
+        self.error = None
+        self.total_seconds = None
+        self._phases = {}  # name -> seconds
+        self._lock = threading.Lock()
+        self._finished = threading.Event()
+
+    @contextmanager
+    def phase(self, name):
+        """Time the enclosed block as one startup phase"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def record(self, name, seconds):
+        if seconds is None:
+            return
+        with self._lock:
+            self._phases[name] = self._phases.get(name, 0.0) + seconds
+
+    def finish(self, ready, error=None):
+        """Mark startup as done; ready is whether the model can serve"""
+        with self._lock:
+            self.state = READY if ready else DEGRADED
+            self.error = error
+            self.total_seconds = time.perf_counter() - self.started
+        self._finished.set()
+
+    def wait(self, timeout=None):
+        """Block until finish() is called; returns False on timeout"""
+        return self._finished.wait(timeout)
+
+    def report(self):
+        """
+        Returns:
+            Dictionary with the state, per-phase and total times in ms.
+            Phases running on different threads overlap, so they can add up
+            to more than the total.
+        """
+        with self._lock:
+            total = self.total_seconds
+            names = sorted(self._phases, key=lambda name: PHASES.index(name) if name in PHASES else len(PHASES))
+            return {
+                'state': self.state,
+                'error': self.error,
+                'phases_ms': {name: self._phases[name] * 1000.0 for name in names},
+                'total_ms': None if total is None else total * 1000.0,
+                'elapsed_ms': (time.perf_counter() - self.started) * 1000.0,
+            }
+
+    def format_report(self):
+        """Startup breakdown as printable lines"""
+        report = self.report()
+        lines = [f"Startup {report['state']} in {report['total_ms'] or report['elapsed_ms']:.0f}ms:"]
+        for name, ms in report['phases_ms'].items():
+            lines.append(f"  {name:20} {ms:9.1f}ms")
+        return "\n".join(lines)
@@ -1,20 +1,293 @@
 """
 Utility for Supabase database operations
 """
-from supabase import create_client, Client
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
+from urllib.parse import quote
+import atexit
+import base64
+import json
+import threading
+import time
 import sys
 import os
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from config import SUPABASE_URL, SUPABASE_KEY, SUPABASE_TABLE, SUPABASE_BUCKET
+from backend.metrics import stage
+from config import (
+    SUPABASE_URL, SUPABASE_KEY, SUPABASE_TABLE, SUPABASE_BUCKET, SUPABASE_STATS_TABLE, CLASS_NAMES,
+    STORAGE_URL_MODE, STORAGE_SIGNED_URL_TTL
+)
+
+
+def prediction_row(filename: str, predicted_class: str, confidence: float) -> dict:
+    """Build a row for the predictions table"""
+    return {
+        "filename": filename,
+        "predicted_class": predicted_class,
+        "confidence": float(confidence)
+    }
+
+
+HISTORY_COLUMNS = ("id", "filename", "predicted_class", "confidence", "created_at")
+
+
+def encode_cursor(row: dict) -> str:
+    """Opaque /api/history cursor pointing just past a row (by created_at, id)"""
+    raw = json.dumps([row["created_at"], row["id"]], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """
+    Decode a cursor made by encode_cursor
+    
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor}")
+    if not isinstance(created_at, str) or not isinstance(row_id, int):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return created_at, row_id
+
+
+class StorageURLBuilder:
+    """
+    Builds image URLs for storage objects without going through the client
+    
+    Public URLs only depend on the project URL, bucket and object name, so
+    they are formatted locally. In signed mode each call signs all of its
+    filenames with one request per chunk.
+    
+    Args:
+        base_url: Supabase project URL
+        bucket: Storage bucket name
+        mode: 'public' or 'signed'
+        sign_urls: Callable (paths, expires_in) -> list of {'path', 'signedURL'};
+            required for signed mode
+        signed_ttl: Seconds a signed URL stays valid
+        sign_chunk: Filenames per signing request
+    """
+    
+    def __init__(self, base_url: str, bucket: str, mode: str = "public", sign_urls=None,
+                 signed_ttl: int = 3600, sign_chunk: int = 500):
+        if mode not in ("public", "signed"):
+            raise ValueError(f"Unknown storage URL mode: {mode}")
+        self.mode = mode
+        self.sign_urls = sign_urls
+        self.signed_ttl = int(signed_ttl)
+        self.sign_chunk = max(1, int(sign_chunk))
+        self._public_prefix = f"{base_url.rstrip('/')}/storage/v1/object/public/{quote(bucket)}/"
+    
+    def public_url(self, filename: str) -> str:
+        """Public URL of an object (valid for public buckets)"""
+        return self._public_prefix + quote(filename.lstrip("/"), safe="/!$&'()*+,;=:@~")  # RFC 3986 path characters
+    
+    def urls(self, filenames: list) -> list:
+        """
+        URLs for several objects, in the same order
+        
+        Returns:
+            List of URLs ("" for objects that could not be signed)
+        """
+        if self.mode == "public":
+            return [self.public_url(filename) for filename in filenames]
+        
+        signed = {}
+        unique = list(dict.fromkeys(filenames))
+        for start in range(0, len(unique), self.sign_chunk):
+            for item in self.sign_urls(unique[start:start + self.sign_chunk], self.signed_ttl):
+                signed[item.get("path")] = item.get("signedURL") or ""
+        return [signed.get(filename, "") for filename in filenames]
+
+
+class PredictionBatchWriter:
+    """
+    Accumulates prediction rows and writes them with one multi-row insert
+    
+    Rows are flushed when max_rows are pending or the oldest pending row has
+    waited max_delay_ms. Up to max_in_flight inserts run at once; while all of
+    them are busy, new rows keep accumulating into the next batch. add()
+    returns a Future resolved with the inserted row (or the insert error), so
+    callers can still retry individual rows.
+    """
+    
+    def __init__(self, insert_rows, max_rows: int = 50, max_delay_ms: float = 50.0, max_in_flight: int = 4):
+        self.insert_rows = insert_rows
+        self.max_rows = max(1, int(max_rows))
+        self.max_delay = max(0.0, float(max_delay_ms)) / 1000.0
+        self.max_in_flight = max(1, int(max_in_flight))
+        
+        self._slots = threading.Semaphore(self.max_in_flight)
+        self._pool = ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix="db-insert")
+        self._condition = threading.Condition()
+        self._pending = []
+        self._oldest = None
+        self._closed = False
+        
+        self._total_rows = 0
+        self._total_batches = 0
+        self._failed_batches = 0
+        self._insert_seconds = 0.0
+        
+        self._thread = threading.Thread(target=self._run, name="db-batch-writer", daemon=True)
+        self._thread.start()
+    
+    def add(self, row: dict) -> Future:
+        """
+        Queue a row for the next multi-row insert
+        
+        Args:
+            row: Row dictionary (see prediction_row)
+            
+        Returns:
+            Future resolving to the inserted row
+        """
+        future = Future()
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("PredictionBatchWriter is closed")
+            if not self._pending:
+                self._oldest = time.perf_counter()
+            self._pending.append((row, future))
+            # Wake the writer to start the batch timer or to flush a full batch
+            if len(self._pending) == 1 or len(self._pending) >= self.max_rows:
+                self._condition.notify()
+        return future
+    
+    def flush(self) -> int:
+        """
+        Write all pending rows now
+        
+        Returns:
+            Number of rows written
+        """
+        with self._condition:
+            batch = self._take()
+        for start in range(0, len(batch), self.max_rows):
+            self._write(batch[start:start + self.max_rows])
+        return len(batch)
+    
+    def close(self):
+        """Flush pending rows and stop the background thread"""
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+        self._pool.shutdown(wait=True)
+    
+    def _take(self, limit=None):
+        # Rows beyond the limit stay pending with the original timestamp, so
+        # they are already due and go out in the next batch.
+        limit = len(self._pending) if limit is None else limit
+        batch, self._pending = self._pending[:limit], self._pending[limit:]
+        if not self._pending:
+            self._oldest = None
+        return batch
+    
+    def _run(self):
+        while True:
+            # Wait for a free insert slot first; rows arriving meanwhile make
+            # the next batch larger instead of queueing more requests.
+            self._slots.acquire()
+            with self._condition:
+                while True:
+                    if self._closed or len(self._pending) >= self.max_rows:
+                        break
+                    if self._pending:
+                        remaining = self._oldest + self.max_delay - time.perf_counter()
+                        if remaining <= 0:
+                            break
+                        self._condition.wait(remaining)
+                    else:
+                        self._condition.wait()
+                batch = self._take(self.max_rows)
+                done = self._closed and not self._pending
+            
+            if batch:
+                self._pool.submit(self._write_and_release, batch)
+            else:
+                self._slots.release()
+            if done:
+                return
+    
+    def _write_and_release(self, batch):
+        try:
+            self._write(batch)
+        finally:
+            self._slots.release()
+    
+    def _write(self, batch):
+        if not batch:
+            return
+        started = time.perf_counter()
+        try:
+            inserted = self.insert_rows([row for row, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            with self._condition:
+                self._failed_batches += 1
+            return
+        
+        if len(inserted) != len(batch):
+            inserted = [row for row, _ in batch]
+        for (_, future), row in zip(batch, inserted):
+            future.set_result(row)
+        with self._condition:
+            self._total_rows += len(batch)
+            self._total_batches += 1
+            self._insert_seconds += time.perf_counter() - started
+    
+    def stats(self) -> dict:
+        """
+        Get batch writer statistics
+        
+        Returns:
+            Dictionary with pending rows, batch counts and average batch size
+        """
+        with self._condition:
+            return {
+                "pending_rows": len(self._pending),
+                "max_rows": self.max_rows,
+                "max_delay_ms": self.max_delay * 1000.0,
+                "max_in_flight": self.max_in_flight,
+                "total_rows": self._total_rows,
+                "total_batches": self._total_batches,
+                "failed_batches": self._failed_batches,
+                "avg_batch_size": (self._total_rows / self._total_batches) if self._total_batches else 0.0,
+                "avg_insert_ms": (self._insert_seconds * 1000.0 / self._total_batches) if self._total_batches else 0.0,
+            }
 
 
 class SupabaseDB:
-    def __init__(self):
-        """Initialize Supabase client"""
-        self.client: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+    def __init__(self, url: str = None, key: str = None):
+        """
+        Initialize Supabase client
+        
+        Args:
+            url: Supabase project URL (defaults to SUPABASE_URL)
+            key: API key (defaults to SUPABASE_KEY)
+        """
+        # Imported here: the client library takes about half of the API
+        # server's import time and is only needed once it connects.
+        from supabase import create_client
+
+        self.client = create_client(url or SUPABASE_URL, key or SUPABASE_KEY)
         self.bucket = SUPABASE_BUCKET
+        self.url_builder = StorageURLBuilder(
+            url or SUPABASE_URL, self.bucket,
+            mode=STORAGE_URL_MODE,
+            sign_urls=lambda paths, expires_in: self.client.storage.from_(self.bucket).create_signed_urls(paths, expires_in),
+            signed_ttl=STORAGE_SIGNED_URL_TTL,
+        )
+        self.batch_writer = None
+        self.insert_listeners = []  # Callables run after rows are inserted (e.g. cache invalidation)
     
     def upload_image(self, file_bytes: bytes, filename: str) -> str:
         """
@@ -25,18 +298,18 @@ class SupabaseDB:
             filename: Name to save the file as
             
         Returns:
-            The public URL of the uploaded image
+            The URL of the uploaded image
         """
         try:
-            self.client.storage.from_(self.bucket).upload(
-                path=filename,
-                file=file_bytes,
-                file_options={"content-type": "image/jpeg"}
-            )
+            with stage("storage_upload"):
+                self.client.storage.from_(self.bucket).upload(
+                    path=filename,
+                    file=file_bytes,
+                    file_options={"content-type": "image/jpeg", "upsert": "true"}
+                )
             
-            public_url = self.client.storage.from_(self.bucket).get_public_url(filename)
             print(f"✓ Image uploaded to Supabase Storage: {filename}")
-            return public_url
+            return self.get_image_url(filename)
             
         except Exception as e:
             print(f"Error uploading image to storage: {e}")
@@ -44,19 +317,49 @@ class SupabaseDB:
     
     def get_image_url(self, filename: str) -> str:
         """
-        Get the public URL for an image in storage
+        Get the URL for an image in storage
         
         Args:
             filename: Name of the file in storage
             
         Returns:
-            The public URL of the image
+            The image URL (public, or signed in signed mode)
+        """
+        return self.get_image_urls([filename])[0]
+    
+    def get_image_urls(self, filenames: list) -> list:
+        """
+        Get the URLs for several images (one signing request in signed mode)
+        
+        Args:
+            filenames: Names of the files in storage
+            
+        Returns:
+            List of URLs in the same order ("" for files that failed)
         """
         try:
-            return self.client.storage.from_(self.bucket).get_public_url(filename)
+            return self.url_builder.urls(filenames)
         except Exception as e:
-            print(f"Error getting image URL: {e}")
-            return ""
+            print(f"Error getting image URLs: {e}")
+            return [""] * len(filenames)
+    
+    def get_pending_image_urls(self, filenames: list) -> list:
+        """
+        Get the URLs for images whose upload may not have happened yet
+        
+        Public URLs only depend on the filename. A signed URL can only be
+        created once the object exists, so in signed mode these images get
+        None (/api/history signs them when it is read).
+        
+        Args:
+            filenames: Names of the files in storage
+            
+        Returns:
+            List of URLs (or None) in the same order
+        """
+        if self.url_builder.mode == "signed":
+            return [None] * len(filenames)
+        return self.get_image_urls(filenames)
     
     def save_prediction(self, filename: str, predicted_class: str, confidence: float) -> dict:
         """
@@ -71,13 +374,11 @@ class SupabaseDB:
             Dictionary with the inserted data
         """
         try:
-            data = {
-                "filename": filename,
-                "predicted_class": predicted_class,
-                "confidence": float(confidence)
-            }
+            data = prediction_row(filename, predicted_class, confidence)
             
-            response = self.client.table(SUPABASE_TABLE).insert(data).execute()
+            with stage("db_insert"):
+                response = self.client.table(SUPABASE_TABLE).insert(data).execute()
+            self._notify_insert()
             print(f"✓ Prediction saved to database: {filename} -> {predicted_class} ({confidence:.2%})")
             return response.data[0] if response.data else data
             
@@ -85,6 +386,105 @@ class SupabaseDB:
             print(f"Error saving prediction to database: {e}")
             raise
     
+    def save_predictions(self, predictions: list) -> list:
+        """
+        Save several predictions with a single multi-row insert
+        
+        Args:
+            predictions: List of dictionaries with filename, predicted_class and confidence
+            
+        Returns:
+            List of inserted rows
+        """
+        if not predictions:
+            return []
+        
+        try:
+            data = [
+                prediction_row(p["filename"], p["predicted_class"], p["confidence"])
+                for p in predictions
+            ]
+            
+            with stage("db_insert"):
+                response = self.client.table(SUPABASE_TABLE).insert(data).execute()
+            self._notify_insert()
+            print(f"✓ {len(data)} predictions saved to database")
+            return response.data if response.data else data
+            
+        except Exception as e:
+            print(f"Error saving predictions to database: {e}")
+            raise
+    
+    def _notify_insert(self):
+        for listener in self.insert_listeners:
+            try:
+                listener()
+            except Exception as e:
+                print(f"Error in insert listener: {e}")
+    
+    def existing_filenames(self, filenames: list, chunk_size: int = 100) -> set:
+        """
+        Find which filenames already have a prediction row
+        
+        Args:
+            filenames: Filenames to look up
+            chunk_size: Filenames per query (keeps the request URL short)
+            
+        Returns:
+            Set of filenames present in the table
+        """
+        found = set()
+        for start in range(0, len(filenames), chunk_size):
+            response = self.client.table(SUPABASE_TABLE)\
+                .select("filename")\
+                .in_("filename", filenames[start:start + chunk_size])\
+                .execute()
+            found.update(row["filename"] for row in response.data)
+        return found
+    
+    def start_batch_writer(self, max_rows: int = 50, max_delay_ms: float = 50.0,
+                           max_in_flight: int = 4) -> PredictionBatchWriter:
+        """
+        Route queue_prediction() through a batched multi-row insert writer
+        
+        Pending rows are flushed on close() and at interpreter exit.
+        
+        Args:
+            max_rows: Rows per insert
+            max_delay_ms: Maximum time a row waits for its batch to fill
+            max_in_flight: Inserts running at the same time
+            
+        Returns:
+            The PredictionBatchWriter
+        """
+        if self.batch_writer is None:
+            self.batch_writer = PredictionBatchWriter(self.save_predictions, max_rows, max_delay_ms, max_in_flight)
+            atexit.register(self.batch_writer.close)
+        return self.batch_writer
+    
+    def queue_prediction(self, filename: str, predicted_class: str, confidence: float) -> Future:
+        """
+        Save a prediction through the batch writer (or directly without one)
+        
+        Returns:
+            Future resolving to the inserted row
+        """
+        row = prediction_row(filename, predicted_class, confidence)
+        if self.batch_writer is not None:
+            return self.batch_writer.add(row)
+        
+        future = Future()
+        try:
+            future.set_result(self.save_prediction(**row))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+    
+    def close(self):
+        """Flush rows still waiting in the batch writer"""
+        if self.batch_writer is not None:
+            self.batch_writer.close()
+    
     def get_all_predictions(self, limit: int = 100) -> list:
         """
         Retrieve all predictions from the database
@@ -106,37 +506,107 @@ class SupabaseDB:
             print(f"Error retrieving predictions: {e}")
             return []
     
+    def get_predictions_page(self, limit: int = 12, cursor: str = None, columns=HISTORY_COLUMNS) -> tuple:
+        """
+        Get one page of predictions, newest first, using keyset pagination
+        
+        Pages are addressed by the (created_at, id) of the last row of the
+        previous page instead of an offset, so with an index on
+        (created_at DESC, id DESC) every page costs the same however deep it is.
+        
+        Args:
+            limit: Rows per page
+            cursor: next_cursor of the previous page (None for the newest page)
+            columns: Columns to return
+            
+        Returns:
+            Tuple of (rows, next_cursor); next_cursor is None on the last page
+        """
+        query = self.client.table(SUPABASE_TABLE)\
+            .select(",".join(columns))\
+            .order("created_at", desc=True)\
+            .order("id", desc=True)\
+            .limit(limit + 1)
+        if cursor is not None:
+            created_at, row_id = decode_cursor(cursor)
+            query = query.or_(
+                f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt.{row_id})'
+            )
+        
+        rows = query.execute().data
+        if len(rows) <= limit:
+            return rows, None
+        rows = rows[:limit]
+        return rows, encode_cursor(rows[-1])
+    
     def get_statistics(self) -> dict:
         """
         Get statistics about predictions
         
+        Reads the per-class counters kept up to date by the insert trigger on
+        SUPABASE_STATS_TABLE (one row per class, so the cost does not grow with
+        the table). If that table is missing, falls back to exact counts done
+        by the database, without average confidence.
+        
         Returns:
-            Dictionary with statistics
+            Dictionary with the total, average confidence, per-class
+            count/average confidence for CLASS_NAMES and "unknown", and the
+            original "humans"/"robots" counts
         """
         try:
-            all_predictions = self.get_all_predictions(limit=1000)
-            
-            if not all_predictions:
-                return {
-                    "total": 0,
-                    "humans": 0,
-                    "robots": 0,
-                    "avg_confidence": 0
-                }
+            try:
+                per_class = self._counter_statistics()
+                source = "counters"
+            except Exception as e:
+                print(f"⚠ Statistics counters unavailable ({e}), counting rows instead")
+                per_class = self._counted_statistics()
+                source = "count"
+            
+            total = sum(count for count, _ in per_class.values())
+            confidence_sums = [conf_sum for _, conf_sum in per_class.values()]
+            has_confidence = None not in confidence_sums
             
-            humans = sum(1 for p in all_predictions if p['predicted_class'] == 'human')
-            robots = sum(1 for p in all_predictions if p['predicted_class'] == 'robot')
-            avg_conf = sum(p['confidence'] for p in all_predictions) / len(all_predictions)
+            by_class = {}
+            for name in list(CLASS_NAMES) + ["unknown"] + sorted(set(per_class) - set(CLASS_NAMES) - {"unknown"}):
+                count, conf_sum = per_class.get(name, (0, 0.0 if has_confidence else None))
+                by_class[name] = {
+                    "count": count,
+                    "avg_confidence": (conf_sum / count if count else 0) if conf_sum is not None else None
+                }
             
             return {
-                "total": len(all_predictions),
-                "humans": humans,
-                "robots": robots,
-                "avg_confidence": avg_conf
+                "total": total,
+                "humans": by_class.get("human", {}).get("count", 0),
+                "robots": by_class.get("robot", {}).get("count", 0),
+                "avg_confidence": (sum(confidence_sums) / total if total else 0) if has_confidence else None,
+                "by_class": by_class,
+                "source": source
             }
         except Exception as e:
             print(f"Error getting statistics: {e}")
             return {}
+    
+    def _counter_statistics(self) -> dict:
+        response = self.client.table(SUPABASE_STATS_TABLE)\
+            .select("predicted_class, count, confidence_sum")\
+            .execute()
+        return {
+            row["predicted_class"]: (int(row["count"]), float(row["confidence_sum"]))
+            for row in response.data
+        }
+    
+    def _counted_statistics(self) -> dict:
+        def count(query):
+            return query.execute().count or 0
+        
+        per_class = {
+            name: (count(self.client.table(SUPABASE_TABLE).select("id", count="exact", head=True).eq("predicted_class", name)), None)
+            for name in list(CLASS_NAMES) + ["unknown"]
+        }
+        other = count(self.client.table(SUPABASE_TABLE).select("id", count="exact", head=True)) - sum(n for n, _ in per_class.values())
+        if other > 0:
+            per_class["other"] = (other, None)
+        return per_class
 
 
 if __name__ == "__main__":
@@ -0,0 +1,165 @@
+"""
+Compare per-row and batched prediction inserts against a local stand-in.
+
+Starts a small HTTP server that answers PostgREST inserts the way Supabase
+does (echoing the rows back after a configurable round-trip delay), points
+SupabaseDB at it and submits rows from --concurrency request threads to a
+WriteBehindQueue wired the way the API server wires it, measuring rows/s
+and the time from submit() to the row being inserted for:
+
+  per_row  - DB_BATCH_WRITES=0: each worker inserts one row per HTTP request
+  batched  - DB_BATCH_WRITES=1: workers hand rows to PredictionBatchWriter
+             through queue_prediction() without waiting for the insert
+
+Usage:
+    python backend/tools/benchmark_db_writes.py --rows 2000 --concurrency 16 --latency-ms 30
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+for path in (PROJECT_ROOT, PROJECT_ROOT / "backend"):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+from backend.persistence import WriteBehindQueue  # noqa: E402
+from backend.supabase_db import SupabaseDB  # noqa: E402
+
+
+class StandInSupabase(ThreadingHTTPServer):
+    """Answers POST /rest/v1/<table> like PostgREST with Prefer: return=representation."""
+
+    daemon_threads = True
+    request_queue_size = 256
+
+    def __init__(self, latency_ms):
+        super().__init__(("127.0.0.1", 0), _StandInHandler)
+        self.latency = latency_ms / 1000.0
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.rows = 0
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_port}"
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # headers and body go out in separate writes
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        rows = body if isinstance(body, list) else [body]
+        time.sleep(self.server.latency)
+        with self.server.lock:
+            self.server.requests += 1
+            self.server.rows += len(rows)
+            first_id = self.server.rows - len(rows)
+        payload = json.dumps([{"id": first_id + i, **row} for i, row in enumerate(rows)]).encode()
+        self.send_response(201)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+def run_path(path, args):
+    server = StandInSupabase(args.latency_ms)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    db = SupabaseDB(url=server.url, key="stand-in-key")
+    if path == "batched":
+        db.start_batch_writer(
+            max_rows=args.max_rows, max_delay_ms=args.max_delay_ms, max_in_flight=args.max_in_flight
+        )
+    failed = []
+    write_behind = WriteBehindQueue(
+        upload_fn=lambda image_bytes, filename: None,  # Rows only: the jobs carry no image
+        insert_fn=lambda record: db.queue_prediction(**record),
+        on_failure=lambda job, error: failed.append(error),
+        max_pending=args.queue_size,
+        workers=args.workers,
+        enqueue_timeout=60.0,
+    )
+    write_behind.start()
+
+    def submit(i):
+        record = {"filename": f"image_{i}.jpg", "predicted_class": "robot", "confidence": 0.9}
+        write_behind.submit(None, record["filename"], record)
+
+    # save_prediction / save_predictions print one line per insert
+    with contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            list(pool.map(submit, range(args.rows)))
+        while write_behind.stats()["pending"]:
+            time.sleep(0.005)
+        elapsed = time.perf_counter() - started
+        stats = write_behind.stats()
+        write_behind.stop()
+        db.close()
+
+    server.shutdown()
+    server.server_close()
+    return {
+        "path": path,
+        "rows": args.rows,
+        "failed": len(failed),
+        "http_requests": server.requests,
+        "rows_per_sec": args.rows / elapsed,
+        "row_p50_ms": stats["flush_ms"]["p50"],
+        "row_p99_ms": stats["flush_ms"]["p99"],
+    }
+
+
+def main():
+    from backend.config import (
+        DB_BATCH_MAX_DELAY_MS,
+        DB_BATCH_MAX_IN_FLIGHT,
+        DB_BATCH_MAX_ROWS,
+        PERSIST_QUEUE_SIZE,
+        PERSIST_WORKERS,
+    )
+
+    parser = argparse.ArgumentParser(description="Benchmark per-row vs batched prediction inserts.")
+    parser.add_argument("--rows", type=int, default=2000, help="Rows written per path.")
+    parser.add_argument("--concurrency", type=int, default=16, help="Request threads submitting rows.")
+    parser.add_argument("--workers", type=int, default=PERSIST_WORKERS, help="Write-behind worker threads.")
+    parser.add_argument("--queue-size", type=int, default=PERSIST_QUEUE_SIZE, help="Write-behind queue capacity.")
+    parser.add_argument("--latency-ms", type=float, default=30.0, help="Simulated round trip per HTTP request.")
+    parser.add_argument("--max-rows", type=int, default=DB_BATCH_MAX_ROWS, help="Rows per batched insert.")
+    parser.add_argument("--max-delay-ms", type=float, default=DB_BATCH_MAX_DELAY_MS, help="Batch writer time threshold.")
+    parser.add_argument("--max-in-flight", type=int, default=DB_BATCH_MAX_IN_FLIGHT, help="Batched inserts at once.")
+    parser.add_argument("--json", type=Path, help="Write the results to this JSON file.")
+    args = parser.parse_args()
+
+    results = [run_path(path, args) for path in ("per_row", "batched")]
+
+    print(f"\n{'path':8} {'rows':>6} {'failed':>6} {'requests':>9} {'rows/s':>9} {'row p50':>9} {'row p99':>9}")
+    for row in results:
+        print(
+            f"{row['path']:8} {row['rows']:6d} {row['failed']:6d} {row['http_requests']:9d} {row['rows_per_sec']:9.1f} "
+            f"{row['row_p50_ms']:7.1f}ms {row['row_p99_ms']:7.1f}ms"
+        )
+    print(f"\nbatched / per_row throughput: {results[1]['rows_per_sec'] / results[0]['rows_per_sec']:.1f}x")
+
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2))
+        print(f"\n✓ Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
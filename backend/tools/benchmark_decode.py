@@ -0,0 +1,186 @@
+"""
+Benchmark image decode + resize for model input.
+
+Compares the original preprocessing path (full-resolution decode, resize,
+new float32 array per request) with the fast path in backend/imaging.py
+(JPEG draft-mode decode, reduce-based resize, preallocated buffer) on
+synthetic phone photos and camera frames.
+
+Usage:
+    python backend/tools/benchmark_decode.py --runs 50 --json decode_benchmark.json
+"""
+
+import argparse
+import io
+import json
+import multiprocessing
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from backend.imaging import decode_image  # noqa: E402
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+MODEL_INPUT_SIZE = (224, 224)
+
+CASES = {
+    "phone_photo_4032x3024_q90": ((4032, 3024), "JPEG", 90),
+    "phone_photo_portrait_3024x4032_q90": ((3024, 4032), "JPEG", 90),
+    "camera_frame_1280x720_q95": ((1280, 720), "JPEG", 95),
+    "live_frame_1280x720_q85": ((1280, 720), "JPEG", 85),
+    "screenshot_1920x1080_png": ((1920, 1080), "PNG", None),
+}
+
+
+def synthetic_image(size, fmt, quality, seed=0):
+    """Encode a gradient + noise image, roughly as compressible as a photo."""
+    width, height = size
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    base = np.stack([
+        x * 255.0 / width,
+        y * 255.0 / height,
+        (x + y) * 255.0 / (width + height),
+    ], axis=-1)
+    pixels = np.clip(base + rng.normal(0, 12, base.shape), 0, 255).astype(np.uint8)
+
+    buffer = io.BytesIO()
+    options = {"quality": quality} if quality else {}
+    Image.fromarray(pixels).save(buffer, fmt, **options)
+    return buffer.getvalue()
+
+
+def baseline_path(image_bytes):
+    """Preprocessing as it was before the fast path (one new array per call)."""
+    image = Image.open(io.BytesIO(image_bytes))
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    image = image.resize(MODEL_INPUT_SIZE)
+    image_array = np.array(image).astype(np.float32)
+    return np.expand_dims(image_array, axis=0)
+
+
+def fast_path(image_bytes, buffer):
+    decode_image(image_bytes, MODEL_INPUT_SIZE, out=buffer[0], fast=True)
+    return buffer
+
+
+def make_runner(path):
+    if path == "baseline":
+        return baseline_path
+    buffer = np.empty((1, MODEL_INPUT_SIZE[1], MODEL_INPUT_SIZE[0], 3), dtype=np.float32)
+    return lambda image_bytes: fast_path(image_bytes, buffer)
+
+
+def measure_latency(runner, image_bytes, runs, warmup=3):
+    for _ in range(warmup):
+        runner(image_bytes)
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        runner(image_bytes)
+        timings.append((time.perf_counter() - start) * 1000.0)
+    timings = np.array(timings)
+    return {
+        "p50_ms": float(np.percentile(timings, 50)),
+        "p95_ms": float(np.percentile(timings, 95)),
+        "mean_ms": float(timings.mean()),
+    }
+
+
+def _peak_rss_bytes():
+    # ru_maxrss survives exec on Linux, so a spawned child would report the
+    # parent's peak; VmHWM belongs to the child's own address space.
+    status = Path("/proc/self/status")
+    if status.exists():
+        for line in status.read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) * 1024
+    scale = 1 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+def _peak_memory_child(path, image_bytes, queue):
+    runner = make_runner(path)
+    before = _peak_rss_bytes()
+    runner(image_bytes)
+    queue.put(_peak_rss_bytes() - before)
+
+
+def measure_peak_memory(path, image_bytes):
+    """Peak RSS growth of one decode, measured in a fresh process."""
+    if resource is None:
+        return None
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=_peak_memory_child, args=(path, image_bytes, queue))
+    process.start()
+    result = queue.get(timeout=120)
+    process.join()
+    return result
+
+
+def check_equivalence(image_bytes):
+    """Mean absolute pixel difference between the two paths (0-255 scale)."""
+    baseline = baseline_path(image_bytes)
+    fast = make_runner("fast")(image_bytes)
+    return float(np.abs(baseline - fast).mean())
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark baseline vs fast image decode + resize."
+    )
+    parser.add_argument("--runs", type=int, default=30, help="Timed runs per case and path.")
+    parser.add_argument("--case", action="append", choices=sorted(CASES), help="Only run the given case (repeatable).")
+    parser.add_argument("--no-memory", action="store_true", help="Skip peak memory measurement.")
+    parser.add_argument("--json", type=Path, help="Write the results to this JSON file.")
+    args = parser.parse_args()
+
+    results = []
+    for case in args.case or CASES:
+        size, fmt, quality = CASES[case]
+        image_bytes = synthetic_image(size, fmt, quality)
+        row = {
+            "case": case,
+            "encoded_kb": len(image_bytes) / 1024.0,
+            "mean_abs_pixel_diff": check_equivalence(image_bytes),
+        }
+        for path in ("baseline", "fast"):
+            row[path] = measure_latency(make_runner(path), image_bytes, args.runs)
+            if not args.no_memory:
+                peak = measure_peak_memory(path, image_bytes)
+                row[path]["peak_rss_mb"] = peak / (1024 * 1024) if peak is not None else None
+        row["speedup"] = row["baseline"]["p50_ms"] / row["fast"]["p50_ms"]
+        results.append(row)
+
+    print(f"\n{'case':38} {'KB':>7} {'base p50':>9} {'fast p50':>9} {'speedup':>8} {'base MB':>8} {'fast MB':>8} {'diff':>6}")
+    for row in results:
+        base_mb = row["baseline"].get("peak_rss_mb")
+        fast_mb = row["fast"].get("peak_rss_mb")
+        print(
+            f"{row['case']:38} {row['encoded_kb']:7.0f} "
+            f"{row['baseline']['p50_ms']:8.2f}ms {row['fast']['p50_ms']:8.2f}ms {row['speedup']:7.1f}x "
+            f"{base_mb if base_mb is not None else float('nan'):8.1f} "
+            f"{fast_mb if fast_mb is not None else float('nan'):8.1f} "
+            f"{row['mean_abs_pixel_diff']:6.2f}"
+        )
+
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2))
+        print(f"\n✓ Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+Benchmark image URL construction for /api/history responses.
+
+Builds the URL list of a history page of N rows (plus the JSON encoding of
+the response) in several ways:
+
+  client_public  - storage client get_public_url() once per row (previous path)
+  local_public   - StorageURLBuilder, formatted locally
+  signed_per_row - one create_signed_url() request per row
+  signed_batched - StorageURLBuilder in signed mode, one request per page
+
+Signed modes run against a local stand-in for the storage API with a
+configurable round trip. The local URLs are checked against the client's
+before timing.
+
+Usage:
+    python backend/tools/benchmark_history_urls.py --rows 100 1000 --latency-ms 20
+"""
+
+import argparse
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import numpy as np
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+for path in (PROJECT_ROOT, PROJECT_ROOT / "backend"):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+from backend.supabase_db import StorageURLBuilder, SupabaseDB  # noqa: E402
+
+
+class StandInStorage(ThreadingHTTPServer):
+    """Answers POST /storage/v1/object/sign/<bucket>[/<path>] like Supabase Storage."""
+
+    daemon_threads = True
+    request_queue_size = 256
+
+    def __init__(self, latency_ms):
+        super().__init__(("127.0.0.1", 0), _StandInHandler)
+        self.latency = latency_ms / 1000.0
+        self.lock = threading.Lock()
+        self.requests = 0
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_port}"
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        time.sleep(self.server.latency)
+        with self.server.lock:
+            self.server.requests += 1
+        prefix = "/storage/v1/object/sign/"
+        bucket, _, path = self.path[len(prefix):].partition("/")
+        if path:
+            payload = {"signedURL": f"/object/sign/{bucket}/{path}?token=stand-in"}
+        else:
+            payload = [
+                {"path": p, "signedURL": f"/object/sign/{bucket}/{p}?token=stand-in", "error": None}
+                for p in body["paths"]
+            ]
+        data = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def history_rows(count):
+    return [
+        {
+            "id": i,
+            "filename": f"20250101_120000_{i:08x}_camera_capture.jpg",
+            "predicted_class": "robot" if i % 2 else "human",
+            "confidence": 0.9,
+            "created_at": "2025-01-01T12:00:00+00:00",
+        }
+        for i in range(count)
+    ]
+
+
+def build_response(rows, url_fn):
+    urls = url_fn([row["filename"] for row in rows])
+    predictions = [dict(row, image_url=url) for row, url in zip(rows, urls)]
+    return json.dumps({"success": True, "count": len(predictions), "predictions": predictions})
+
+
+def time_case(name, rows, url_fn, repeats):
+    build_response(rows, url_fn)  # warm-up
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        build_response(rows, url_fn)
+        timings.append((time.perf_counter() - started) * 1000.0)
+    timings = np.array(timings)
+    return {
+        "case": name,
+        "rows": len(rows),
+        "p50_ms": float(np.percentile(timings, 50)),
+        "p99_ms": float(np.percentile(timings, 99)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark history image URL construction.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[100, 1000], help="History page sizes.")
+    parser.add_argument("--repeats", type=int, default=20, help="Timed responses per case.")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="Simulated storage API round trip.")
+    parser.add_argument("--json", type=Path, help="Write the results to this JSON file.")
+    args = parser.parse_args()
+
+    server = StandInStorage(args.latency_ms)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    db = SupabaseDB(url=server.url, key="stand-in-key")
+    bucket = db.client.storage.from_(db.bucket)
+
+    local = StorageURLBuilder(server.url, db.bucket)
+    signed = StorageURLBuilder(server.url, db.bucket, mode="signed", sign_urls=bucket.create_signed_urls)
+
+    sample = [row["filename"] for row in history_rows(10)] + ["folder/a b+c%.jpg", "ăîș.jpg"]
+    mismatched = [name for name in sample if local.public_url(name) != bucket.get_public_url(name)]
+    if mismatched:
+        print(f"⚠ Local URLs differ from the storage client for: {mismatched}")
+
+    cases = {
+        "client_public": lambda names: [bucket.get_public_url(name) for name in names],
+        "local_public": local.urls,
+        "signed_per_row": lambda names: [bucket.create_signed_url(name, 3600)["signedURL"] for name in names],
+        "signed_batched": signed.urls,
+    }
+
+    results = []
+    for count in args.rows:
+        rows = history_rows(count)
+        for name, url_fn in cases.items():
+            # Per-row signing pays one round trip per row; keep its run short.
+            repeats = max(1, args.repeats // 10) if name == "signed_per_row" else args.repeats
+            requests_before = server.requests
+            result = time_case(name, rows, url_fn, repeats)
+            result["storage_requests_per_page"] = (server.requests - requests_before) / (repeats + 1)
+            results.append(result)
+
+    server.shutdown()
+    server.server_close()
+
+    print(f"\n{'case':15} {'rows':>6} {'p50':>11} {'p99':>11} {'requests/page':>14}")
+    for row in results:
+        print(
+            f"{row['case']:15} {row['rows']:6d} {row['p50_ms']:9.2f}ms {row['p99_ms']:9.2f}ms "
+            f"{row['storage_requests_per_page']:14.0f}"
+        )
+
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2))
+        print(f"\n✓ Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
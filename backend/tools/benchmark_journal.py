@@ -0,0 +1,101 @@
+"""
+Benchmark journal appends under concurrent requests.
+
+Appends prediction rows (with an image each, like the /api/predict fallback)
+from several threads for every fsync policy and reports appends/s and
+per-append latency. The "image_only" row is the previous fallback: writing
+the image into backend/uploads without keeping the prediction.
+
+Usage:
+    python backend/tools/benchmark_journal.py --threads 16 --appends 2000 --image-kb 200
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from backend.journal import FSYNC_POLICIES, PredictionJournal  # noqa: E402
+
+
+def run_case(policy, directory, threads, appends, image_bytes):
+    if policy == "image_only":
+        directory.mkdir(parents=True, exist_ok=True)
+
+        def append(i):
+            with open(directory / f"image_{i}.jpg", "wb") as f:
+                f.write(image_bytes)
+        journal = None
+    else:
+        journal = PredictionJournal(directory, fsync=policy)
+
+        def append(i):
+            journal.append(
+                {"filename": f"image_{i}.jpg", "predicted_class": "robot", "confidence": 0.9},
+                image_bytes,
+            )
+
+    def timed(i):
+        started = time.perf_counter()
+        append(i)
+        return (time.perf_counter() - started) * 1000.0
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        latencies = np.array(list(pool.map(timed, range(appends))))
+    elapsed = time.perf_counter() - started
+    if journal is not None:
+        journal.close()
+
+    return {
+        "policy": policy,
+        "appends": appends,
+        "appends_per_sec": appends / elapsed,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark prediction journal appends.")
+    parser.add_argument("--threads", type=int, default=16, help="Concurrent appending threads.")
+    parser.add_argument("--appends", type=int, default=2000, help="Appends per policy.")
+    parser.add_argument("--image-kb", type=int, default=200, help="Image size per append (0 for rows only).")
+    parser.add_argument("--dir", type=Path, help="Directory on the disk to test (default: a temp dir).")
+    parser.add_argument("--json", type=Path, help="Write the results to this JSON file.")
+    args = parser.parse_args()
+
+    image_bytes = os.urandom(args.image_kb * 1024) if args.image_kb else None
+    base = Path(tempfile.mkdtemp(prefix="journal-bench-", dir=args.dir))
+
+    results = []
+    try:
+        for policy in ("image_only", *FSYNC_POLICIES):
+            if policy == "image_only" and image_bytes is None:
+                continue
+            results.append(run_case(policy, base / policy, args.threads, args.appends, image_bytes))
+    finally:
+        shutil.rmtree(base, ignore_errors=True)
+
+    print(f"\n{'policy':10} {'appends/s':>10} {'p50':>9} {'p99':>9}")
+    for row in results:
+        print(f"{row['policy']:10} {row['appends_per_sec']:10.1f} {row['p50_ms']:7.2f}ms {row['p99_ms']:7.2f}ms")
+
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2))
+        print(f"\n✓ Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
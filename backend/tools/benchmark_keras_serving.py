@@ -0,0 +1,128 @@
+"""
+Compare Keras serving paths on CPU.
+
+Measures per-call latency of model.predict against the compiled tf.function
+serving path (optionally XLA) used by KerasEngine, for a set of batch sizes.
+
+Usage:
+    python backend/tools/benchmark_keras_serving.py --batch-sizes 1,4,16 --xla
+    python backend/tools/benchmark_keras_serving.py --random-model   # no trained model needed
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from backend.config import MODEL_PATH, MODEL_INPUT_SIZE, MODEL_BACKBONE, NUM_CLASSES  # noqa: E402
+from backend.inference import KerasEngine  # noqa: E402
+
+
+def build_random_model():
+    """EfficientNet-B0 classifier with random weights (same shape as the trained one)."""
+    from tensorflow import keras
+    from tensorflow.keras import layers
+
+    input_shape = (MODEL_INPUT_SIZE[1], MODEL_INPUT_SIZE[0], 3)
+    base_model = keras.applications.EfficientNetB0(input_shape=input_shape, include_top=False, weights=None)
+    inputs = layers.Input(shape=input_shape)
+    x = base_model(inputs, training=False)
+    x = layers.GlobalAveragePooling2D()(x)
+    x = layers.Dense(256, activation='relu')(x)
+    outputs = layers.Dense(NUM_CLASSES, activation='softmax')(x)
+    return keras.Model(inputs, outputs)
+
+
+def measure(engine, batch, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        engine.predict_batch(batch)
+        timings.append((time.perf_counter() - start) * 1000.0)
+    timings = np.array(timings)
+    return {
+        "p50_ms": float(np.percentile(timings, 50)),
+        "p99_ms": float(np.percentile(timings, 99)),
+        "mean_ms": float(timings.mean()),
+        "images_per_sec": float(len(batch) * 1000.0 / timings.mean()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark model.predict vs compiled Keras serving.")
+    parser.add_argument("--model", type=Path, default=MODEL_PATH, help="Keras model file (.h5/.keras).")
+    parser.add_argument("--random-model", action="store_true", help="Use a randomly initialized EfficientNet-B0.")
+    parser.add_argument("--batch-sizes", default="1,4,16", help="Comma-separated batch sizes.")
+    parser.add_argument("--runs", type=int, default=50, help="Timed calls per batch size.")
+    parser.add_argument("--xla", action="store_true", help="Also benchmark the XLA-compiled path.")
+    parser.add_argument("--json", type=Path, help="Write the results to this JSON file.")
+    args = parser.parse_args()
+
+    batch_sizes = [int(size) for size in args.batch_sizes.split(",")]
+
+    if args.random_model:
+        model = build_random_model()
+    else:
+        from tensorflow import keras
+
+        if not args.model.exists():
+            print(f"⚠ Model not found at {args.model}. Use --random-model to benchmark without one.")
+            return
+        model = keras.models.load_model(args.model)
+
+    modes = [("predict", "predict", False), ("compiled", "compiled", False)]
+    if args.xla:
+        modes.append(("compiled+xla", "compiled", True))
+
+    rng = np.random.default_rng(0)
+    inputs = {
+        size: rng.uniform(0, 255, (size, MODEL_INPUT_SIZE[1], MODEL_INPUT_SIZE[0], 3)).astype(np.float32)
+        for size in batch_sizes
+    }
+
+    results = {}
+    reference = {}
+    for label, serving_mode, jit_compile in modes:
+        engine = KerasEngine(
+            model,
+            MODEL_INPUT_SIZE,
+            MODEL_BACKBONE,
+            serving_mode=serving_mode,
+            batch_buckets=batch_sizes,
+            jit_compile=jit_compile,
+        )
+        engine.warmup(batch_sizes)
+        print(f"{label}: warm-up {engine.warmup_seconds:.2f}s")
+
+        results[label] = {}
+        for size in batch_sizes:
+            stats = measure(engine, inputs[size], args.runs)
+            probabilities = engine.predict_batch(inputs[size])
+            if size not in reference:
+                reference[size] = probabilities
+            stats["max_abs_diff_vs_predict"] = float(np.abs(probabilities - reference[size]).max())
+            results[label][size] = stats
+
+    print(f"\n{'mode':14} {'batch':>5} {'p50':>9} {'p99':>9} {'img/s':>8} {'vs predict':>10}")
+    for label, by_size in results.items():
+        for size, stats in by_size.items():
+            speedup = results["predict"][size]["p50_ms"] / stats["p50_ms"]
+            print(
+                f"{label:14} {size:5d} {stats['p50_ms']:7.2f}ms {stats['p99_ms']:7.2f}ms "
+                f"{stats['images_per_sec']:8.1f} {speedup:9.2f}x"
+            )
+
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2))
+        print(f"\n✓ Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
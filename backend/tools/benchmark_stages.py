@@ -0,0 +1,375 @@
+"""
+Microbenchmarks for the per-request CPU stages, with stored baselines.
+
+Times each stage in isolation (pytest-benchmark style: the number of calls
+per round is calibrated so a round lasts at least --min-round-ms, then
+rounds are repeated for up to --max-time seconds per case):
+
+  decode/<format>/<WxH>     open_rgb: decode to RGB (JPEG draft mode)
+  decode/jpeg-exact/<WxH>   open_rgb without draft mode
+  decode/raw/<WxH>          decode_raw of a uint8 RGB frame
+  resize/<format>/<WxH>     resize_into from the decoded image
+  normalize/<backend>       engine normalization of one input; includes
+                            refilling the buffer, since it works in place
+  preprocess/<backend>/...  engine.preprocess end to end
+  decision/single/<N>       analyze_probabilities once per row
+  decision/batch/<N>        analyze_probabilities_batch on N rows
+  decision/arrays/<N>       decision.decide on N rows, without building dicts
+
+Backends are the Keras family (Keras, ONNX, TFLite) and PyTorch, which
+normalize differently; neither framework is imported.
+
+--save stores the results as a baseline; --compare times the cases again
+and exits with status 1 when a case is slower than the baseline by more
+than its tolerance. The whole suite runs --passes times, each pass in a
+fresh process (as pyperf does: hash seeds and memory layout shift some
+cases for the life of a process), and every case is compared by its
+median over the passes, so a regression has to show up in most passes to
+fail the gate; slowdowns on shared machines come in bursts and hit one or
+two passes. Each case's tolerance is --threshold, raised to
+--noise-factor times the noise of the two medians being compared (each
+case's pass-to-pass relative IQR in the baseline and in the current run,
+divided by sqrt(passes)), so naturally jittery cases get a wider margin
+instead of failing on an unchanged tree. Changes are divided by the
+suite's drift, the median change over all compared cases, unless
+--no-calibrate is given: a slower or busier machine moves every case, a
+code change moves a few. A slowdown of most stages at once is therefore
+not flagged; the tool warns when Python, NumPy or Pillow differ from the
+baseline's, and --no-calibrate shows raw changes.
+
+Baselines are runner specific: timings from one machine say nothing about
+another, even of the same nominal type. Regenerate the baseline with
+--save on the runner that will run --compare (e.g. once per CI runner
+image, stored as that runner's baseline file) instead of reusing one
+recorded on a laptop or on a different runner.
+
+Usage:
+    python backend/tools/benchmark_stages.py --save
+    python backend/tools/benchmark_stages.py --compare --threshold 0.25
+    python backend/tools/benchmark_stages.py --compare ci-baseline.json --passes 7
+    python backend/tools/benchmark_stages.py --filter decision --compare
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+for path in (PROJECT_ROOT, PROJECT_ROOT / "backend"):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+import backend.app as api  # noqa: E402
+from backend.config import (  # noqa: E402
+    CLASS_NAMES,
+    MODEL_BACKBONE,
+    MODEL_INPUT_SIZE,
+    PREDICTION_MARGIN,
+    PREDICTION_THRESHOLD,
+)
+from backend.decision import decide  # noqa: E402
+from backend.imaging import decode_raw, open_rgb, resize_into  # noqa: E402
+from backend.inference import KerasFamilyEngine, TorchEngine  # noqa: E402
+from backend.tools.benchmark_decode import synthetic_image  # noqa: E402
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baselines" / "benchmark_stages.json"
+
+RESOLUTIONS = ((640, 480), (1280, 720), (1920, 1080), (4032, 3024))
+FORMATS = {"jpeg": ("JPEG", 85), "png": ("PNG", None), "webp": ("WEBP", 80)}
+DECISION_BATCH_SIZES = (1, 4, 16, 64, 256, 1024, 10_000)
+METRICS = ("min_us", "median_us", "mean_us")
+MIN_DRIFT_CASES = 8  # Fewer compared cases (e.g. with --filter) are compared uncalibrated
+
+
+class NormalizeOnlyTorchEngine(TorchEngine):
+    """TorchEngine normalization without loading torch or a model."""
+
+    def __init__(self, input_size, fast_decode=True):
+        super(TorchEngine, self).__init__(None, input_size, fast_decode)
+
+
+def backends():
+    return {
+        "keras": KerasFamilyEngine(None, MODEL_INPUT_SIZE, MODEL_BACKBONE),
+        "torch": NormalizeOnlyTorchEngine(MODEL_INPUT_SIZE),
+    }
+
+
+def build_cases():
+    """Return {name: zero-argument callable}"""
+    cases = {}
+    size = MODEL_INPUT_SIZE
+
+    for fmt, (pil_format, quality) in FORMATS.items():
+        for width, height in RESOLUTIONS:
+            if fmt != "jpeg" and width > 1920:
+                continue  # Phone photos arrive as JPEG
+            image_bytes = synthetic_image((width, height), pil_format, quality)
+            decoded = open_rgb(image_bytes, size)
+            label = f"{fmt}/{width}x{height}"
+            cases[f"decode/{label}"] = lambda b=image_bytes: open_rgb(b, size)
+            cases[f"resize/{label}"] = lambda image=decoded: resize_into(image, size, out=buffer)
+
+    camera = synthetic_image((1280, 720), "JPEG", 85)
+    cases["decode/jpeg-exact/1280x720"] = lambda: open_rgb(camera, size, fast=False)
+    pre_resized = synthetic_image(size, "JPEG", 85)
+    cases[f"decode/jpeg/{size[0]}x{size[1]}"] = lambda: open_rgb(pre_resized, size)
+    raw = np.asarray(Image.open(io.BytesIO(pre_resized)).convert("RGB")).tobytes()
+    cases[f"decode/raw/{size[0]}x{size[1]}"] = lambda: decode_raw(raw, size, out=buffer)
+
+    source = np.random.default_rng(0).uniform(0, 255, (1, size[1], size[0], 3)).astype(np.float32)
+    batch = np.empty_like(source)
+    for name, engine in backends().items():
+        def normalize(engine=engine):
+            np.copyto(batch, source)
+            engine._normalize(batch)
+        cases[f"normalize/{name}"] = normalize
+        cases[f"preprocess/{name}/jpeg/1280x720"] = lambda engine=engine: engine.preprocess(camera, out=batch)
+
+    rng = np.random.default_rng(0)
+    for n in DECISION_BATCH_SIZES:
+        probabilities = rng.dirichlet(np.ones(len(CLASS_NAMES)), size=n).astype(np.float32)
+        cases[f"decision/single/{n}"] = lambda p=probabilities: [api.analyze_probabilities(row) for row in p]
+        cases[f"decision/batch/{n}"] = lambda p=probabilities: api.analyze_probabilities_batch(p)
+        cases[f"decision/arrays/{n}"] = lambda p=probabilities: decide(
+            p, CLASS_NAMES, PREDICTION_THRESHOLD, PREDICTION_MARGIN
+        )
+
+    return cases
+
+
+buffer = np.empty((MODEL_INPUT_SIZE[1], MODEL_INPUT_SIZE[0], 3), dtype=np.float32)
+
+
+def measure(fn, min_round_ms, max_time, max_rounds):
+    """Time fn; returns per-call statistics in microseconds"""
+    fn()  # warm-up
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - started
+        if elapsed * 1000.0 >= min_round_ms or number >= 1 << 20:
+            break
+        number *= 2 if elapsed * 1000.0 >= min_round_ms / 10 else 10
+
+    rounds = []
+    deadline = time.perf_counter() + max_time
+    while len(rounds) < max_rounds and (len(rounds) < 5 or time.perf_counter() < deadline):
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        rounds.append((time.perf_counter() - started) / number * 1e6)
+
+    rounds = np.array(rounds)
+    q1, q3 = np.percentile(rounds, [25, 75])
+    return {
+        "median_us": float(np.median(rounds)),
+        "min_us": float(rounds.min()),
+        "mean_us": float(rounds.mean()),
+        "stddev_us": float(rounds.std()),
+        "iqr_us": float(q3 - q1),
+        "rounds": len(rounds),
+        "calls_per_round": number,
+    }
+
+
+def machine_info():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pillow": Image.__version__,
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpu_count": len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count(),
+    }
+
+
+def summarize(passes):
+    """
+    Combine the per-pass statistics of one case
+
+    Returns:
+        The median over the passes of each statistic, plus the per-pass
+        values of the compared metrics under "passes"
+    """
+    summary = {key: float(np.median([stats[key] for stats in passes])) for key in passes[0]}
+    summary["rounds"] = sum(stats["rounds"] for stats in passes)
+    summary["calls_per_round"] = passes[-1]["calls_per_round"]
+    summary["passes"] = {metric: [stats[metric] for stats in passes] for metric in METRICS}
+    return summary
+
+
+def spread(stats, metric):
+    """Relative IQR of a case's per-pass values (0.0 when there are fewer than 3 passes)"""
+    values = stats.get("passes", {}).get(metric, [])
+    if len(values) < 3:
+        return 0.0
+    q1, q3 = np.percentile(values, [25, 75])
+    return float((q3 - q1) / np.median(values))
+
+
+def noise(stats, metric):
+    """Relative noise of a case's median over its passes: the spread shrinks with sqrt(passes)"""
+    return spread(stats, metric) / np.sqrt(max(len(stats.get("passes", {}).get(metric, [])), 1))
+
+
+def drift(results, baseline, metric):
+    """
+    Median current / baseline time over the cases both runs have
+
+    Returns:
+        The ratio, or None when fewer than MIN_DRIFT_CASES cases compare
+    """
+    ratios = [stats[metric] / baseline["cases"][name][metric]
+              for name, stats in results.items() if name in baseline["cases"]]
+    if len(ratios) < MIN_DRIFT_CASES:
+        return None
+    return float(np.median(ratios))
+
+
+def compare(results, baseline, metric, threshold, noise_factor, speed=1.0):
+    """
+    Print the comparison table
+
+    Args:
+        threshold: Smallest allowed slowdown (0.25 = 25%)
+        noise_factor: Multiple of the combined noise of the two medians a
+            case may slow down by when that is more than threshold
+        speed: The suite's drift; changes are divided by it
+
+    Returns:
+        Names of the regressed cases
+    """
+    regressed = []
+    print(f"\n{'case':36} {'baseline':>11} {'current':>11} {'change':>8} {'limit':>7}")
+    for name, stats in results.items():
+        reference = baseline["cases"].get(name)
+        if reference is None:
+            print(f"{name:36} {'-':>11} {stats[metric]:9.1f}us {'new':>8}")
+            continue
+        change = stats[metric] / reference[metric] / speed - 1.0
+        limit = max(threshold, noise_factor * float(np.hypot(noise(reference, metric), noise(stats, metric))))
+        status = ""
+        if change > limit:
+            status = "  ⚠ REGRESSION"
+            regressed.append(name)
+        elif change < -limit:
+            status = "  faster"
+        print(f"{name:36} {reference[metric]:9.1f}us {stats[metric]:9.1f}us {change:+7.1%} {limit:6.0%}{status}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmark preprocessing and decision stages.")
+    parser.add_argument("--filter", action="append", help="Only run cases containing this text (repeatable).")
+    parser.add_argument("--min-round-ms", type=float, default=20.0, help="Minimum duration of one timing round.")
+    parser.add_argument("--max-time", type=float, default=0.4, help="Seconds of rounds per case and pass.")
+    parser.add_argument("--passes", type=int, default=5,
+                        help="Times the whole suite is run; cases are compared by their median over the passes.")
+    parser.add_argument("--max-rounds", type=int, default=200)
+    parser.add_argument("--save", nargs="?", const=DEFAULT_BASELINE, type=Path,
+                        help=f"Store the results as a baseline (default: {DEFAULT_BASELINE.relative_to(PROJECT_ROOT)}).")
+    parser.add_argument("--compare", nargs="?", const=DEFAULT_BASELINE, type=Path,
+                        help="Compare with a stored baseline; exit 1 on a regression.")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="Smallest allowed slowdown before a case fails (0.25 = 25%%).")
+    parser.add_argument("--noise-factor", type=float, default=3.0,
+                        help="Allow slowdowns up to this multiple of a case's measured noise.")
+    parser.add_argument("--metric", choices=METRICS, default="median_us",
+                        help="Per-pass statistic compared with the baseline (median varies least between passes).")
+    parser.add_argument("--no-calibrate", action="store_true",
+                        help="Compare raw times instead of dividing by the suite's drift.")
+    parser.add_argument("--json", type=Path, help="Write the results to this JSON file.")
+    parser.add_argument("--worker", type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        cases = build_cases()
+        if args.filter:
+            cases = {name: fn for name, fn in cases.items() if any(text in name for text in args.filter)}
+        stats = {name: measure(fn, args.min_round_ms, args.max_time, args.max_rounds) for name, fn in cases.items()}
+        args.worker.write_text(json.dumps(stats))
+        return
+
+    baseline = None
+    if args.compare:
+        baseline = json.loads(args.compare.read_text())
+
+    # Slowdowns on shared machines come in bursts, and hash seeds and memory
+    # layout make some cases faster or slower for the whole life of a
+    # process. Each pass therefore runs in a fresh process, spread out in
+    # time, and each case is summarized by its median pass.
+    command = [sys.executable, str(Path(__file__).resolve()), "--min-round-ms", str(args.min_round_ms),
+               "--max-time", str(args.max_time), "--max-rounds", str(args.max_rounds)]
+    for text in args.filter or []:
+        command += ["--filter", text]
+    passes = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for number in range(args.passes):
+            print(f"Pass {number + 1}/{args.passes}...")
+            output = Path(workdir) / f"pass-{number}.json"
+            worker = subprocess.run(command + ["--worker", str(output)], capture_output=True, text=True)
+            if worker.returncode != 0:
+                print(worker.stderr, file=sys.stderr)
+                sys.exit(f"⚠ Pass {number + 1} failed")
+            for name, stats in json.loads(output.read_text()).items():
+                passes.setdefault(name, []).append(stats)
+    results = {name: summarize(stats) for name, stats in passes.items()}
+
+    for name, stats in results.items():
+        print(f"{name:36} {stats['min_us']:10.1f}us min {stats['median_us']:10.1f}us median  ±{spread(stats, 'median_us'):.0%} across passes")
+
+    report = {**machine_info(), "cases": results}
+    if args.save:
+        args.save.parent.mkdir(parents=True, exist_ok=True)
+        args.save.write_text(json.dumps(report, indent=2))
+        print(f"\n✓ Baseline written to {args.save}")
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=2))
+        print(f"\n✓ Results written to {args.json}")
+
+    if baseline is not None:
+        if baseline.get("machine") != report["machine"] or baseline.get("cpu_count") != report["cpu_count"]:
+            print(f"⚠ Baseline was recorded on a different machine ({baseline.get('machine')}, "
+                  f"{baseline.get('cpu_count')} CPUs)")
+        for key in ("python", "numpy", "pillow"):
+            if baseline.get(key) != report[key]:
+                print(f"⚠ Baseline used {key} {baseline.get(key)}, this run {report[key]}")
+        speed = 1.0
+        if not args.no_calibrate:
+            speed = drift(results, baseline, args.metric)
+            if speed is None:
+                speed = 1.0
+                print(f"\nFewer than {MIN_DRIFT_CASES} cases to compare: changes below are not calibrated")
+            else:
+                print(f"\nSuite drift: cases take {speed:.2f}x the baseline's time (changes below are divided by it)")
+        regressed = compare(results, baseline, args.metric, args.threshold, args.noise_factor, speed)
+        if regressed:
+            print(f"\n⚠ {len(regressed)} case(s) regressed beyond their limit: {', '.join(regressed)}")
+            sys.exit(1)
+        print("\n✓ No case regressed beyond its limit")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Measure API server startup: time until it accepts requests and until it is ready.
+
+Starts the app in a child process (werkzeug server, in-memory FakeSupabaseDB
+from load_test_api, journal in a temporary directory) and polls /ready to
+find when the server first answers (listening; 503 while loading) and when
+it first answers 200 (model loaded and warmed up). Then reports the startup
+breakdown the server recorded itself: app imports, framework import, model
+deserialization, warm-up, model hashing and the database / journal setup,
+which run in parallel with the model.
+
+  background  STARTUP_BACKGROUND=1: listen first, load the model on a thread
+  blocking    STARTUP_BACKGROUND=0: load everything, then listen
+
+Times are measured from spawning the child, so they include interpreter
+startup.
+
+Usage:
+    python backend/tools/benchmark_startup.py --runs 5
+    python backend/tools/benchmark_startup.py --model model/robot_vs_human_classifier.onnx --json startup.json
+"""
+
+import argparse
+import http.client
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+for path in (PROJECT_ROOT, PROJECT_ROOT / "backend"):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+MODES = ("background", "blocking")
+
+
+def serve(args):
+    """Child process: start the app the way main() does and listen on args.port."""
+    import backend.app as api
+    from werkzeug.serving import make_server
+
+    from backend.tools.load_test_api import FakeSupabaseDB
+
+    api.SupabaseDB = FakeSupabaseDB  # Never connect to the real project
+    api.initialize_services(background=args.mode == "background")
+    make_server("127.0.0.1", args.port, api.app, threaded=True).serve_forever()
+
+
+def get(port, path):
+    """Returns (status, JSON body), or None while nothing listens on port"""
+    try:
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+        connection.request("GET", path)
+        response = connection.getresponse()
+        body = json.loads(response.read())
+        connection.close()
+        return response.status, body
+    except (OSError, ValueError):
+        return None
+
+
+def run(mode, args, journal_dir):
+    """Start one server; returns seconds to listening and to ready, and its startup report"""
+    command = [sys.executable, __file__, "--serve", "--port", str(args.port), "--mode", mode]
+    env = dict(os.environ, MODEL_PATH=str(args.model), JOURNAL_DIR=journal_dir, METRICS_ENABLED="0")
+    started = time.perf_counter()
+    server = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    listening = ready = None
+    try:
+        deadline = started + args.timeout
+        while time.perf_counter() < deadline and server.poll() is None:
+            answer = get(args.port, "/ready")
+            if answer is not None:
+                now = time.perf_counter() - started
+                listening = listening if listening is not None else now
+                status, body = answer
+                if status == 200 or body.get("state") not in (None, "starting"):
+                    ready = now if status == 200 else None
+                    return {"listening_s": listening, "ready_s": ready, "report": body}
+            time.sleep(args.poll_ms / 1000.0)
+        return {"listening_s": listening, "ready_s": None, "report": None}
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def summarize(runs):
+    """Median of each time over the runs of one mode"""
+    def median(values):
+        values = [value for value in values if value is not None]
+        return float(np.median(values)) if values else None
+
+    phases = {}
+    for run_result in runs:
+        for name, ms in ((run_result["report"] or {}).get("phases_ms") or {}).items():
+            phases.setdefault(name, []).append(ms)
+    return {
+        "listening_s": median(run["listening_s"] for run in runs),
+        "ready_s": median(run["ready_s"] for run in runs),
+        "phases_ms": {name: float(np.median(values)) for name, values in phases.items()},
+    }
+
+
+def main():
+    from backend.config import MODEL_PATH
+
+    parser = argparse.ArgumentParser(description="Benchmark API server startup time.")
+    parser.add_argument("--model", type=Path, default=MODEL_PATH, help="Model file the server loads.")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--runs", type=int, default=3, help="Server starts per mode (medians are reported).")
+    parser.add_argument("--port", type=int, default=5057)
+    parser.add_argument("--poll-ms", type=float, default=10.0, help="Polling interval while waiting.")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Seconds to wait for one start.")
+    parser.add_argument("--json", type=Path, help="Write the results to this JSON file.")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--mode", choices=MODES, default="background", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+    if not args.model.exists():
+        print(f"⚠ Model not found at {args.model}; the server will start degraded (never ready)")
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="startup-journal-") as journal_dir:
+        for mode in args.modes:
+            runs = []
+            for number in range(args.runs):
+                print(f"Starting server ({mode}, run {number + 1}/{args.runs})...")
+                runs.append(run(mode, args, journal_dir))
+            results[mode] = {"summary": summarize(runs), "runs": runs}
+
+    def seconds(value):
+        return f"{value:8.2f}s" if value is not None else f"{'-':>9}"
+
+    print(f"\n{'mode':12} {'listening':>9} {'ready':>9}")
+    for mode, result in results.items():
+        summary = result["summary"]
+        print(f"{mode:12} {seconds(summary['listening_s'])} {seconds(summary['ready_s'])}")
+
+    for mode, result in results.items():
+        print(f"\nStartup breakdown ({mode}, median ms; database and journal overlap the model phases):")
+        for name, ms in result["summary"]["phases_ms"].items():
+            print(f"  {name:20} {ms:9.1f}")
+
+    if args.json:
+        args.json.write_text(json.dumps({"model": str(args.model), "results": results}, indent=2))
+        print(f"\n✓ Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
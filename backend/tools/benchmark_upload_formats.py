@@ -0,0 +1,130 @@
+"""
+Compare live-feed upload formats: bytes on the wire and server CPU per request.
+
+Each format is posted to /api/predict-live through the Flask test client. A
+stand-in model returns fixed probabilities, so the CPU time measured is what
+the server spends around the model: multipart parsing, decode/resize,
+normalization, the decision logic and the response.
+
+  camera_full  - 1280x720 JPEG q95 (camera.js capture)
+  live_full    - 1280x720 JPEG q85 (previous live mode)
+  pre_resized  - JPEG at MODEL_INPUT_SIZE, q85 (resized by the client)
+  raw          - uint8 RGB at MODEL_INPUT_SIZE (format=raw, no decode)
+
+Usage:
+    python backend/tools/benchmark_upload_formats.py --requests 300
+"""
+
+import argparse
+import io
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import requests
+from PIL import Image
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+for path in (PROJECT_ROOT, PROJECT_ROOT / "backend"):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+import backend.app as api  # noqa: E402
+from backend.config import MODEL_BACKBONE, MODEL_INPUT_SIZE  # noqa: E402
+from backend.inference import KerasFamilyEngine  # noqa: E402
+from backend.tools.benchmark_decode import synthetic_image  # noqa: E402
+
+
+class StandInEngine(KerasFamilyEngine):
+    """Real preprocessing, constant probabilities instead of a forward pass."""
+
+    name = "stand-in"
+
+    def _forward(self, batch):
+        return np.tile(np.array([[0.3, 0.7]], dtype=np.float32), (len(batch), 1))
+
+
+def make_payloads(seed=0):
+    camera_full = synthetic_image((1280, 720), "JPEG", 95, seed=seed)
+    live_full = synthetic_image((1280, 720), "JPEG", 85, seed=seed)
+
+    # What the browser does: draw the video frame onto a canvas of the model size.
+    frame = Image.open(io.BytesIO(camera_full)).convert("RGB").resize(MODEL_INPUT_SIZE, Image.BILINEAR)
+    buffer = io.BytesIO()
+    frame.save(buffer, "JPEG", quality=85)
+
+    return {
+        "camera_full": (camera_full, "encoded"),
+        "live_full": (live_full, "encoded"),
+        "pre_resized": (buffer.getvalue(), "encoded"),
+        "raw": (np.asarray(frame, dtype=np.uint8).tobytes(), "raw"),
+    }
+
+
+def request_body_bytes(payload, frame_format):
+    prepared = requests.Request(
+        "POST", "http://localhost/api/predict-live",
+        files={"image": ("live_frame.jpg", payload, "application/octet-stream")},
+        data={"format": frame_format},
+    ).prepare()
+    return len(prepared.body)
+
+
+def run_format(client, name, payload, frame_format, count):
+    def post():
+        data = {"image": (io.BytesIO(payload), "live_frame.jpg"), "format": frame_format}
+        response = client.post("/api/predict-live", data=data, content_type="multipart/form-data")
+        if response.status_code != 200:
+            raise RuntimeError(f"{name}: {response.status_code} {response.get_json()}")
+
+    for _ in range(5):
+        post()
+
+    wall, cpu = [], []
+    for _ in range(count):
+        wall_started, cpu_started = time.perf_counter(), time.process_time()
+        post()
+        cpu.append((time.process_time() - cpu_started) * 1000.0)
+        wall.append((time.perf_counter() - wall_started) * 1000.0)
+
+    return {
+        "format": name,
+        "payload_kb": len(payload) / 1024,
+        "request_kb": request_body_bytes(payload, frame_format) / 1024,
+        "server_cpu_ms": float(np.mean(cpu)),
+        "p50_ms": float(np.percentile(wall, 50)),
+        "p99_ms": float(np.percentile(wall, 99)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare live-feed upload formats.")
+    parser.add_argument("--requests", type=int, default=300, help="Requests per format.")
+    parser.add_argument("--json", type=Path, help="Write the results to this JSON file.")
+    args = parser.parse_args()
+
+    api.engine = StandInEngine(None, MODEL_INPUT_SIZE, MODEL_BACKBONE)
+    api.batcher = None
+    client = api.app.test_client()
+
+    results = [
+        run_format(client, name, payload, frame_format, args.requests)
+        for name, (payload, frame_format) in make_payloads().items()
+    ]
+
+    print(f"\n{'format':12} {'payload':>10} {'request':>10} {'server CPU':>11} {'p50':>9} {'p99':>9}")
+    for row in results:
+        print(
+            f"{row['format']:12} {row['payload_kb']:8.1f}KB {row['request_kb']:8.1f}KB "
+            f"{row['server_cpu_ms']:9.2f}ms {row['p50_ms']:7.2f}ms {row['p99_ms']:7.2f}ms"
+        )
+
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2))
+        print(f"\n✓ Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Measure throughput scaling of the preforked server from 1 to N workers.
+
+For each worker count, starts gunicorn with backend/gunicorn.conf.py on a
+local port, drives /api/predict-live with a fixed number of keep-alive client
+threads for a fixed time, and reports requests/s, latency percentiles and
+scaling relative to one worker. The client runs on the same machine, so leave
+it a core if you want clean numbers.
+
+Usage:
+    python backend/tools/benchmark_workers.py --workers 1,2,4 --concurrency 16 --duration 30
+"""
+
+import argparse
+import http.client
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from pathlib import Path
+
+import numpy as np
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from backend.config import MODEL_PATH  # noqa: E402
+from backend.tools.benchmark_decode import synthetic_image  # noqa: E402
+
+GUNICORN_CONF = PROJECT_ROOT / "backend" / "gunicorn.conf.py"
+
+
+def multipart_body(image_bytes):
+    boundary = uuid.uuid4().hex
+    body = (
+        f"--{boundary}\r\n"
+        'Content-Disposition: form-data; name="image"; filename="frame.jpg"\r\n'
+        "Content-Type: image/jpeg\r\n\r\n"
+    ).encode() + image_bytes + f"\r\n--{boundary}--\r\n".encode()
+    return body, f"multipart/form-data; boundary={boundary}"
+
+
+def start_server(worker_count, port, env):
+    command = [
+        sys.executable, "-m", "gunicorn",
+        "-c", str(GUNICORN_CONF),
+        "--workers", str(worker_count),
+        "--bind", f"127.0.0.1:{port}",
+    ]
+    return subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def wait_until_ready(port, timeout):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+            connection.request("GET", "/health")
+            health = json.loads(connection.getresponse().read())
+            connection.close()
+            if health.get("model_ready"):
+                return True
+        except (OSError, ValueError):
+            pass
+        time.sleep(0.5)
+    return False
+
+
+def drive_load(port, body, content_type, concurrency, duration):
+    """Run closed-loop clients; returns (latencies in ms, error count)."""
+    stop_at = time.perf_counter() + duration
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def client():
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+        local = []
+        local_errors = 0
+        while time.perf_counter() < stop_at:
+            start = time.perf_counter()
+            try:
+                connection.request("POST", "/api/predict-live", body, {"Content-Type": content_type})
+                response = connection.getresponse()
+                response.read()
+                if response.status == 200:
+                    local.append((time.perf_counter() - start) * 1000.0)
+                else:
+                    local_errors += 1
+            except OSError:
+                local_errors += 1
+                connection.close()
+                connection = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+        connection.close()
+        with lock:
+            latencies.extend(local)
+            errors[0] += local_errors
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors[0]
+
+
+def run(worker_count, args, body, content_type, env):
+    server = start_server(worker_count, args.port, env)
+    try:
+        if not wait_until_ready(args.port, args.startup_timeout):
+            raise RuntimeError(f"server with {worker_count} workers did not become ready")
+        # Warm-up load also gives slower-starting workers time to finish loading.
+        drive_load(args.port, body, content_type, args.concurrency, args.warmup)
+        latencies, errors = drive_load(args.port, body, content_type, args.concurrency, args.duration)
+    finally:
+        server.terminate()
+        server.wait(timeout=60)
+
+    latencies = np.array(latencies) if latencies else np.array([float("nan")])
+    return {
+        "workers": worker_count,
+        "requests": int(np.isfinite(latencies).sum()),
+        "errors": errors,
+        "requests_per_sec": float(np.isfinite(latencies).sum() / args.duration),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+    }
+
+
+def main():
+    cpu_count = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+    default_workers = sorted({1, *[2 ** i for i in range(1, 8) if 2 ** i <= cpu_count]})
+
+    parser = argparse.ArgumentParser(description="Benchmark preforked serving throughput vs worker count.")
+    parser.add_argument("--workers", default=",".join(map(str, default_workers)), help="Comma-separated worker counts.")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent client connections.")
+    parser.add_argument("--duration", type=float, default=20.0, help="Measured seconds per worker count.")
+    parser.add_argument("--warmup", type=float, default=10.0, help="Unmeasured load seconds before each run.")
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--model", type=Path, default=MODEL_PATH, help="Model file served by the workers.")
+    parser.add_argument("--startup-timeout", type=float, default=180.0)
+    parser.add_argument("--json", type=Path, help="Write the results to this JSON file.")
+    args = parser.parse_args()
+
+    if not args.model.exists():
+        print(f"⚠ Model not found at {args.model}")
+        return
+
+    env = dict(os.environ, MODEL_PATH=str(args.model), PREDICTION_CACHE_SIZE="0")
+    body, content_type = multipart_body(synthetic_image((1280, 720), "JPEG", 85))
+
+    results = []
+    for worker_count in [int(count) for count in args.workers.split(",")]:
+        print(f"Running {worker_count} worker(s)...")
+        results.append(run(worker_count, args, body, content_type, env))
+
+    baseline = results[0]["requests_per_sec"]
+    print(f"\n{'workers':>7} {'req/s':>8} {'p50':>9} {'p99':>9} {'scaling':>8} {'errors':>6}")
+    for row in results:
+        row["scaling"] = row["requests_per_sec"] / baseline if baseline else float("nan")
+        print(
+            f"{row['workers']:7d} {row['requests_per_sec']:8.1f} {row['p50_ms']:7.1f}ms "
+            f"{row['p99_ms']:7.1f}ms {row['scaling']:7.2f}x {row['errors']:6d}"
+        )
+
+    if args.json:
+        args.json.write_text(json.dumps({"cpu_count": cpu_count, "results": results}, indent=2))
+        print(f"\n✓ Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
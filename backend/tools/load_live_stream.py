@@ -0,0 +1,241 @@
+"""
+Load test the live-feed endpoints of a running server.
+
+Opens several concurrent "cameras". Each one sends synthetic JPEG frames at
+a target rate, either over the /api/live WebSocket or as /api/predict-live
+multipart POSTs. The report is per connection and covers:
+
+  sent_fps    - frames sent per second
+  results_fps - predictions received per second (sustained throughput)
+  dropped     - frames the server skipped because a newer one was waiting
+  latency     - time from sending a frame to receiving its prediction
+
+An HTTP camera can only have one request in flight, so it never gets ahead
+of the server: it sends at most one frame per round trip. A WebSocket camera
+pipelines up to --max-in-flight frames (like the browser client); with 0 it
+sends at the full rate and relies on the server dropping stale frames.
+
+Usage:
+    python backend/app.py   # in another terminal
+    python backend/tools/load_live_stream.py --connections 4 --fps 15 --duration 20 --transport both
+"""
+
+import argparse
+import io
+import json
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import requests
+from PIL import Image
+from simple_websocket import Client, ConnectionClosed
+
+
+def make_frames(width, height, quality, count=8, seed=0):
+    """Distinct noisy frames, so motion gating does not skip them"""
+    rng = np.random.default_rng(seed)
+    base = rng.integers(0, 256, (height // 8, width // 8, 3), dtype=np.uint8)
+    frames = []
+    for i in range(count):
+        shifted = np.roll(base, i * 3, axis=1)
+        image = Image.fromarray(shifted).resize((width, height), Image.BILINEAR)
+        buffer = io.BytesIO()
+        image.save(buffer, "JPEG", quality=quality)
+        frames.append(buffer.getvalue())
+    return frames
+
+
+def summarize(name, index, sent, latencies, results, dropped, errors, elapsed, bytes_sent):
+    latencies = np.array(latencies) if latencies else np.zeros(1)
+    return {
+        "transport": name,
+        "connection": index,
+        "frames_sent": sent,
+        "results": results,
+        "dropped": dropped,
+        "errors": errors,
+        "sent_fps": sent / elapsed,
+        "results_fps": results / elapsed,
+        "kb_per_frame": bytes_sent / max(1, sent) / 1024,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+    }
+
+
+def run_ws_camera(index, url, frames, fps, duration, max_in_flight, out):
+    ws = Client.connect(url.replace("http", "ws", 1).rstrip("/") + "/api/live")
+    sent_at = {}
+    lock = threading.Lock()
+    state = {"sent": 0, "bytes": 0, "answered": 0, "held_back": 0}
+    stop = threading.Event()
+
+    def sender():
+        interval = 1.0 / fps if fps > 0 else 0.0
+        next_send = time.perf_counter()
+        while not stop.is_set():
+            frame = frames[state["sent"] % len(frames)]
+            with lock:
+                if max_in_flight and state["sent"] - state["answered"] >= max_in_flight:
+                    # Like the browser: skip this camera frame instead of queueing it.
+                    state["held_back"] += 1
+                    frame = None
+                else:
+                    state["sent"] += 1
+                    sent_at[state["sent"]] = time.perf_counter()
+            if frame is None:
+                next_send += interval
+                stop.wait(max(0.0, next_send - time.perf_counter()))
+                continue
+            try:
+                ws.send(frame)
+            except ConnectionClosed:
+                return
+            state["bytes"] += len(frame)
+            next_send += interval
+            stop.wait(max(0.0, next_send - time.perf_counter()))
+
+    latencies, results, dropped, errors = [], 0, 0, 0
+    started = time.perf_counter()
+    thread = threading.Thread(target=sender, daemon=True)
+    thread.start()
+    deadline = started + duration
+    last_frame = 0
+    while True:
+        now = time.perf_counter()
+        if now >= deadline:
+            stop.set()
+            with lock:
+                total_sent = state["sent"]
+            # Let the reply for the newest frame arrive before closing.
+            if last_frame >= total_sent or now >= deadline + 5.0:
+                break
+        try:
+            message = ws.receive(timeout=0.5)
+        except ConnectionClosed:
+            break
+        if message is None:
+            continue
+        received_at = time.perf_counter()
+        result = json.loads(message)
+        last_frame = result.get("frame", last_frame)
+        with lock:
+            state["answered"] = last_frame
+        dropped += result.get("dropped", 0)
+        if not result.get("success"):
+            errors += 1
+            continue
+        results += 1
+        with lock:
+            latencies.append((received_at - sent_at[last_frame]) * 1000.0)
+    elapsed = min(time.perf_counter(), deadline) - started
+    thread.join()
+    try:
+        ws.close()
+    except ConnectionClosed:
+        pass
+    out[index] = summarize("ws", index, state["sent"], latencies, results, dropped, errors, elapsed, state["bytes"])
+    out[index]["held_back"] = state["held_back"]
+
+
+def run_http_camera(index, url, frames, fps, duration, out):
+    session = requests.Session()
+    session_id = f"load-test-{index}-{time.time_ns()}"
+    interval = 1.0 / fps if fps > 0 else 0.0
+    latencies, sent, results, errors, bytes_sent = [], 0, 0, 0, 0
+    started = time.perf_counter()
+    next_send = started
+    while time.perf_counter() < started + duration:
+        frame = frames[sent % len(frames)]
+        sent += 1
+        bytes_sent += len(frame)
+        sent_at = time.perf_counter()
+        try:
+            response = session.post(
+                url.rstrip("/") + "/api/predict-live",
+                files={"image": ("live_frame.jpg", frame, "image/jpeg")},
+                data={"session_id": session_id},
+                timeout=30,
+            )
+            ok = response.ok and response.json().get("success")
+        except requests.RequestException:
+            ok = False
+        if ok:
+            results += 1
+            latencies.append((time.perf_counter() - sent_at) * 1000.0)
+        else:
+            errors += 1
+        next_send += interval
+        time.sleep(max(0.0, next_send - time.perf_counter()))
+    elapsed = time.perf_counter() - started
+    session.delete(url.rstrip("/") + f"/api/live-sessions/{session_id}")
+    out[index] = summarize("http", index, sent, latencies, results, 0, errors, elapsed, bytes_sent)
+
+
+def run_transport(transport, args, frames):
+    out = [None] * args.connections
+    if transport == "ws":
+        threads = [
+            threading.Thread(target=run_ws_camera, args=(i, args.url, frames, args.fps, args.duration, args.max_in_flight, out))
+            for i in range(args.connections)
+        ]
+    else:
+        threads = [
+            threading.Thread(target=run_http_camera, args=(i, args.url, frames, args.fps, args.duration, out))
+            for i in range(args.connections)
+        ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return [row for row in out if row is not None]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the live-feed endpoints.")
+    parser.add_argument("--url", default="http://127.0.0.1:5000", help="Server base URL.")
+    parser.add_argument("--connections", type=int, default=4, help="Concurrent cameras.")
+    parser.add_argument("--fps", type=float, default=15.0, help="Frames per second each camera tries to send.")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds per transport.")
+    parser.add_argument("--max-in-flight", type=int, default=2,
+                        help="WebSocket frames sent but not yet answered before the camera skips frames (0 = no limit).")
+    parser.add_argument("--width", type=int, default=1280, help="Frame width.")
+    parser.add_argument("--height", type=int, default=720, help="Frame height.")
+    parser.add_argument("--quality", type=int, default=85, help="JPEG quality.")
+    parser.add_argument("--transport", choices=["ws", "http", "both"], default="both")
+    parser.add_argument("--json", type=Path, help="Write the results to this JSON file.")
+    args = parser.parse_args()
+
+    frames = make_frames(args.width, args.height, args.quality)
+    transports = ["http", "ws"] if args.transport == "both" else [args.transport]
+    results = []
+    for transport in transports:
+        print(f"Running {args.connections} {transport} cameras at {args.fps:g} fps for {args.duration:g}s...")
+        results.extend(run_transport(transport, args, frames))
+
+    print(
+        f"\n{'transport':9} {'conn':>4} {'sent/s':>7} {'results/s':>9} {'dropped':>8} {'errors':>6} "
+        f"{'p50':>9} {'p95':>9} {'p99':>9}"
+    )
+    for row in results:
+        print(
+            f"{row['transport']:9} {row['connection']:4d} {row['sent_fps']:7.1f} {row['results_fps']:9.1f} "
+            f"{row['dropped']:8d} {row['errors']:6d} {row['p50_ms']:7.1f}ms {row['p95_ms']:7.1f}ms {row['p99_ms']:7.1f}ms"
+        )
+    for transport in transports:
+        rows = [row for row in results if row["transport"] == transport]
+        if rows:
+            print(
+                f"{transport}: {sum(row['results_fps'] for row in rows):.1f} results/s total, "
+                f"mean p50 {np.mean([row['p50_ms'] for row in rows]):.1f}ms"
+            )
+
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2))
+        print(f"\n✓ Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
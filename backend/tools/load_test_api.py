@@ -0,0 +1,360 @@
+"""
+Load test the HTTP API against an in-memory database.
+
+Starts the app in a child process with FakeSupabaseDB (rows and uploads kept
+in memory, with an optional simulated round trip per call) and either the
+stand-in model from benchmark_upload_formats (real preprocessing, constant
+probabilities), the real model at MODEL_PATH (--model real) or a given model
+file. Then, for each endpoint and
+concurrency level, runs closed-loop keep-alive clients for a fixed time and
+reports throughput, p50/p95/p99 latency and error rate.
+
+  predict       - 1280x720 JPEG q95 (camera capture); a few random bytes are
+                  appended after the JPEG so every request misses the
+                  prediction cache and is stored
+  predict-live  - 1280x720 JPEG q85 (live frame, no session)
+  history       - pages through /api/history like the infinite scroll: the
+                  newest page (cached by the server), then --history-pages
+                  pages following next_cursor
+  statistics    - /api/statistics
+
+The JSON output records the commit, machine and settings next to the
+results, so runs from different commits can be compared directly.
+
+Usage:
+    python backend/tools/load_test_api.py --concurrency 1 4 16 --duration 10 --json load.json
+    python backend/tools/load_test_api.py --model real --db-latency-ms 30 --endpoints predict
+    python backend/tools/load_test_api.py --model model/robot_vs_human_classifier.onnx
+"""
+
+import argparse
+import http.client
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import numpy as np
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+for path in (PROJECT_ROOT, PROJECT_ROOT / "backend"):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+from backend.config import CLASS_NAMES, MODEL_BACKBONE, MODEL_INPUT_SIZE, MODEL_PATH  # noqa: E402
+from backend.supabase_db import StorageURLBuilder, SupabaseDB, decode_cursor, encode_cursor, prediction_row  # noqa: E402
+from backend.tools.benchmark_decode import synthetic_image  # noqa: E402
+from backend.tools.benchmark_workers import multipart_body  # noqa: E402
+
+ENDPOINTS = ("predict", "predict-live", "history", "statistics")
+
+
+class FakeSupabaseDB(SupabaseDB):
+    """SupabaseDB with the network calls replaced by an in-memory table and bucket."""
+
+    def __init__(self, latency_ms=0.0, seed_rows=1000):
+        self.client = None
+        self.bucket = "fake-bucket"
+        self.url_builder = StorageURLBuilder("http://fake-supabase.local", self.bucket)
+        self.batch_writer = None
+        self.insert_listeners = []
+        self.latency = latency_ms / 1000.0
+        self.lock = threading.Lock()
+        self.rows = []
+        self.objects = {}
+        self.next_id = 1
+
+        started = datetime.now(timezone.utc) - timedelta(seconds=seed_rows)
+        for i in range(seed_rows):
+            row = prediction_row(f"seed_{i:06d}.jpg", CLASS_NAMES[i % len(CLASS_NAMES)], 0.9)
+            self._append(row, started + timedelta(seconds=i))
+
+    def _round_trip(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _append(self, row, created_at=None):
+        row = dict(row, id=self.next_id, created_at=(created_at or datetime.now(timezone.utc)).isoformat())
+        self.next_id += 1
+        self.rows.append(row)
+        return row
+
+    def upload_image(self, file_bytes, filename):
+        self._round_trip()
+        with self.lock:
+            self.objects[filename] = len(file_bytes)
+        return self.get_image_url(filename)
+
+    def save_prediction(self, filename, predicted_class, confidence):
+        return self.save_predictions([prediction_row(filename, predicted_class, confidence)])[0]
+
+    def save_predictions(self, predictions):
+        self._round_trip()
+        with self.lock:
+            inserted = [self._append(row) for row in predictions]
+        self._notify_insert()
+        return inserted
+
+    def existing_filenames(self, filenames, chunk_size=100):
+        self._round_trip()
+        with self.lock:
+            stored = {row["filename"] for row in self.rows}
+        return set(filenames) & stored
+
+    def get_predictions_page(self, limit=12, cursor=None, columns=None):
+        self._round_trip()
+        with self.lock:
+            rows = list(reversed(self.rows))  # Appended in (created_at, id) order
+        if cursor is not None:
+            created_at, row_id = decode_cursor(cursor)
+            rows = [row for row in rows if (row["created_at"], row["id"]) < (created_at, row_id)]
+        if len(rows) <= limit:
+            return rows, None
+        rows = rows[:limit]
+        return rows, encode_cursor(rows[-1])
+
+    def _counter_statistics(self):
+        self._round_trip()
+        per_class = {}
+        with self.lock:
+            for row in self.rows:
+                count, conf_sum = per_class.get(row["predicted_class"], (0, 0.0))
+                per_class[row["predicted_class"]] = (count + 1, conf_sum + row["confidence"])
+        return per_class
+
+
+def model_option(value):
+    """--model: 'stand-in', 'real' (MODEL_PATH) or the path of an existing model file"""
+    if value == "stand-in":
+        return value
+    path = Path(MODEL_PATH) if value == "real" else Path(value)
+    if not path.is_file():
+        raise argparse.ArgumentTypeError(f"model not found at {path} (expected 'stand-in', 'real' or a model file)")
+    return str(path)
+
+
+def serve(args):
+    """Child process: run the app on args.port with the fake database."""
+    import backend.app as api
+    from werkzeug.serving import make_server
+
+    api.db = FakeSupabaseDB(args.db_latency_ms, args.seed_rows)
+    api.db.insert_listeners.append(api.history_cache.clear)
+
+    if args.model == "stand-in":
+        from backend.tools.benchmark_upload_formats import StandInEngine
+
+        api.engine = StandInEngine(None, MODEL_INPUT_SIZE, MODEL_BACKBONE)
+        api.engine.warmup()
+        api.metrics.set_model_type(StandInEngine.name)
+    elif not api.load_model():
+        sys.exit(1)
+
+    api.start_batcher()
+    api.start_persistence()
+    make_server("127.0.0.1", args.port, api.app, threaded=True).serve_forever()
+
+
+def start_server(args, log):
+    command = [
+        sys.executable, __file__, "--serve",
+        "--port", str(args.port),
+        "--model", args.model,
+        "--db-latency-ms", str(args.db_latency_ms),
+        "--seed-rows", str(args.seed_rows),
+    ]
+    env = dict(os.environ)
+    if args.model != "stand-in":
+        env["MODEL_PATH"] = args.model
+    return subprocess.Popen(command, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+def wait_until_ready(server, port, timeout):
+    deadline = time.time() + timeout
+    while time.time() < deadline and server.poll() is None:
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+            connection.request("GET", "/health")
+            health = json.loads(connection.getresponse().read())
+            connection.close()
+            if health.get("model_ready"):
+                return True
+        except (OSError, ValueError):
+            pass
+        time.sleep(0.25)
+    return False
+
+
+def request_factory(endpoint, args):
+    """Return a function making the next (method, path, body, headers) for one client."""
+    if endpoint in ("predict", "predict-live"):
+        quality = 95 if endpoint == "predict" else 85
+        images = [synthetic_image((1280, 720), "JPEG", quality, seed=seed) for seed in range(4)]
+        path = "/api/predict" if endpoint == "predict" else "/api/predict-live"
+
+        def make(state):
+            state["n"] = state.get("n", 0) + 1
+            image = images[state["n"] % len(images)]
+            if endpoint == "predict":
+                image += os.urandom(16)  # Ignored by the decoder, changes the content hash
+            body, content_type = multipart_body(image)
+            return "POST", path, body, {"Content-Type": content_type}
+        return make
+
+    if endpoint == "history":
+        def make(state):
+            cursor = state.get("cursor")
+            if cursor is None or state.get("pages", 0) > args.history_pages:
+                state["pages"], cursor = 0, None
+            state["pages"] = state.get("pages", 0) + 1
+            query = f"?limit={args.history_limit}" + (f"&cursor={cursor}" if cursor else "")
+            return "GET", "/api/history" + query, None, {}
+        return make
+
+    return lambda state: ("GET", "/api/statistics", None, {})
+
+
+def drive(endpoint, args, concurrency, duration):
+    """Closed-loop clients; returns (latencies in ms, errors, status counts)."""
+    make_request = request_factory(endpoint, args)
+    stop_at = time.perf_counter() + duration
+    latencies, statuses = [], {}
+    errors = [0]
+    lock = threading.Lock()
+
+    def client():
+        connection = http.client.HTTPConnection("127.0.0.1", args.port, timeout=60)
+        state, local, local_statuses, local_errors = {}, [], {}, 0
+        while time.perf_counter() < stop_at:
+            method, path, body, headers = make_request(state)
+            started = time.perf_counter()
+            try:
+                connection.request(method, path, body, headers)
+                response = connection.getresponse()
+                payload = response.read()
+                elapsed = (time.perf_counter() - started) * 1000.0
+                local_statuses[response.status] = local_statuses.get(response.status, 0) + 1
+                if response.status == 200:
+                    local.append(elapsed)
+                    if endpoint == "history":
+                        state["cursor"] = json.loads(payload).get("next_cursor")
+                else:
+                    local_errors += 1
+            except OSError:
+                local_errors += 1
+                local_statuses["connection_error"] = local_statuses.get("connection_error", 0) + 1
+                connection.close()
+                connection = http.client.HTTPConnection("127.0.0.1", args.port, timeout=60)
+        connection.close()
+        with lock:
+            latencies.extend(local)
+            errors[0] += local_errors
+            for status, count in local_statuses.items():
+                statuses[str(status)] = statuses.get(str(status), 0) + count
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors[0], statuses
+
+
+def run_case(endpoint, concurrency, args):
+    drive(endpoint, args, concurrency, args.warmup)
+    latencies, errors, statuses = drive(endpoint, args, concurrency, args.duration)
+    completed = len(latencies) + errors
+    timings = np.array(latencies) if latencies else np.array([float("nan")])
+    return {
+        "endpoint": endpoint,
+        "concurrency": concurrency,
+        "requests": completed,
+        "errors": errors,
+        "error_rate": errors / completed if completed else 0.0,
+        "throughput_rps": len(latencies) / args.duration,
+        "mean_ms": float(np.mean(timings)),
+        "p50_ms": float(np.percentile(timings, 50)),
+        "p95_ms": float(np.percentile(timings, 95)),
+        "p99_ms": float(np.percentile(timings, 99)),
+        "status_counts": statuses,
+    }
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                               cwd=PROJECT_ROOT, capture_output=True, text=True).stdout.strip()
+        return commit + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the HTTP API against an in-memory database.")
+    parser.add_argument("--endpoints", nargs="+", choices=ENDPOINTS, default=list(ENDPOINTS))
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16], help="Client connections per run.")
+    parser.add_argument("--duration", type=float, default=10.0, help="Measured seconds per run.")
+    parser.add_argument("--warmup", type=float, default=2.0, help="Unmeasured load seconds before each run.")
+    parser.add_argument("--model", type=model_option, default="stand-in",
+                        help=f"'stand-in', 'real' (MODEL_PATH, currently {MODEL_PATH}) or a model file to serve.")
+    parser.add_argument("--db-latency-ms", type=float, default=0.0, help="Simulated round trip per database/storage call.")
+    parser.add_argument("--seed-rows", type=int, default=1000, help="Rows in the fake predictions table at start.")
+    parser.add_argument("--history-limit", type=int, default=12, help="Rows per /api/history page.")
+    parser.add_argument("--history-pages", type=int, default=3, help="Pages followed after the newest one.")
+    parser.add_argument("--port", type=int, default=5056)
+    parser.add_argument("--startup-timeout", type=float, default=180.0)
+    parser.add_argument("--json", type=Path, help="Write the results to this JSON file.")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+
+    with tempfile.TemporaryFile(mode="w+") as log:
+        server = start_server(args, log)
+        try:
+            if not wait_until_ready(server, args.port, args.startup_timeout):
+                log.seek(0)
+                print(log.read()[-4000:])
+                raise RuntimeError("server did not become ready")
+            results = []
+            for endpoint in args.endpoints:
+                for concurrency in args.concurrency:
+                    print(f"Running {endpoint} with {concurrency} client(s)...")
+                    results.append(run_case(endpoint, concurrency, args))
+        finally:
+            server.terminate()
+            server.wait(timeout=60)
+
+    print(f"\n{'endpoint':13} {'conc':>4} {'req/s':>8} {'p50':>9} {'p95':>9} {'p99':>9} {'errors':>7}")
+    for row in results:
+        print(
+            f"{row['endpoint']:13} {row['concurrency']:4d} {row['throughput_rps']:8.1f} {row['p50_ms']:7.1f}ms "
+            f"{row['p95_ms']:7.1f}ms {row['p99_ms']:7.1f}ms {row['error_rate']:6.1%}"
+        )
+
+    if args.json:
+        report = {
+            "commit": git_commit(),
+            "timestamp": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "cpu_count": len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count(),
+            "settings": {key: value for key, value in vars(args).items() if key not in ("json", "serve")},
+            "results": results,
+        }
+        args.json.write_text(json.dumps(report, indent=2))
+        print(f"\n✓ Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
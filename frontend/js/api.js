@@ -41,10 +41,11 @@ export async function classifyImage(imageFile) {
 
 /**
  * Fetch classification history from the backend
+ * @param {number} limit - Number of records to fetch (newest first)
  * @returns {Promise<Array>} Array of classification records
  */
-export async function fetchHistory() {
-    const response = await fetch(`${API_CONFIG.BASE_URL}${API_CONFIG.ENDPOINTS.HISTORY}`, {
+export async function fetchHistory(limit = 12) {
+    const response = await fetch(`${API_CONFIG.BASE_URL}${API_CONFIG.ENDPOINTS.HISTORY}?limit=${limit}`, {
         headers: {
             'ngrok-skip-browser-warning': 'true'
         }
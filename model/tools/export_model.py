@@ -0,0 +1,211 @@
+"""
+Export the trained Keras classifier to ONNX and/or TFLite for CPU serving.
+
+The exported files sit next to the Keras model (same name, new extension) and
+can be served by pointing MODEL_PATH at them; backend/inference.py picks the
+ONNX Runtime or TFLite engine from the extension.
+
+With --check, the exported models are run on the test split through the same
+preprocessing as the API server and their probabilities are compared with the
+Keras model's.
+
+Usage:
+    python model/tools/export_model.py --format all --check
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from backend.config import (  # noqa: E402
+    MODEL_PATH,
+    MODEL_INPUT_SIZE,
+    MODEL_BACKBONE,
+    CLASS_NAMES,
+    TEST_DIR,
+)
+from backend.inference import KerasFamilyEngine, load_engine  # noqa: E402
+
+VALID_IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".gif"}
+
+
+def build_serving_function(model):
+    """Wrap the Keras model in a tf.function with a dynamic batch dimension."""
+    import tensorflow as tf
+
+    spec = tf.TensorSpec((None, MODEL_INPUT_SIZE[1], MODEL_INPUT_SIZE[0], 3), tf.float32, name="input")
+
+    @tf.function(input_signature=[spec])
+    def serve(images):
+        return model(images, training=False)
+
+    return serve, spec
+
+
+def export_onnx(model, output_path, opset=17):
+    import tf2onnx
+    from tensorflow.python.framework.convert_to_constants import convert_variables_to_constants_v2
+
+    # Freeze first: otherwise constants captured by Keras 3 layers (e.g. the
+    # EfficientNet normalization) become extra graph inputs in the ONNX model.
+    serve, _ = build_serving_function(model)
+    frozen = convert_variables_to_constants_v2(serve.get_concrete_function())
+    tf2onnx.convert.from_graph_def(
+        frozen.graph.as_graph_def(),
+        input_names=[tensor.name for tensor in frozen.inputs],
+        output_names=[tensor.name for tensor in frozen.outputs],
+        opset=opset,
+        output_path=str(output_path),
+    )
+    print(f"✓ ONNX model saved to: {output_path}")
+
+
+def convert_tflite(model, configure=None):
+    """
+    Convert the Keras model to a TFLite flatbuffer.
+
+    Args:
+        model: Keras model
+        configure: Optional callable receiving the TFLiteConverter to set
+            optimizations (used by the quantization tool)
+
+    Returns:
+        Serialized TFLite model bytes
+    """
+    import tensorflow as tf
+
+    # from_concrete_functions drops the EfficientNet normalization constants
+    # under Keras 3 (the model outputs NaN); converting the Keras model keeps them.
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if configure is not None:
+        configure(converter)
+    return converter.convert()
+
+
+def export_tflite(model, output_path):
+    Path(output_path).write_bytes(convert_tflite(model))
+    print(f"✓ TFLite model saved to: {output_path}")
+
+
+def iter_labeled_images(directory):
+    """Yield (path, class_index) for every image under directory/<class_name>/."""
+    for class_index, class_name in enumerate(CLASS_NAMES):
+        class_dir = Path(directory) / class_name
+        if not class_dir.exists():
+            continue
+        for path in sorted(class_dir.rglob("*")):
+            if path.is_file() and path.suffix.lower() in VALID_IMAGE_EXTENSIONS:
+                yield path, class_index
+
+
+def load_split(directory, max_images=None, seed=42):
+    """
+    Load and preprocess a dataset split exactly like the API server does.
+
+    Returns:
+        Tuple of (images as float32 NHWC array, integer labels)
+    """
+    samples = list(iter_labeled_images(directory))
+    if max_images is not None and len(samples) > max_images:
+        rng = np.random.default_rng(seed)
+        samples = [samples[i] for i in sorted(rng.choice(len(samples), max_images, replace=False))]
+
+    preprocessor = KerasFamilyEngine(None, MODEL_INPUT_SIZE, MODEL_BACKBONE)
+    images = np.empty((len(samples), MODEL_INPUT_SIZE[1], MODEL_INPUT_SIZE[0], 3), dtype=np.float32)
+    labels = np.empty(len(samples), dtype=np.int64)
+    for i, (path, class_index) in enumerate(samples):
+        preprocessor.preprocess(path.read_bytes(), out=images[i:i + 1])
+        labels[i] = class_index
+    return images, labels
+
+
+def predict_in_batches(predict_fn, images, batch_size=32):
+    outputs = [predict_fn(images[start:start + batch_size]) for start in range(0, len(images), batch_size)]
+    return np.concatenate(outputs, axis=0) if outputs else np.empty((0, len(CLASS_NAMES)))
+
+
+def parity_check(keras_model, exported_path, images, labels, tolerance):
+    """
+    Compare an exported model's probabilities with the Keras model's.
+
+    Returns:
+        Dictionary with max/mean absolute difference, top-1 agreement and accuracies
+    """
+    engine = load_engine(exported_path, "auto", MODEL_INPUT_SIZE, MODEL_BACKBONE)
+    reference = predict_in_batches(lambda batch: keras_model.predict(batch, verbose=0), images)
+    exported = predict_in_batches(engine.predict_batch, images)
+
+    difference = np.abs(reference - exported)
+    result = {
+        "model": str(exported_path),
+        "images": int(len(images)),
+        "max_abs_diff": float(difference.max()) if difference.size else 0.0,
+        "mean_abs_diff": float(difference.mean()) if difference.size else 0.0,
+        "top1_agreement": float(np.mean(reference.argmax(1) == exported.argmax(1))) if len(images) else 1.0,
+        "keras_accuracy": float(np.mean(reference.argmax(1) == labels)) if len(images) else None,
+        "exported_accuracy": float(np.mean(exported.argmax(1) == labels)) if len(images) else None,
+        "tolerance": tolerance,
+    }
+    result["passed"] = result["max_abs_diff"] <= tolerance
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the Keras classifier to ONNX / TFLite.")
+    parser.add_argument("--model", type=Path, default=MODEL_PATH, help="Keras model to export (.h5/.keras).")
+    parser.add_argument("--format", choices=["onnx", "tflite", "all"], default="all")
+    parser.add_argument("--output-dir", type=Path, help="Directory for exported files (default: next to the model).")
+    parser.add_argument("--opset", type=int, default=17, help="ONNX opset version.")
+    parser.add_argument("--check", action="store_true", help="Run the parity check on the test split.")
+    parser.add_argument("--test-dir", type=Path, default=TEST_DIR, help="Directory with <class>/ image folders.")
+    parser.add_argument("--max-images", type=int, default=None, help="Limit the number of parity-check images.")
+    parser.add_argument("--tolerance", type=float, default=1e-3, help="Maximum allowed absolute probability difference.")
+    args = parser.parse_args()
+
+    if not args.model.exists():
+        print(f"⚠ ERROR: Model not found at {args.model}")
+        sys.exit(1)
+
+    from tensorflow import keras
+
+    model = keras.models.load_model(args.model)
+    output_dir = args.output_dir or args.model.parent
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    exported = []
+    if args.format in ("onnx", "all"):
+        onnx_path = output_dir / f"{args.model.stem}.onnx"
+        export_onnx(model, onnx_path, opset=args.opset)
+        exported.append(onnx_path)
+    if args.format in ("tflite", "all"):
+        tflite_path = output_dir / f"{args.model.stem}.tflite"
+        export_tflite(model, tflite_path)
+        exported.append(tflite_path)
+
+    if not args.check:
+        return
+
+    images, labels = load_split(args.test_dir, args.max_images)
+    if len(images) == 0:
+        print(f"⚠ No test images found in {args.test_dir}; parity check skipped.")
+        return
+
+    print(f"\nParity check on {len(images)} test images (tolerance {args.tolerance}):")
+    results = [parity_check(model, path, images, labels, args.tolerance) for path in exported]
+    print(json.dumps(results, indent=2))
+
+    if not all(result["passed"] for result in results):
+        print("\n⚠ Parity check FAILED")
+        sys.exit(1)
+    print("\n✓ Parity check passed")
+
+
+if __name__ == "__main__":
+    main()
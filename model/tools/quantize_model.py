@@ -0,0 +1,212 @@
+"""
+Post-training quantization of the trained Keras classifier.
+
+Emits a full-integer int8 TFLite model (calibrated on a random sample of
+TRAIN_DIR) and a float16 TFLite model, then writes a report comparing them
+with the float32 Keras baseline: test accuracy, per-class precision / recall /
+F1 and confusion matrix (as in model/train.py), file size and p50/p99
+single-image latency through the serving engines in backend/inference.py.
+
+The quantized files can be served directly by pointing MODEL_PATH at them.
+
+Usage:
+    python model/tools/quantize_model.py --calibration-samples 200
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from backend.config import (  # noqa: E402
+    MODEL_PATH,
+    MODEL_INPUT_SIZE,
+    MODEL_BACKBONE,
+    CLASS_NAMES,
+    TRAIN_DIR,
+    TEST_DIR,
+)
+from backend.inference import load_engine  # noqa: E402
+from model.tools.export_model import convert_tflite, load_split, predict_in_batches  # noqa: E402
+
+VARIANTS = ("int8", "float16")
+
+
+def int8_converter_options(calibration_images):
+    """Full-integer quantization, including the model input and output."""
+    import tensorflow as tf
+
+    def representative_dataset():
+        for image in calibration_images:
+            yield [image[np.newaxis]]
+
+    def configure(converter):
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.int8
+        converter.inference_output_type = tf.int8
+
+    return configure
+
+
+def float16_converter_options(converter):
+    import tensorflow as tf
+
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.target_spec.supported_types = [tf.float16]
+
+
+def evaluate(engine, images, labels):
+    """
+    Accuracy, per-class metrics and confusion matrix on the test split.
+
+    Returns:
+        Dictionary with accuracy, classification_report and confusion_matrix
+    """
+    from sklearn.metrics import confusion_matrix, classification_report
+
+    predictions = predict_in_batches(engine.predict_batch, images).argmax(axis=1)
+    label_ids = list(range(len(CLASS_NAMES)))
+    return {
+        "accuracy": float(np.mean(predictions == labels)),
+        "classification_report": classification_report(
+            labels,
+            predictions,
+            labels=label_ids,
+            target_names=CLASS_NAMES,
+            digits=4,
+            output_dict=True,
+            zero_division=0,
+        ),
+        "confusion_matrix": confusion_matrix(labels, predictions, labels=label_ids).tolist(),
+    }
+
+
+def measure_latency(engine, image, runs):
+    """p50/p99 latency of single-image predictions in milliseconds."""
+    batch = image[np.newaxis]
+    engine.predict_batch(batch)
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        engine.predict_batch(batch)
+        timings.append((time.perf_counter() - start) * 1000.0)
+    return {
+        "p50_ms": float(np.percentile(timings, 50)),
+        "p99_ms": float(np.percentile(timings, 99)),
+    }
+
+
+def print_report(report):
+    baseline = report["variants"]["float32"]
+    print(f"\n{'variant':9} {'size MB':>8} {'accuracy':>9} {'Δ acc':>7} {'p50':>9} {'p99':>9} {'speedup':>8}")
+    for name, row in report["variants"].items():
+        print(
+            f"{name:9} {row['size_mb']:8.2f} {row['accuracy']:9.4f} "
+            f"{row['accuracy'] - baseline['accuracy']:+7.4f} "
+            f"{row['latency']['p50_ms']:7.2f}ms {row['latency']['p99_ms']:7.2f}ms "
+            f"{baseline['latency']['p50_ms'] / row['latency']['p50_ms']:7.2f}x"
+        )
+        for class_name in CLASS_NAMES:
+            metrics = row["classification_report"][class_name]
+            print(
+                f"{'':9}   {class_name:8} precision {metrics['precision']:.4f} "
+                f"recall {metrics['recall']:.4f} f1 {metrics['f1-score']:.4f}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Quantize the Keras classifier to int8 / float16 TFLite.")
+    parser.add_argument("--model", type=Path, default=MODEL_PATH, help="Keras model to quantize (.h5/.keras).")
+    parser.add_argument("--variants", default=",".join(VARIANTS), help="Comma-separated variants: int8,float16.")
+    parser.add_argument("--output-dir", type=Path, help="Directory for quantized files (default: next to the model).")
+    parser.add_argument("--train-dir", type=Path, default=TRAIN_DIR, help="Calibration images (<class>/ folders).")
+    parser.add_argument("--test-dir", type=Path, default=TEST_DIR, help="Evaluation images (<class>/ folders).")
+    parser.add_argument("--calibration-samples", type=int, default=200, help="Representative images for int8.")
+    parser.add_argument("--max-test-images", type=int, default=None, help="Limit the number of evaluation images.")
+    parser.add_argument("--runs", type=int, default=50, help="Timed single-image calls per variant.")
+    parser.add_argument("--max-accuracy-drop", type=float, default=None,
+                        help="Exit non-zero if a variant loses more test accuracy than this.")
+    parser.add_argument("--report", type=Path, help="Report path (default: <output-dir>/quantization_report.json).")
+    args = parser.parse_args()
+
+    variants = [variant.strip() for variant in args.variants.split(",") if variant.strip()]
+    unknown = sorted(set(variants) - set(VARIANTS))
+    if unknown:
+        parser.error(f"unknown variants: {', '.join(unknown)}")
+
+    if not args.model.exists():
+        print(f"⚠ ERROR: Model not found at {args.model}")
+        sys.exit(1)
+
+    test_images, test_labels = load_split(args.test_dir, args.max_test_images)
+    if len(test_images) == 0:
+        print(f"⚠ ERROR: No test images found in {args.test_dir}")
+        sys.exit(1)
+
+    from tensorflow import keras
+
+    model = keras.models.load_model(args.model)
+    output_dir = args.output_dir or args.model.parent
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    paths = {"float32": args.model}
+    for variant in variants:
+        if variant == "int8":
+            calibration_images, _ = load_split(args.train_dir, args.calibration_samples)
+            if len(calibration_images) == 0:
+                print(f"⚠ ERROR: No calibration images found in {args.train_dir}")
+                sys.exit(1)
+            print(f"Calibrating int8 on {len(calibration_images)} training images...")
+            configure = int8_converter_options(calibration_images)
+        else:
+            configure = float16_converter_options
+
+        path = output_dir / f"{args.model.stem}_{variant}.tflite"
+        path.write_bytes(convert_tflite(model, configure))
+        paths[variant] = path
+        print(f"✓ {variant} model saved to: {path}")
+
+    report = {
+        "model": str(args.model),
+        "test_images": int(len(test_images)),
+        "calibration_samples": args.calibration_samples if "int8" in variants else 0,
+        "variants": {},
+    }
+    for name, path in paths.items():
+        engine = load_engine(path, "auto", MODEL_INPUT_SIZE, MODEL_BACKBONE)
+        row = {
+            "path": str(path),
+            "size_mb": path.stat().st_size / (1024 * 1024),
+            **evaluate(engine, test_images, test_labels),
+            "latency": measure_latency(engine, test_images[0], args.runs),
+        }
+        report["variants"][name] = row
+
+    print_report(report)
+
+    report_path = args.report or output_dir / "quantization_report.json"
+    report_path.write_text(json.dumps(report, indent=2))
+    print(f"\n✓ Report saved to: {report_path}")
+
+    if args.max_accuracy_drop is not None:
+        baseline_accuracy = report["variants"]["float32"]["accuracy"]
+        failed = [
+            name for name, row in report["variants"].items()
+            if baseline_accuracy - row["accuracy"] > args.max_accuracy_drop
+        ]
+        if failed:
+            print(f"⚠ Accuracy drop above {args.max_accuracy_drop} for: {', '.join(failed)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
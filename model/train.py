@@ -390,6 +390,7 @@ def main():
         backbone=MODEL_BACKBONE,
     )
     
+    MODEL_PATH.parent.mkdir(parents=True, exist_ok=True)
     callbacks = create_callbacks(str(MODEL_PATH))
     
     print("\n" + "="*60)